@@ -91,12 +91,6 @@ class APIEventStream(HomeAssistantView):
         @asyncio.coroutine
         def forward_events(event):
             """Forward events to the open request."""
-            if event.event_type == EVENT_TIME_CHANGED:
-                return
-
-            if restrict and event.event_type not in restrict:
-                return
-
             _LOGGER.debug('STREAM %s FORWARDING %s', id(stop_obj), event)
 
             if event.event_type == EVENT_HOMEASSISTANT_STOP:
@@ -110,7 +104,9 @@ class APIEventStream(HomeAssistantView):
         response.content_type = 'text/event-stream'
         yield from response.prepare(request)
 
-        unsub_stream = hass.bus.async_listen(MATCH_ALL, forward_events)
+        unsub_stream = hass.bus.async_listen(
+            MATCH_ALL, forward_events, include=restrict or None,
+            exclude=[EVENT_TIME_CHANGED])
 
         try:
             _LOGGER.debug('STREAM %s ATTACHED', id(stop_obj))
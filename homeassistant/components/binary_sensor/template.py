@@ -20,7 +20,7 @@ from homeassistant.exceptions import TemplateError
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity import async_generate_entity_id
 from homeassistant.helpers.event import (
-    async_track_state_change, async_track_same_state)
+    RenderTracker, async_track_state_change, async_track_same_state)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -50,8 +50,7 @@ def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
 
     for device, device_config in config[CONF_SENSORS].items():
         value_template = device_config[CONF_VALUE_TEMPLATE]
-        entity_ids = (device_config.get(ATTR_ENTITY_ID) or
-                      value_template.extract_entities())
+        entity_ids = device_config.get(ATTR_ENTITY_ID)
         friendly_name = device_config.get(ATTR_FRIENDLY_NAME, device)
         device_class = device_config.get(CONF_DEVICE_CLASS)
         delay_on = device_config.get(CONF_DELAY_ON)
@@ -87,6 +86,7 @@ class BinarySensorTemplate(BinarySensorDevice):
         self._template = value_template
         self._state = None
         self._entities = entity_ids
+        self._tracker = None
         self._delay_on = delay_on
         self._delay_off = delay_off
 
@@ -101,8 +101,13 @@ class BinarySensorTemplate(BinarySensorDevice):
         @callback
         def template_bsensor_startup(event):
             """Update template on startup."""
-            async_track_state_change(
-                self.hass, self._entities, template_bsensor_state_listener)
+            if self._entities is not None:
+                async_track_state_change(
+                    self.hass, self._entities, template_bsensor_state_listener)
+            else:
+                # Track the states that the template reads
+                self._tracker = RenderTracker(
+                    self.hass, template_bsensor_state_listener)
 
             self.hass.async_add_job(self.async_check_state)
 
@@ -129,6 +134,11 @@ class BinarySensorTemplate(BinarySensorDevice):
         """No polling needed."""
         return False
 
+    @property
+    def state_fingerprint(self):
+        """Return the state, the only part that can change."""
+        return self.state
+
     @callback
     def _async_render(self):
         """Get the state of template."""
@@ -146,7 +156,11 @@ class BinarySensorTemplate(BinarySensorDevice):
     @callback
     def async_check_state(self):
         """Update the state from the template."""
-        state = self._async_render()
+        if self._tracker is None:
+            state = self._async_render()
+        else:
+            with self._tracker.async_collect():
+                state = self._async_render()
 
         # return if the state don't change or is invalid
         if state is None or state == self.state:
@@ -165,6 +179,9 @@ class BinarySensorTemplate(BinarySensorDevice):
             return
 
         period = self._delay_on if state else self._delay_off
+        entity_ids = self._entities
+        if entity_ids is None:
+            entity_ids = self._tracker.entity_ids
         async_track_same_state(
-            self.hass, period, set_state, entity_ids=self._entities,
+            self.hass, period, set_state, entity_ids=entity_ids,
             async_check_same_func=lambda *args: self._async_render() == state)
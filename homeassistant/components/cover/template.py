@@ -17,14 +17,15 @@ from homeassistant.components.cover import (
     SUPPORT_SET_POSITION, ATTR_POSITION, ATTR_TILT_POSITION)
 from homeassistant.const import (
     CONF_FRIENDLY_NAME, CONF_ENTITY_ID,
-    EVENT_HOMEASSISTANT_START, MATCH_ALL,
+    EVENT_HOMEASSISTANT_START,
     CONF_VALUE_TEMPLATE, CONF_ICON_TEMPLATE,
     CONF_ENTITY_PICTURE_TEMPLATE, CONF_OPTIMISTIC,
     STATE_OPEN, STATE_CLOSED)
 from homeassistant.exceptions import TemplateError
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity import async_generate_entity_id
-from homeassistant.helpers.event import async_track_state_change
+from homeassistant.helpers.event import (
+    RenderTracker, async_track_state_change)
 from homeassistant.helpers.script import Script
 
 _LOGGER = logging.getLogger(__name__)
@@ -97,36 +98,7 @@ def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
             _LOGGER.error('Must specify at least one of %s' or '%s',
                           OPEN_ACTION, POSITION_ACTION)
             continue
-        template_entity_ids = set()
-        if state_template is not None:
-            temp_ids = state_template.extract_entities()
-            if str(temp_ids) != MATCH_ALL:
-                template_entity_ids |= set(temp_ids)
-
-        if position_template is not None:
-            temp_ids = position_template.extract_entities()
-            if str(temp_ids) != MATCH_ALL:
-                template_entity_ids |= set(temp_ids)
-
-        if tilt_template is not None:
-            temp_ids = tilt_template.extract_entities()
-            if str(temp_ids) != MATCH_ALL:
-                template_entity_ids |= set(temp_ids)
-
-        if icon_template is not None:
-            temp_ids = icon_template.extract_entities()
-            if str(temp_ids) != MATCH_ALL:
-                template_entity_ids |= set(temp_ids)
-
-        if entity_picture_template is not None:
-            temp_ids = entity_picture_template.extract_entities()
-            if str(temp_ids) != MATCH_ALL:
-                template_entity_ids |= set(temp_ids)
-
-        if not template_entity_ids:
-            template_entity_ids = MATCH_ALL
-
-        entity_ids = device_config.get(CONF_ENTITY_ID, template_entity_ids)
+        entity_ids = device_config.get(CONF_ENTITY_ID)
 
         covers.append(
             CoverTemplate(
@@ -187,6 +159,7 @@ class CoverTemplate(CoverDevice):
         self._position = None
         self._tilt_value = None
         self._entities = entity_ids
+        self._tracker = None
 
         if self._template is not None:
             self._template.hass = self.hass
@@ -210,8 +183,13 @@ class CoverTemplate(CoverDevice):
         @callback
         def template_cover_startup(event):
             """Update template on startup."""
-            async_track_state_change(
-                self.hass, self._entities, template_cover_state_listener)
+            if self._entities is not None:
+                async_track_state_change(
+                    self.hass, self._entities, template_cover_state_listener)
+            else:
+                # Track the states that the templates read
+                self._tracker = RenderTracker(
+                    self.hass, template_cover_state_listener)
 
             self.async_schedule_update_ha_state(True)
 
@@ -340,6 +318,16 @@ class CoverTemplate(CoverDevice):
     @asyncio.coroutine
     def async_update(self):
         """Update the state from the template."""
+        if self._tracker is None:
+            self._async_render()
+            return
+
+        with self._tracker.async_collect():
+            self._async_render()
+
+    @callback
+    def _async_render(self):
+        """Render the templates."""
         if self._template is not None:
             try:
                 state = self._template.async_render().lower()
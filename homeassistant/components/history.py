@@ -6,19 +6,28 @@ https://home-assistant.io/components/history/
 """
 import asyncio
 from collections import defaultdict
+import concurrent.futures
 from datetime import timedelta
-from itertools import groupby
+from itertools import chain, groupby
+import json
 import logging
+import math
+import threading
 import time
 
+from aiohttp import web
 import voluptuous as vol
 
 from homeassistant.const import (
-    HTTP_BAD_REQUEST, CONF_DOMAINS, CONF_ENTITIES, CONF_EXCLUDE, CONF_INCLUDE)
+    HTTP_BAD_REQUEST, CONF_DOMAINS, CONF_ENTITIES, CONF_EXCLUDE, CONF_INCLUDE,
+    CONTENT_TYPE_JSON)
 import homeassistant.util.dt as dt_util
 from homeassistant.components import recorder, script
 from homeassistant.components.http import HomeAssistantView
 from homeassistant.const import ATTR_HIDDEN
+from homeassistant.core import callback, split_entity_id
+from homeassistant.remote import JSONEncoder
+from homeassistant.components.recorder.snapshot import last_state_ids
 from homeassistant.components.recorder.util import session_scope, execute
 
 _LOGGER = logging.getLogger(__name__)
@@ -33,12 +42,28 @@ CONFIG_SCHEMA = vol.Schema({
 SIGNIFICANT_DOMAINS = ('thermostat', 'climate')
 IGNORE_DOMAINS = ('zone', 'scene',)
 
+# Longer periods are returned from the hourly or daily statistics
+STATISTICS_HOUR_MIN_PERIOD = timedelta(days=7)
+STATISTICS_DAY_MIN_PERIOD = timedelta(days=180)
+
+# Downsampling keeps the first, the last and one point in between
+MIN_MAX_POINTS = 3
+
+# Number of rows that are fetched from the database at once when streaming
+STREAM_ROWS = 1000
+# Number of states per chunk of the streamed response
+STREAM_CHUNK_STATES = 200
+# Number of chunks that may wait to be sent to the client
+STREAM_QUEUE_SIZE = 4
+# Seconds a chunk may wait for the client to read the previous ones
+STREAM_WRITE_TIMEOUT = 60
+
 
 def last_recorder_run(hass):
     """Retrieve the last closed recorder run from the database."""
     from homeassistant.components.recorder.models import RecorderRuns
 
-    with session_scope(hass=hass) as session:
+    with session_scope(hass=hass, read_only=True) as session:
         res = (session.query(RecorderRuns)
                .filter(RecorderRuns.end.isnot(None))
                .order_by(RecorderRuns.end.desc()).first())
@@ -49,30 +74,23 @@ def last_recorder_run(hass):
 
 
 def get_significant_states(hass, start_time, end_time=None, entity_ids=None,
-                           filters=None, include_start_time_state=True):
+                           filters=None, include_start_time_state=True,
+                           exclude_entity_ids=None):
     """
     Return states changes during UTC period start_time - end_time.
 
     Significant states are all states where there is a state change,
     as well as all states from certain domains (for instance
     thermostat so that we get current temperature in our graphs).
+    The changes of exclude_entity_ids are skipped.
     """
     timer_start = time.perf_counter()
     from homeassistant.components.recorder.models import States
 
-    with session_scope(hass=hass) as session:
-        query = session.query(States).filter(
-            (States.domain.in_(SIGNIFICANT_DOMAINS) |
-             (States.last_changed == States.last_updated)) &
-            (States.last_updated > start_time))
-
-        if filters:
-            query = filters.apply(query, entity_ids)
-
-        if end_time is not None:
-            query = query.filter(States.last_updated < end_time)
-
-        query = query.order_by(States.last_updated)
+    with session_scope(hass=hass, read_only=True) as session:
+        query = _significant_states_query(
+            session, start_time, end_time, entity_ids, filters,
+            exclude_entity_ids).order_by(States.last_updated)
 
         states = (
             state for state in execute(query)
@@ -89,12 +107,295 @@ def get_significant_states(hass, start_time, end_time=None, entity_ids=None,
         include_start_time_state)
 
 
+def stream_significant_states(hass, write, start_time, end_time=None,
+                              entity_ids=None, filters=None,
+                              include_start_time_state=True,
+                              max_points=None):
+    """Write the significant states as JSON in chunks.
+
+    The JSON is the same as the one of get_significant_states, but the rows
+    are converted and written while they are read from the database, so
+    the memory that is used does not depend on the length of the period.
+    write is called with every chunk and may block until it is sent. With
+    max_points the states of numeric entities are downsampled, which keeps
+    the states of one entity in memory at a time.
+    """
+    writer = _StatesWriter(write, max_points)
+    _write_significant_states(
+        hass, writer, start_time, end_time, entity_ids, filters,
+        include_start_time_state)
+    writer.close()
+
+
+def _write_significant_states(hass, writer, start_time, end_time,
+                              entity_ids, filters, include_start_time_state,
+                              exclude_entity_ids=None):
+    """Add the significant states of every entity to writer.
+
+    The states of exclude_entity_ids are skipped.
+    """
+    from homeassistant.components.recorder.models import States
+
+    initial_states = {}
+    if include_start_time_state:
+        for state in get_states(hass, start_time, entity_ids,
+                                filters=filters):
+            if exclude_entity_ids and state.entity_id in exclude_entity_ids:
+                continue
+            state.last_changed = start_time
+            state.last_updated = start_time
+            initial_states[state.entity_id] = state
+
+    with session_scope(hass=hass, read_only=True) as session:
+        query = _significant_states_query(
+            session, start_time, end_time, entity_ids, filters,
+            exclude_entity_ids).order_by(
+                States.entity_id, States.last_updated).yield_per(STREAM_ROWS)
+
+        states = (
+            state for state in (dbstate.to_native() for dbstate in query)
+            if (state is not None and _is_significant(state) and
+                not state.attributes.get(ATTR_HIDDEN, False)))
+
+        for entity_id, group in groupby(states, lambda state: state.entity_id):
+            initial_state = initial_states.pop(entity_id, None)
+            if initial_state is not None:
+                group = chain([initial_state], group)
+            writer.add_entity(group)
+
+    # Entities that did not change during the period
+    for state in initial_states.values():
+        writer.add_entity([state])
+
+
+class _StatesWriter(object):
+    """Write the states of entities as a JSON list of lists in chunks."""
+
+    def __init__(self, write, max_points=None):
+        """Initialize the writer."""
+        self._write = write
+        self._max_points = max_points
+        self._chunk = ['[']
+        self._entity_count = 0
+
+    def _add(self, data):
+        """Add data to the chunk and write it when it is full."""
+        self._chunk.append(data)
+        if len(self._chunk) >= STREAM_CHUNK_STATES:
+            self._write(''.join(self._chunk))
+            self._chunk.clear()
+
+    def add_entity(self, states):
+        """Add the states of an entity as a JSON list."""
+        if self._max_points is not None:
+            states = downsample_states(list(states), self._max_points)
+
+        self._add(',[' if self._entity_count else '[')
+        self._entity_count += 1
+        for idx, state in enumerate(states):
+            if idx:
+                self._add(',')
+            self._add(json.dumps(state, cls=JSONEncoder))
+        self._add(']')
+
+    def close(self):
+        """End the JSON and write the last chunk."""
+        self._chunk.append(']')
+        self._write(''.join(self._chunk))
+
+
+def get_long_term_states(hass, start_time, end_time, entity_ids=None,
+                         filters=None, include_start_time_state=True,
+                         max_points=None):
+    """Return the history of a long period from the statistics.
+
+    Entities with numeric states have an hourly or daily state with the
+    mean of the period, depending on the length of the period. The other
+    entities have their significant states. With max_points the states of
+    numeric entities are downsampled.
+    """
+    if filters is None:
+        # Without filters the entity ids are not applied
+        filters = Filters()
+
+    with session_scope(hass=hass, read_only=True) as session:
+        statistics = {
+            entity_id: list(states) for entity_id, states
+            in _statistics_states(
+                hass, session, start_time, end_time, entity_ids, filters)}
+
+    if entity_ids is not None:
+        entity_ids = [entity_id for entity_id in entity_ids
+                      if entity_id not in statistics]
+
+    if entity_ids == []:
+        result = {}
+    else:
+        result = get_significant_states(
+            hass, start_time, end_time, entity_ids, filters,
+            include_start_time_state, exclude_entity_ids=list(statistics))
+
+    result.update(statistics)
+
+    if max_points is not None:
+        for entity_id, states in result.items():
+            result[entity_id] = downsample_states(states, max_points)
+
+    return result
+
+
+def stream_long_term_states(hass, write, start_time, end_time,
+                            entity_ids=None, filters=None,
+                            include_start_time_state=True, max_points=None):
+    """Write the history of a long period as JSON in chunks.
+
+    The JSON has the states of get_long_term_states. Like with
+    stream_significant_states the states are written while they are read,
+    one entity at a time.
+    """
+    if filters is None:
+        # Without filters the entity ids are not applied
+        filters = Filters()
+
+    writer = _StatesWriter(write, max_points)
+    statistics = set()
+
+    with session_scope(hass=hass, read_only=True) as session:
+        for entity_id, states in _statistics_states(
+                hass, session, start_time, end_time, entity_ids, filters):
+            statistics.add(entity_id)
+            writer.add_entity(states)
+
+    if entity_ids is not None:
+        entity_ids = [entity_id for entity_id in entity_ids
+                      if entity_id not in statistics]
+
+    if entity_ids != []:
+        _write_significant_states(
+            hass, writer, start_time, end_time, entity_ids, filters,
+            include_start_time_state, list(statistics))
+
+    writer.close()
+
+
+def _statistics_states(hass, session, start_time, end_time, entity_ids,
+                       filters):
+    """Yield the entity id and the states of every entity with statistics.
+
+    The hourly or the daily statistics are used, depending on the length
+    of the period. The rows are read while the states are consumed.
+    """
+    from homeassistant.components.recorder.models import (
+        StatisticsDay, StatisticsHour)
+
+    if end_time - start_time >= STATISTICS_DAY_MIN_PERIOD:
+        model = StatisticsDay
+    else:
+        model = StatisticsHour
+
+    query = session.query(model).filter(
+        (model.start >= model.period_start(start_time)) &
+        (model.start < end_time))
+
+    if entity_ids is not None:
+        query = query.filter(model.entity_id.in_(entity_ids))
+
+    query = query.order_by(model.entity_id, model.start).yield_per(
+        STREAM_ROWS)
+
+    for entity_id, group in groupby(query, lambda row: row.entity_id):
+        if entity_ids is None and not filters.entity_included(entity_id):
+            continue
+
+        # The periods do not record attributes, use the current ones
+        state = hass.states.get(entity_id)
+        attributes = state.attributes if state is not None else None
+        yield entity_id, (row.to_native(attributes) for row in group)
+
+
+def downsample_states(states, max_points):
+    """Return about max_points of the states of a numeric entity.
+
+    The numeric states are reduced with the largest triangle three buckets
+    algorithm, which keeps the points that give the graph its shape. States
+    that are not numeric, like unavailable, are all kept, as are the states
+    of entities that are not numeric. Entities without a unit of measurement
+    are downsampled too, only their numeric states matter for the graph.
+    """
+    if len(states) <= max_points:
+        return states
+
+    points = []
+    others = []
+    for state in states:
+        value = _graph_value(state)
+        if value is None:
+            others.append(state)
+        else:
+            points.append((state.last_updated.timestamp(), value, state))
+
+    if not points:
+        return states
+
+    sampled = [point[2] for point in _largest_triangle_three_buckets(
+        points, max(max_points - len(others), 3))]
+
+    if not others:
+        return sampled
+
+    return sorted(sampled + others, key=lambda state: state.last_updated)
+
+
+def _graph_value(state):
+    """Return the state as float, None if it is not a finite number."""
+    try:
+        value = float(state.state)
+    except ValueError:
+        return None
+
+    return value if math.isfinite(value) else None
+
+
+def _largest_triangle_three_buckets(points, threshold):
+    """Return threshold of the (x, y, ...) points that keep their shape.
+
+    The first and last point are kept, the others are split into buckets
+    and of every bucket the point is kept that forms the largest triangle
+    with the point kept before it and the average of the next bucket.
+    """
+    count = len(points)
+    if threshold >= count:
+        return points
+
+    sampled = [points[0]]
+    bucket_size = (count - 2) / (threshold - 2)
+    previous = points[0]
+
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+
+        next_points = points[end:next_end]
+        avg_x = sum(point[0] for point in next_points) / len(next_points)
+        avg_y = sum(point[1] for point in next_points) / len(next_points)
+
+        prev_x, prev_y = previous[0], previous[1]
+        previous = max(points[start:end], key=lambda point: abs(
+            (prev_x - avg_x) * (point[1] - prev_y) -
+            (prev_x - point[0]) * (avg_y - prev_y)))
+        sampled.append(previous)
+
+    sampled.append(points[-1])
+    return sampled
+
+
 def state_changes_during_period(hass, start_time, end_time=None,
                                 entity_id=None):
     """Return states changes during UTC period start_time - end_time."""
     from homeassistant.components.recorder.models import States
 
-    with session_scope(hass=hass) as session:
+    with session_scope(hass=hass, read_only=True) as session:
         query = session.query(States).filter(
             (States.last_changed == States.last_updated) &
             (States.last_updated > start_time))
@@ -125,9 +426,7 @@ def get_states(hass, utc_point_in_time, entity_ids=None, run=None,
         if run is None:
             return []
 
-    from sqlalchemy import and_, func
-
-    with session_scope(hass=hass) as session:
+    with session_scope(hass=hass, read_only=True) as session:
         if entity_ids and len(entity_ids) == 1:
             # Use an entirely different (and extremely fast) query if we only
             # have a single entity id
@@ -143,35 +442,10 @@ def get_states(hass, utc_point_in_time, entity_ids=None, run=None,
 
         else:
             # We have more than one entity to look at (most commonly we want
-            # all entities,) so we need to do a search on all states since the
-            # last recorder run started.
-
-            most_recent_states_by_date = session.query(
-                States.entity_id.label('max_entity_id'),
-                func.max(States.last_updated).label('max_last_updated')
-            ).filter(
-                (States.last_updated >= run.start) &
-                (States.last_updated < utc_point_in_time)
-            )
-
-            if entity_ids:
-                most_recent_states_by_date.filter(
-                    States.entity_id.in_(entity_ids))
-
-            most_recent_states_by_date = most_recent_states_by_date.group_by(
-                States.entity_id)
-
-            most_recent_states_by_date = most_recent_states_by_date.subquery()
-
-            most_recent_state_ids = session.query(
-                func.max(States.state_id).label('max_state_id')
-            ).join(most_recent_states_by_date, and_(
-                States.entity_id == most_recent_states_by_date.c.max_entity_id,
-                States.last_updated == most_recent_states_by_date.c.
-                max_last_updated))
-
-            most_recent_state_ids = most_recent_state_ids.group_by(
-                States.entity_id)
+            # all entities,) so we need to look at the states since the last
+            # snapshot of the recorder run before utc_point_in_time.
+            most_recent_state_ids = last_state_ids(
+                session, utc_point_in_time, run.start, entity_ids)
 
         most_recent_state_ids = most_recent_state_ids.subquery()
 
@@ -250,6 +524,10 @@ def async_setup(hass, config):
     return True
 
 
+class _StreamClosed(Exception):
+    """The client of a streamed response went away."""
+
+
 class HistoryPeriodView(HomeAssistantView):
     """Handle history period requests."""
 
@@ -264,7 +542,6 @@ class HistoryPeriodView(HomeAssistantView):
     @asyncio.coroutine
     def get(self, request, datetime=None):
         """Return history over a period of time."""
-        timer_start = time.perf_counter()
         if datetime:
             datetime = dt_util.parse_datetime(datetime)
 
@@ -295,16 +572,145 @@ class HistoryPeriodView(HomeAssistantView):
         if entity_ids:
             entity_ids = entity_ids.lower().split(',')
         include_start_time_state = 'skip_initial_state' not in request.query
+        max_points = request.query.get('max_points')
+        if max_points is not None:
+            try:
+                max_points = int(max_points)
+            except ValueError:
+                max_points = 0
+            if max_points < MIN_MAX_POINTS:
+                return self.json_message(
+                    'Invalid max_points', HTTP_BAD_REQUEST)
+
+        hass = request.app['hass']
+
+        if end_time - start_time < STATISTICS_HOUR_MIN_PERIOD:
+            stream = stream_significant_states
+        else:
+            stream = stream_long_term_states
+
+        return (yield from self._async_stream(
+            request, hass, stream, start_time, end_time, entity_ids,
+            self.filters, include_start_time_state, max_points))
+
+    @asyncio.coroutine
+    def _async_stream(self, request, hass, stream, *args):
+        """Stream the states that stream writes to the client.
+
+        The states are read in a worker thread, the queue between the
+        worker and the response limits the chunks that are held in memory.
+        If reading the states fails the connection is closed, so the client
+        does not take the incomplete JSON for the history. A client that
+        stops reading is disconnected after STREAM_WRITE_TIMEOUT, so it does
+        not hold the worker and its database connection.
+        """
+        timer_start = time.perf_counter()
+        chunks = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE, loop=hass.loop)
+        closed = threading.Event()
+        stalled = threading.Event()
+        done = object()
+        failed = object()
+        handler = asyncio.Task.current_task(loop=hass.loop)
+        streaming = True
+
+        @callback
+        def async_abort():
+            """Stop waiting for the client in the response."""
+            if streaming:
+                handler.cancel()
+
+        def write(chunk):
+            """Queue chunk from the worker and wait until there is room."""
+            if closed.is_set():
+                raise _StreamClosed
+            future = asyncio.run_coroutine_threadsafe(
+                chunks.put(chunk), hass.loop)
+            try:
+                future.result(STREAM_WRITE_TIMEOUT)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                closed.set()
+                stalled.set()
+                hass.loop.call_soon_threadsafe(async_abort)
+                raise _StreamClosed
+
+        def produce():
+            """Write the states and mark the end of the stream."""
+            end = done
+            try:
+                stream(hass, write, *args)
+            except _StreamClosed:
+                return
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error streaming history")
+                end = failed
+
+            try:
+                write(end)
+            except _StreamClosed:
+                pass
+
+        response = web.StreamResponse()
+        response.content_type = CONTENT_TYPE_JSON
+        yield from response.prepare(request)
+        hass.async_add_job(produce)
+        size = 0
+
+        try:
+            while True:
+                chunk = yield from chunks.get()
+                if chunk is done:
+                    break
+                if chunk is failed:
+                    request.transport.close()
+                    return response
+                data = chunk.encode('UTF-8')
+                size += len(data)
+                response.write(data)
+                yield from response.drain()
+        except asyncio.CancelledError:
+            if not stalled.is_set():
+                raise
+            _LOGGER.warning("Client stopped reading the history, closing "
+                            "the connection")
+            request.transport.abort()
+            return response
+        finally:
+            streaming = False
+            # Let the worker stop if the client went away
+            closed.set()
+            while not chunks.empty():
+                chunks.get_nowait()
+
+        yield from response.write_eof()
 
-        result = yield from request.app['hass'].async_add_job(
-            get_significant_states, request.app['hass'], start_time, end_time,
-            entity_ids, self.filters, include_start_time_state)
-        result = result.values()
         if _LOGGER.isEnabledFor(logging.DEBUG):
             elapsed = time.perf_counter() - timer_start
-            _LOGGER.debug(
-                'Extracted %d states in %fs', sum(map(len, result)), elapsed)
-        return self.json(result)
+            _LOGGER.debug('Streamed %d bytes in %fs', size, elapsed)
+
+        return response
+
+
+def _significant_states_query(session, start_time, end_time, entity_ids,
+                              filters, exclude_entity_ids=None):
+    """Return the query of the significant states of a period."""
+    from homeassistant.components.recorder.models import States
+
+    query = session.query(States).filter(
+        (States.domain.in_(SIGNIFICANT_DOMAINS) |
+         (States.last_changed == States.last_updated)) &
+        (States.last_updated > start_time))
+
+    if filters:
+        query = filters.apply(query, entity_ids)
+
+    if exclude_entity_ids:
+        query = query.filter(~States.entity_id.in_(exclude_entity_ids))
+
+    if end_time is not None:
+        query = query.filter(States.last_updated < end_time)
+
+    return query
 
 
 class Filters(object):
@@ -366,6 +772,34 @@ class Filters(object):
             query = query.filter(~States.entity_id.in_(self.excluded_entities))
         return query
 
+    def entity_included(self, entity_id):
+        """Return if entity_id passes the filters, the same way as apply."""
+        domain = split_entity_id(entity_id)[0]
+
+        if domain in IGNORE_DOMAINS:
+            return False
+
+        included = True
+        if self.excluded_domains and not self.included_domains:
+            included = domain not in self.excluded_domains
+            if self.included_entities:
+                included &= entity_id in self.included_entities
+        elif not self.excluded_domains and self.included_domains:
+            included = domain in self.included_domains
+            if self.included_entities:
+                included |= entity_id in self.included_entities
+        elif self.excluded_domains and self.included_domains:
+            included = domain not in self.excluded_domains
+            if self.included_entities:
+                included &= (domain in self.included_domains or
+                             entity_id in self.included_entities)
+            else:
+                included &= domain in self.included_domains
+        elif self.included_entities:
+            included = entity_id in self.included_entities
+
+        return included and entity_id not in self.excluded_entities
+
 
 def _is_significant(state):
     """Test if state is significant for history charts.
@@ -15,13 +15,14 @@ from homeassistant.components.light import (
 from homeassistant.const import (
     CONF_VALUE_TEMPLATE, CONF_ICON_TEMPLATE, CONF_ENTITY_PICTURE_TEMPLATE,
     CONF_ENTITY_ID, CONF_FRIENDLY_NAME, STATE_ON, STATE_OFF,
-    EVENT_HOMEASSISTANT_START, MATCH_ALL, CONF_LIGHTS
+    EVENT_HOMEASSISTANT_START, CONF_LIGHTS
 )
 from homeassistant.helpers.config_validation import PLATFORM_SCHEMA
 from homeassistant.exceptions import TemplateError
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity import async_generate_entity_id
-from homeassistant.helpers.event import async_track_state_change
+from homeassistant.helpers.event import (
+    RenderTracker, async_track_state_change)
 from homeassistant.helpers.script import Script
 
 _LOGGER = logging.getLogger(__name__)
@@ -65,32 +66,7 @@ def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
         level_action = device_config.get(CONF_LEVEL_ACTION)
         level_template = device_config[CONF_LEVEL_TEMPLATE]
 
-        template_entity_ids = set()
-
-        if state_template is not None:
-            temp_ids = state_template.extract_entities()
-            if str(temp_ids) != MATCH_ALL:
-                template_entity_ids |= set(temp_ids)
-
-        if level_template is not None:
-            temp_ids = level_template.extract_entities()
-            if str(temp_ids) != MATCH_ALL:
-                template_entity_ids |= set(temp_ids)
-
-        if icon_template is not None:
-            temp_ids = icon_template.extract_entities()
-            if str(temp_ids) != MATCH_ALL:
-                template_entity_ids |= set(temp_ids)
-
-        if entity_picture_template is not None:
-            temp_ids = entity_picture_template.extract_entities()
-            if str(temp_ids) != MATCH_ALL:
-                template_entity_ids |= set(temp_ids)
-
-        if not template_entity_ids:
-            template_entity_ids = MATCH_ALL
-
-        entity_ids = device_config.get(CONF_ENTITY_ID, template_entity_ids)
+        entity_ids = device_config.get(CONF_ENTITY_ID)
 
         lights.append(
             LightTemplate(
@@ -133,6 +109,7 @@ class LightTemplate(Light):
         self._entity_picture = None
         self._brightness = None
         self._entities = entity_ids
+        self._tracker = None
 
         if self._template is not None:
             self._template.hass = self.hass
@@ -194,8 +171,14 @@ class LightTemplate(Light):
             """Update template on startup."""
             if (self._template is not None or
                     self._level_template is not None):
-                async_track_state_change(
-                    self.hass, self._entities, template_light_state_listener)
+                if self._entities is not None:
+                    async_track_state_change(
+                        self.hass, self._entities,
+                        template_light_state_listener)
+                else:
+                    # Track the states that the templates read
+                    self._tracker = RenderTracker(
+                        self.hass, template_light_state_listener)
 
             self.async_schedule_update_ha_state(True)
 
@@ -237,7 +220,16 @@ class LightTemplate(Light):
     @asyncio.coroutine
     def async_update(self):
         """Update the state from the template."""
-        print("ASYNC UPDATE")
+        if self._tracker is None:
+            self._async_render()
+            return
+
+        with self._tracker.async_collect():
+            self._async_render()
+
+    @callback
+    def _async_render(self):
+        """Render the templates."""
         if self._template is not None:
             try:
                 state = self._template.async_render().lower()
@@ -5,21 +5,26 @@ For more details about this component, please refer to the documentation at
 https://home-assistant.io/components/logbook/
 """
 import asyncio
+from collections import OrderedDict
+from datetime import datetime as dt, timedelta
+import heapq
+import json
 import logging
-from datetime import timedelta
 from itertools import groupby
+from operator import itemgetter
 
 import voluptuous as vol
 
 from homeassistant.core import callback
 import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.event import async_track_point_in_utc_time
 import homeassistant.util.dt as dt_util
 from homeassistant.components import sun
 from homeassistant.components.http import HomeAssistantView
 from homeassistant.const import (
     EVENT_HOMEASSISTANT_START, EVENT_HOMEASSISTANT_STOP, EVENT_STATE_CHANGED,
     STATE_NOT_HOME, STATE_OFF, STATE_ON, ATTR_HIDDEN, HTTP_BAD_REQUEST,
-    EVENT_LOGBOOK_ENTRY)
+    EVENT_LOGBOOK_ENTRY, ATTR_UNIT_OF_MEASUREMENT)
 from homeassistant.core import State, split_entity_id, DOMAIN as HA_DOMAIN
 
 DOMAIN = 'logbook'
@@ -27,6 +32,8 @@ DEPENDENCIES = ['recorder', 'frontend']
 
 _LOGGER = logging.getLogger(__name__)
 
+_EPOCH = dt(1970, 1, 1, tzinfo=dt_util.UTC)
+
 CONF_EXCLUDE = 'exclude'
 CONF_INCLUDE = 'include'
 CONF_ENTITIES = 'entities'
@@ -51,6 +58,17 @@ GROUP_BY_MINUTES = 15
 
 CONTINUOUS_DOMAINS = ['proximity', 'sensor']
 
+# The event types that are shown in the logbook
+LOGBOOK_EVENT_TYPES = (
+    EVENT_HOMEASSISTANT_START, EVENT_HOMEASSISTANT_STOP, EVENT_STATE_CHANGED,
+    EVENT_LOGBOOK_ENTRY)
+
+# Max number of events per page of the logbook API
+MAX_LIMIT = 10000
+
+# Number of events per page of the backfill of a subscription
+DEFAULT_PAGE_SIZE = 500
+
 ATTR_NAME = 'name'
 ATTR_MESSAGE = 'message'
 ATTR_DOMAIN = 'domain'
@@ -98,7 +116,8 @@ def setup(hass, config):
         message = message.async_render()
         async_log_entry(hass, name, message, domain, entity_id)
 
-    hass.http.register_view(LogbookView(config.get(DOMAIN, {})))
+    hass.data[DOMAIN] = config.get(DOMAIN, {})
+    hass.http.register_view(LogbookView(hass.data[DOMAIN]))
 
     yield from hass.components.frontend.async_register_built_in_panel(
         'logbook', 'logbook', 'mdi:format-list-bulleted-type')
@@ -121,7 +140,11 @@ class LogbookView(HomeAssistantView):
 
     @asyncio.coroutine
     def get(self, request, datetime=None):
-        """Retrieve logbook entries."""
+        """Retrieve logbook entries.
+
+        With limit the entries are returned in pages, the cursor of the
+        response is passed to get the next page.
+        """
         if datetime:
             datetime = dt_util.parse_datetime(datetime)
 
@@ -134,10 +157,209 @@ class LogbookView(HomeAssistantView):
         end_day = start_day + timedelta(days=1)
         hass = request.app['hass']
 
-        events = yield from hass.async_add_job(
-            _get_events, hass, start_day, end_day)
+        entity_id = request.query.get('entity')
+        if entity_id is not None:
+            try:
+                entity_id = cv.entity_id(entity_id)
+            except vol.Invalid:
+                return self.json_message('Invalid entity', HTTP_BAD_REQUEST)
+
+        limit = request.query.get('limit')
+        if limit is None:
+            events = yield from hass.async_add_job(
+                _get_events, hass, start_day, end_day, self.config,
+                entity_id)
+            events = _exclude_events(events, self.config)
+            return self.json(humanify(events))
+
+        try:
+            limit = int(limit)
+            cursor = request.query.get('cursor')
+            if cursor is not None:
+                cursor = _parse_cursor(cursor)
+        except ValueError:
+            return self.json_message(
+                'Invalid limit or cursor', HTTP_BAD_REQUEST)
+
+        if not 0 < limit <= MAX_LIMIT:
+            return self.json_message('Invalid limit', HTTP_BAD_REQUEST)
+
+        events, cursor = yield from hass.async_add_job(
+            _get_events_page, hass, start_day, end_day, limit, cursor,
+            self.config, entity_id)
         events = _exclude_events(events, self.config)
-        return self.json(humanify(events))
+        return self.json({
+            'entries': list(humanify(events)),
+            'cursor': cursor,
+        })
+
+
+class LogbookSubscription(object):
+    """Send the logbook entries since a point in time and of new events.
+
+    The entries of the recorded events are sent in pages first, the events
+    that are fired meanwhile are held and sent after the last page. From
+    then on the entries are sent as the events are fired. The changes of
+    the continuous domains are held until their GROUP_BY_MINUTES batch is
+    over, so only the last one is sent like humanify does.
+
+    send is a coroutine function that is called with a list of entries and
+    whether they are part of the backfill. The first call that is not part
+    of the backfill marks its end. If the backfill can not be read, the
+    subscription stops and the coroutine function send_error is called with
+    the error message.
+    """
+
+    def __init__(self, hass, config, send, entity_id=None, send_error=None):
+        """Initialize the subscription."""
+        self.hass = hass
+        self._config = config
+        self._send = send
+        self._send_error = send_error
+        self._entity_id = entity_id
+        self._keep = _event_filter(config)
+        self._continuous_prefixes = tuple(
+            '{}.'.format(domain) for domain in CONTINUOUS_DOMAINS)
+        # Events that are fired while the backfill is sent
+        self._pending = []
+        # Last continuous change per entity of the current batch
+        self._batch = OrderedDict()
+        self._batch_end = None
+        self._unsub_batch = None
+        self._unsub_events = []
+        self._task = None
+
+    @callback
+    def async_start(self, start_time, page_size=DEFAULT_PAGE_SIZE):
+        """Listen to the logbook events and send the backfill."""
+        end_time = dt_util.utcnow()
+        self._unsub_events = [
+            self.hass.bus.async_listen(event_type, self._async_event)
+            for event_type in LOGBOOK_EVENT_TYPES]
+        self._task = self.hass.async_add_job(
+            self._async_backfill(start_time, end_time, page_size))
+
+    @callback
+    def async_stop(self):
+        """Stop sending entries."""
+        for unsub in self._unsub_events:
+            unsub()
+        self._unsub_events = []
+
+        if self._unsub_batch is not None:
+            self._unsub_batch()
+            self._unsub_batch = None
+
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    @asyncio.coroutine
+    def _async_backfill(self, start_time, end_time, page_size):
+        """Send the backfill, stop the subscription if it fails."""
+        try:
+            yield from self._async_send_backfill(
+                start_time, end_time, page_size)
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Error sending the logbook backfill")
+            # Stop holding events, the backfill task ends here
+            self._pending = None
+            self._task = None
+            self.async_stop()
+            if self._send_error is not None:
+                yield from self._send_error("Error reading the logbook")
+
+    @asyncio.coroutine
+    def _async_send_backfill(self, start_time, end_time, page_size):
+        """Send the entries of the events before end_time in pages."""
+        from homeassistant.components.recorder.const import DATA_INSTANCE
+
+        # The events fired before the subscription may not be committed yet
+        yield from self.hass.data[DATA_INSTANCE].async_commit()
+
+        cursor = None
+        while True:
+            events, cursor = yield from self.hass.async_add_job(
+                _get_events_page, self.hass, start_time, end_time,
+                page_size, cursor, self._config, self._entity_id)
+            events = [event for event in events if self._keep(event)]
+            yield from self._send(list(humanify(events)), True)
+
+            if cursor is None:
+                break
+            cursor = _parse_cursor(cursor)
+
+        # Events can be fired while the held events are sent
+        while True:
+            pending, self._pending = self._pending, []
+            yield from self._send(self._humanify(pending), False)
+            if not self._pending:
+                break
+        self._pending = None
+
+    @callback
+    def _async_event(self, event):
+        """Send the entry of a new event."""
+        if self._entity_id is not None and \
+                event.data.get(ATTR_ENTITY_ID) != self._entity_id:
+            return
+
+        if not self._keep(event):
+            return
+
+        if self._pending is not None:
+            self._pending.append(event)
+            return
+
+        entries = self._humanify([event])
+        if entries:
+            self.hass.async_add_job(self._send(entries, False))
+
+    @callback
+    def _async_batch_done(self, now):
+        """Send the held continuous changes at the end of their batch."""
+        self._unsub_batch = None
+        entries = self._flush_batch()
+        if entries:
+            self.hass.async_add_job(self._send(entries, False))
+
+    def _humanify(self, events):
+        """Return the entries of events, holding continuous changes."""
+        entries = []
+        for event in events:
+            if self._batch and event.time_fired >= self._batch_end:
+                entries.extend(self._flush_batch())
+
+            entity_id = event.data.get(ATTR_ENTITY_ID)
+            if event.event_type != EVENT_STATE_CHANGED or \
+                    entity_id is None or \
+                    not entity_id.startswith(self._continuous_prefixes):
+                entries.extend(humanify([event]))
+                continue
+
+            if not self._batch:
+                minute = event.time_fired.minute
+                self._batch_end = event.time_fired.replace(
+                    minute=minute - minute % GROUP_BY_MINUTES, second=0,
+                    microsecond=0) + timedelta(minutes=GROUP_BY_MINUTES)
+                self._unsub_batch = async_track_point_in_utc_time(
+                    self.hass, self._async_batch_done, self._batch_end)
+
+            self._batch.pop(entity_id, None)
+            self._batch[entity_id] = event
+
+        return entries
+
+    def _flush_batch(self):
+        """Return the entries of the held continuous changes."""
+        if self._unsub_batch is not None:
+            self._unsub_batch()
+            self._unsub_batch = None
+
+        events = list(self._batch.values())
+        self._batch.clear()
+        return list(humanify(events))
 
 
 class Entry(object):
@@ -170,10 +392,11 @@ def humanify(events):
     - if 2+ sensor updates in GROUP_BY_MINUTES, show last
     - if home assistant stop and start happen in same minute call it restarted
     """
+    continuous_prefixes = tuple(
+        '{}.'.format(domain) for domain in CONTINUOUS_DOMAINS)
+
     # Group events in batches of GROUP_BY_MINUTES
-    for _, g_events in groupby(
-            events,
-            lambda event: event.time_fired.minute // GROUP_BY_MINUTES):
+    for _, g_events in groupby(events, _group_key):
 
         events_batch = list(g_events)
 
@@ -192,8 +415,7 @@ def humanify(events):
                 if entity_id is None:
                     continue
 
-                if entity_id.startswith(tuple('{}.'.format(
-                        domain) for domain in CONTINUOUS_DOMAINS)):
+                if entity_id.startswith(continuous_prefixes):
                     last_sensor_event[entity_id] = event
 
             elif event.event_type == EVENT_HOMEASSISTANT_STOP:
@@ -212,7 +434,7 @@ def humanify(events):
         for event in events_batch:
             if event.event_type == EVENT_STATE_CHANGED:
 
-                to_state = State.from_dict(event.data.get('new_state'))
+                to_state = _new_state(event)
 
                 # If last_changed != last_updated only attributes have changed
                 # we do not report on that yet. Also filter auto groups.
@@ -274,22 +496,216 @@ def humanify(events):
                     entity_id)
 
 
-def _get_events(hass, start_day, end_day):
+def _new_state(event):
+    """Return the new state of a state_changed event.
+
+    The events that are read from the database have the state as dict, the
+    events of a subscription have the State.
+    """
+    new_state = event.data.get('new_state')
+    if isinstance(new_state, State):
+        return new_state
+    return State.from_dict(new_state)
+
+
+def _group_key(event):
+    """Return the key of the GROUP_BY_MINUTES batch of event."""
+    return event.time_fired.minute // GROUP_BY_MINUTES
+
+
+def _get_events(hass, start_day, end_day, config=None, entity_id=None):
     """Get events for a period of time."""
-    from homeassistant.components.recorder.models import Events
+    return [event for _, event in _query_events(
+        hass, start_day, end_day, config, entity_id)]
+
+
+def _get_events_page(hass, start_day, end_day, limit, cursor=None,
+                     config=None, entity_id=None):
+    """Get at most limit events after cursor and the cursor of the next page.
+
+    If the page has more than one GROUP_BY_MINUTES batch the last batch is
+    left for the next page, so humanify sees the whole batch. The cursor is
+    None if this is the last page.
+    """
+    rows = _query_events(
+        hass, start_day, end_day, config, entity_id, cursor, limit + 1)
+
+    if len(rows) <= limit:
+        return [event for _, event in rows], None
+
+    rows = rows[:limit]
+    last_batch = _group_key(rows[-1][1])
+    end = len(rows)
+    while end > 1 and _group_key(rows[end - 1][1]) == last_batch:
+        end -= 1
+    if _group_key(rows[end - 1][1]) != last_batch:
+        rows = rows[:end]
+
+    return [event for _, event in rows], _format_cursor(rows[-1][0])
+
+
+def _query_events(hass, start_day, end_day, config=None, entity_id=None,
+                  cursor=None, limit=None):
+    """Return the position and event of the logbook events of a period.
+
+    Events that are never shown in the logbook are filtered in the query,
+    as are the state changes excluded by config. With entity_id only the
+    events of that entity are read, using the index on the entity_id of
+    the states. The position is the (time_fired, event_id) of the event,
+    only events after the position cursor are returned.
+    """
+    from sqlalchemy import or_
+    from sqlalchemy.orm import aliased, contains_eager
+    from homeassistant.components.recorder.models import (
+        Events, StateAttributes, States)
     from homeassistant.components.recorder.util import (
         execute, session_scope)
 
-    with session_scope(hass=hass) as session:
-        query = session.query(Events).order_by(
-            Events.time_fired).filter(
+    old_states = aliased(States)
+
+    def to_native(row):
+        """Return the position and event of a row."""
+        event = row[0].to_native(*row[1:])
+        if event is None:
+            return None
+        return (event.time_fired, row[0].event_id), event
+
+    with session_scope(hass=hass, read_only=True) as session:
+        # The states of state_changed events are stored in the states table
+        base_query = session.query(Events, States, old_states).outerjoin(
+            States, States.event_id == Events.event_id).outerjoin(
+                StateAttributes,
+                StateAttributes.attributes_id == States.attributes_id
+            ).options(contains_eager(States.state_attributes)).outerjoin(
+                old_states, old_states.state_id == States.old_state_id)
+        state_filter = _state_filter(States, StateAttributes, config)
+
+        if entity_id is None:
+            queries = [base_query.filter(
+                Events.event_type.in_(LOGBOOK_EVENT_TYPES) &
                 (Events.time_fired > start_day) &
-                (Events.time_fired < end_day))
-        return execute(query)
+                (Events.time_fired < end_day) &
+                or_(Events.event_type != EVENT_STATE_CHANGED, state_filter))]
+        else:
+            # Logbook entries store the entity_id in the event data
+            pattern = '%"{}": {}%'.format(
+                ATTR_ENTITY_ID, json.dumps(entity_id)).replace('_', '\\_')
+            queries = [
+                base_query.filter(
+                    (States.entity_id == entity_id) &
+                    (States.last_updated > start_day) &
+                    (States.last_updated < end_day) & state_filter),
+                base_query.filter(
+                    (Events.event_type == EVENT_LOGBOOK_ENTRY) &
+                    (Events.time_fired > start_day) &
+                    (Events.time_fired < end_day) &
+                    Events.event_data.like(pattern, escape='\\')),
+            ]
+
+        results = []
+        for query in queries:
+            if cursor is not None:
+                time_fired, event_id = cursor
+                query = query.filter(
+                    (Events.time_fired > time_fired) |
+                    ((Events.time_fired == time_fired) &
+                     (Events.event_id > event_id)))
+
+            query = query.order_by(Events.time_fired, Events.event_id)
+            if limit is not None:
+                query = query.limit(limit)
+
+            results.append(execute(query, to_native))
+
+    rows = list(heapq.merge(*results, key=itemgetter(0)))
+    return rows if limit is None else rows[:limit]
+
+
+def _state_filter(states, state_attributes, config):
+    """Return the filter of the state changes that may be shown.
+
+    New and removed entities and changes of only the attributes are not
+    shown, neither are the continuous domains with a unit of measurement.
+    The other continuous changes are grouped in humanify, which needs all
+    of them. Rows that were recorded with the state in the event data are
+    filtered by _exclude_events.
+    """
+    from sqlalchemy import false, func, or_
+    from homeassistant.components.recorder.models import Events
+
+    continuous = states.domain.in_(CONTINUOUS_DOMAINS)
+    has_unit = func.coalesce(
+        states.attributes, state_attributes.shared_attrs, ''
+    ).like('%"{}":%'.format(
+        ATTR_UNIT_OF_MEASUREMENT).replace('_', '\\_'), escape='\\')
+
+    state_filter = or_(
+        states.state_id.is_(None),
+        (states.state != '') &
+        (states.old_state_id.isnot(None) | (Events.event_data != '{}')) &
+        or_(~continuous & (states.last_changed == states.last_updated),
+            continuous & ~has_unit))
+
+    excluded_entities = []
+    excluded_domains = []
+    included_entities = []
+    included_domains = []
+    exclude = (config or {}).get(CONF_EXCLUDE)
+    if exclude:
+        excluded_entities = exclude[CONF_ENTITIES]
+        excluded_domains = exclude[CONF_DOMAINS]
+    include = (config or {}).get(CONF_INCLUDE)
+    if include:
+        included_entities = include[CONF_ENTITIES]
+        included_domains = include[CONF_DOMAINS]
+
+    # The same rules as in _exclude_events
+    if included_entities:
+        included = states.entity_id.in_(included_entities)
+    else:
+        included = false()
+    if excluded_domains and included_domains:
+        state_filter &= ~states.domain.in_(excluded_domains) & (
+            states.domain.in_(included_domains) | included)
+    elif excluded_domains:
+        state_filter &= ~states.domain.in_(excluded_domains) | included
+    elif included_domains:
+        state_filter &= states.domain.in_(included_domains) | included
+    elif included_entities:
+        state_filter &= included
+
+    if excluded_entities:
+        state_filter &= ~states.entity_id.in_(excluded_entities)
+
+    return state_filter
+
+
+def _format_cursor(position):
+    """Return the cursor of the events after position."""
+    time_fired, event_id = position
+    return '{}-{}'.format(
+        (time_fired - _EPOCH) // timedelta(microseconds=1), event_id)
+
+
+def _parse_cursor(cursor):
+    """Return the position of a cursor, raises ValueError if invalid."""
+    microseconds, event_id = cursor.split('-')
+    return (_EPOCH + timedelta(microseconds=int(microseconds)),
+            int(event_id))
 
 
 def _exclude_events(events, config):
     """Get lists of excluded entities and platforms."""
+    keep = _event_filter(config)
+    return [event for event in events if keep(event)]
+
+
+def _event_filter(config):
+    """Return a function that returns if an event may be shown.
+
+    The include and exclude lists of config are read once, so the function
+    is cheap enough to call for every event of a subscription.
+    """
     excluded_entities = []
     excluded_domains = []
     included_entities = []
@@ -303,24 +719,24 @@ def _exclude_events(events, config):
         included_entities = include[CONF_ENTITIES]
         included_domains = include[CONF_DOMAINS]
 
-    filtered_events = []
-    for event in events:
+    def keep(event):
+        """Return if event may be shown."""
         domain, entity_id = None, None
 
         if event.event_type == EVENT_STATE_CHANGED:
-            to_state = State.from_dict(event.data.get('new_state'))
+            to_state = _new_state(event)
             # Do not report on new entities
             if event.data.get('old_state') is None:
-                continue
+                return False
 
             # Do not report on entity removal
             if not to_state:
-                continue
+                return False
 
             # exclude entities which are customized hidden
             hidden = to_state.attributes.get(ATTR_HIDDEN, False)
             if hidden:
-                continue
+                return False
 
             domain = to_state.domain
             entity_id = to_state.entity_id
@@ -335,29 +751,30 @@ def _exclude_events(events, config):
                     not included_domains:
                 if (included_entities and entity_id not in included_entities) \
                         or not included_entities:
-                    continue
+                    return False
             # filter if only included is configured for this domain
             elif not excluded_domains and included_domains and \
                     domain not in included_domains:
                 if (included_entities and entity_id not in included_entities) \
                         or not included_entities:
-                    continue
+                    return False
             # filter if included and excluded is configured for this domain
             elif excluded_domains and included_domains and \
                     (domain not in included_domains or
                      domain in excluded_domains):
                 if (included_entities and entity_id not in included_entities) \
                         or not included_entities or domain in excluded_domains:
-                    continue
+                    return False
             # filter if only included is configured for this entity
             elif not excluded_domains and not included_domains and \
                     included_entities and entity_id not in included_entities:
-                continue
+                return False
             # check if logbook entry is excluded for this entity
             if entity_id in excluded_entities:
-                continue
-        filtered_events.append(event)
-    return filtered_events
+                return False
+        return True
+
+    return keep
 
 
 # pylint: disable=too-many-return-statements
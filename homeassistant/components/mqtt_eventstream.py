@@ -50,8 +50,6 @@ def async_setup(hass, config):
         """Handle events by publishing them on the MQTT queue."""
         if event.origin != EventOrigin.local:
             return
-        if event.event_type == EVENT_TIME_CHANGED:
-            return
 
         # Filter out the events that were triggered by publishing
         # to the MQTT topic, or you will end up in an infinite loop.
@@ -63,23 +61,22 @@ def async_setup(hass, config):
             ):
                 return
 
-        # Filter out all the "event service executed" events because they
-        # are only used internally by core as callbacks for blocking
-        # during the interval while a service is being executed.
-        # They will serve no purpose to the external system,
-        # and thus are unnecessary traffic.
-        # And at any rate it would cause an infinite loop to publish them
-        # because publishing to an MQTT topic itself triggers one.
-        if event.event_type == EVENT_SERVICE_EXECUTED:
-            return
-
         event_info = {'event_type': event.event_type, 'event_data': event.data}
         msg = json.dumps(event_info, cls=JSONEncoder)
         mqtt.async_publish(hass, pub_topic, msg)
 
     # Only listen for local events if you are going to publish them.
+    # Filter out all the "event service executed" events because they
+    # are only used internally by core as callbacks for blocking
+    # during the interval while a service is being executed.
+    # They will serve no purpose to the external system,
+    # and thus are unnecessary traffic.
+    # And at any rate it would cause an infinite loop to publish them
+    # because publishing to an MQTT topic itself triggers one.
     if pub_topic:
-        hass.bus.async_listen(MATCH_ALL, _event_publisher)
+        hass.bus.async_listen(
+            MATCH_ALL, _event_publisher,
+            exclude=[EVENT_TIME_CHANGED, EVENT_SERVICE_EXECUTED])
 
     # Process events from a remote server that are received on a queue.
     @callback
@@ -0,0 +1,267 @@
+"""
+Profile the jobs that run in Home Assistant.
+
+For more details about this component, please refer to the documentation at
+https://home-assistant.io/components/profiler/
+"""
+import asyncio
+import functools as ft
+import logging
+import os
+import threading
+from timeit import default_timer as timer
+
+import voluptuous as vol
+
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.config import load_yaml_config_file
+from homeassistant.const import HTTP_BAD_REQUEST
+from homeassistant.core import callback, is_callback
+import homeassistant.helpers.config_validation as cv
+from homeassistant.util.executor import job_owner
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = 'profiler'
+DEPENDENCIES = ['http']
+
+ATTR_COUNT = 'count'
+
+CONF_ENABLED = 'enabled'
+
+DEFAULT_COUNT = 10
+
+SERVICE_START = 'start'
+SERVICE_STOP = 'stop'
+SERVICE_DUMP = 'dump'
+
+KIND_CALLBACK = 'callback'
+KIND_COROUTINE = 'coroutine'
+KIND_EXECUTOR = 'executor'
+KIND_SERVICE = 'service'
+
+CONFIG_SCHEMA = vol.Schema({
+    DOMAIN: vol.Schema({
+        vol.Optional(CONF_ENABLED, default=False): cv.boolean,
+    }),
+}, extra=vol.ALLOW_EXTRA)
+
+SERVICE_SCHEMA = vol.Schema({})
+
+SERVICE_DUMP_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_COUNT, default=DEFAULT_COUNT): cv.positive_int,
+})
+
+
+@asyncio.coroutine
+def async_setup(hass, config):
+    """Set up the profiler component."""
+    conf = config.get(DOMAIN)
+
+    if conf is None:
+        conf = CONFIG_SCHEMA({DOMAIN: {}})[DOMAIN]
+
+    profiler = JobProfiler()
+
+    if conf[CONF_ENABLED]:
+        hass.job_profiler = profiler
+
+    hass.http.register_view(ProfilerView(profiler))
+
+    @callback
+    def async_handle_service(service):
+        """Handle profiler services."""
+        if service.service == SERVICE_START:
+            profiler.reset()
+            hass.job_profiler = profiler
+        elif service.service == SERVICE_STOP:
+            hass.job_profiler = None
+        else:
+            for stats in profiler.top(service.data[ATTR_COUNT]):
+                _LOGGER.warning(
+                    "%s %s (%s): %d calls, %.3f seconds total, "
+                    "%.3f seconds max", stats['kind'], stats['name'],
+                    stats['owner'], stats['count'], stats['total'],
+                    stats['max'])
+
+    descriptions = yield from hass.async_add_job(
+        load_yaml_config_file, os.path.join(
+            os.path.dirname(__file__), 'services.yaml'))
+
+    for service, schema in ((SERVICE_START, SERVICE_SCHEMA),
+                            (SERVICE_STOP, SERVICE_SCHEMA),
+                            (SERVICE_DUMP, SERVICE_DUMP_SCHEMA)):
+        hass.services.async_register(
+            DOMAIN, service, async_handle_service,
+            descriptions[DOMAIN].get(service), schema=schema)
+
+    return True
+
+
+def _job_name(target):
+    """Return a readable name of target."""
+    while isinstance(target, ft.partial):
+        target = target.func
+
+    return getattr(target, '__qualname__', None) or repr(target)
+
+
+class JobProfiler(object):
+    """Record call count, total and max time per job.
+
+    Set as hass.job_profiler to instrument the jobs that Home Assistant
+    runs. Jobs are wrapped in a function of the same kind, so they are
+    scheduled the same way as without profiling.
+    """
+
+    def __init__(self):
+        """Initialize the profiler."""
+        self._stats = {}
+        # Executor jobs are recorded from worker threads
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Clear all recorded stats."""
+        with self._lock:
+            self._stats.clear()
+
+    def top(self, count):
+        """Return the stats of the count jobs with most total time."""
+        with self._lock:
+            stats = sorted(((key, tuple(value))
+                            for key, value in self._stats.items()),
+                           key=lambda item: item[1][1], reverse=True)
+
+        return [{
+            'kind': kind,
+            'owner': owner,
+            'name': name,
+            'count': calls,
+            'total': total,
+            'max': maximum,
+        } for (kind, owner, name), (calls, total, maximum)
+                in stats[:count]]
+
+    def _record(self, key, duration, longest=None):
+        """Add a run of a job to the stats."""
+        if longest is None:
+            longest = duration
+
+        with self._lock:
+            stats = self._stats.get(key)
+
+            if stats is None:
+                self._stats[key] = [1, duration, longest]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                if longest > stats[2]:
+                    stats[2] = longest
+
+    def wrap_job(self, target, kind=None):
+        """Return target wrapped to record the time it takes to run."""
+        if asyncio.iscoroutine(target):
+            # Coroutine objects are only run once, so only the owner is known
+            key = (kind or KIND_COROUTINE, job_owner(target),
+                   getattr(target, '__qualname__', repr(target)))
+            return self._timed_coroutine(key, target)
+
+        key_name = (job_owner(target), _job_name(target))
+
+        if is_callback(target):
+            key = (kind or KIND_CALLBACK,) + key_name
+
+            @callback
+            def timed_callback(*args):
+                """Run and time the callback."""
+                start = timer()
+                try:
+                    return target(*args)
+                finally:
+                    self._record(key, timer() - start)
+
+            return timed_callback
+
+        if asyncio.iscoroutinefunction(target):
+            key = (kind or KIND_COROUTINE,) + key_name
+
+            @asyncio.coroutine
+            def timed_coroutine_function(*args):
+                """Run and time the coroutine."""
+                return (yield from self._timed_coroutine(key, target(*args)))
+
+            return timed_coroutine_function
+
+        key = (kind or KIND_EXECUTOR,) + key_name
+
+        def timed_function(*args):
+            """Run and time the function."""
+            start = timer()
+            try:
+                return target(*args)
+            finally:
+                self._record(key, timer() - start)
+
+        return timed_function
+
+    @asyncio.coroutine
+    def _timed_coroutine(self, key, coro):
+        """Run coro while timing each step it runs in the event loop.
+
+        The total is the time the coroutine kept the event loop busy, the
+        max is the longest time it ran without yielding.
+        """
+        total = maximum = 0
+        value = error = None
+
+        try:
+            while True:
+                start = timer()
+                try:
+                    if error is None:
+                        future = coro.send(value)
+                    else:
+                        future, error = coro.throw(error), None
+                except StopIteration as ex:
+                    return ex.value
+                finally:
+                    duration = timer() - start
+                    total += duration
+                    maximum = max(maximum, duration)
+
+                try:
+                    value = yield future
+                except GeneratorExit:
+                    coro.close()
+                    raise
+                except BaseException as ex:  # pylint: disable=broad-except
+                    value, error = None, ex
+        finally:
+            self._record(key, total, maximum)
+
+
+class ProfilerView(HomeAssistantView):
+    """Return the recorded job stats."""
+
+    url = '/api/profiler'
+    name = 'api:profiler'
+
+    def __init__(self, profiler):
+        """Initialize the profiler view."""
+        self.profiler = profiler
+
+    @asyncio.coroutine
+    def get(self, request):
+        """Return the jobs with the most total time."""
+        try:
+            count = int(request.query.get(ATTR_COUNT, DEFAULT_COUNT))
+        except ValueError:
+            return self.json_message('Invalid count', HTTP_BAD_REQUEST)
+
+        hass = request.app['hass']
+
+        return self.json({
+            'enabled': hass.job_profiler is self.profiler,
+            'jobs': self.profiler.top(count),
+            'executors': hass.executors.async_stats(),
+        })
@@ -8,6 +8,7 @@ For more details about this component, please refer to the documentation at
 https://home-assistant.io/components/recorder/
 """
 import asyncio
+from collections import OrderedDict
 import concurrent.futures
 import logging
 from os import path
@@ -28,12 +29,14 @@ from homeassistant.const import (
     EVENT_STATE_CHANGED, EVENT_TIME_CHANGED, MATCH_ALL)
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entityfilter import generate_filter
+from homeassistant.helpers.entity_values import EntityValues
 from homeassistant.helpers.typing import ConfigType
 import homeassistant.util.dt as dt_util
 from homeassistant import config as conf_util
 
-from . import purge, migration
-from .const import DATA_INSTANCE
+from . import purge, migration, snapshot
+from .statistics import StatisticsCompiler
+from .const import CONF_PURGE_KEEP_DAYS, DATA_INSTANCE
 from .util import session_scope
 
 REQUIREMENTS = ['sqlalchemy==1.1.15']
@@ -55,12 +58,23 @@ DEFAULT_URL = 'sqlite:///{hass_config_path}'
 DEFAULT_DB_FILE = 'home-assistant_v2.db'
 
 CONF_DB_URL = 'db_url'
-CONF_PURGE_KEEP_DAYS = 'purge_keep_days'
 CONF_PURGE_INTERVAL = 'purge_interval'
 CONF_EVENT_TYPES = 'event_types'
+CONF_COMMIT_INTERVAL = 'commit_interval'
+CONF_RETENTION = 'retention'
+CONF_RETENTION_DOMAIN = 'retention_domain'
+CONF_RETENTION_GLOB = 'retention_glob'
 
 CONNECT_RETRY_WAIT = 3
 
+DEFAULT_COMMIT_INTERVAL = 1
+# Max number of events that are written in a single transaction
+MAX_BATCH_SIZE = 1000
+# Number of recently written attributes to keep the database id of
+ATTRIBUTES_CACHE_SIZE = 2048
+# Number of connections that are kept open for read queries
+READ_POOL_SIZE = 4
+
 FILTER_SCHEMA = vol.Schema({
     vol.Optional(CONF_EXCLUDE, default={}): vol.Schema({
         vol.Optional(CONF_ENTITIES, default=[]): cv.entity_ids,
@@ -76,6 +90,11 @@ FILTER_SCHEMA = vol.Schema({
     })
 })
 
+RETENTION_SCHEMA_ENTRY = vol.Schema({
+    vol.Required(CONF_PURGE_KEEP_DAYS):
+        vol.All(vol.Coerce(int), vol.Range(min=1)),
+})
+
 CONFIG_SCHEMA = vol.Schema({
     DOMAIN: FILTER_SCHEMA.extend({
         vol.Inclusive(CONF_PURGE_KEEP_DAYS, 'purge'):
@@ -83,6 +102,14 @@ CONFIG_SCHEMA = vol.Schema({
         vol.Inclusive(CONF_PURGE_INTERVAL, 'purge'):
             vol.All(vol.Coerce(int), vol.Range(min=1)),
         vol.Optional(CONF_DB_URL): cv.string,
+        vol.Optional(CONF_COMMIT_INTERVAL, default=DEFAULT_COMMIT_INTERVAL):
+            vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_RETENTION, default={}):
+            vol.Schema({cv.entity_id: RETENTION_SCHEMA_ENTRY}),
+        vol.Optional(CONF_RETENTION_DOMAIN, default={}):
+            vol.Schema({cv.string: RETENTION_SCHEMA_ENTRY}),
+        vol.Optional(CONF_RETENTION_GLOB, default={}):
+            vol.Schema({cv.string: RETENTION_SCHEMA_ENTRY}),
     })
 }, extra=vol.ALLOW_EXTRA)
 
@@ -108,7 +135,7 @@ def run_information(hass, point_in_time: Optional[datetime]=None):
     if point_in_time is None or point_in_time > ins.recording_start:
         return ins.run_info
 
-    with session_scope(hass=hass) as session:
+    with session_scope(hass=hass, read_only=True) as session:
         res = session.query(recorder_runs).filter(
             (recorder_runs.start < point_in_time) &
             (recorder_runs.end > point_in_time)).first()
@@ -123,6 +150,15 @@ def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     conf = config.get(DOMAIN, {})
     keep_days = conf.get(CONF_PURGE_KEEP_DAYS)
     purge_interval = conf.get(CONF_PURGE_INTERVAL)
+    commit_interval = conf.get(CONF_COMMIT_INTERVAL, DEFAULT_COMMIT_INTERVAL)
+
+    # Entities that are purged after a different number of days
+    retention = None
+    if any(conf.get(key) for key in (
+            CONF_RETENTION, CONF_RETENTION_DOMAIN, CONF_RETENTION_GLOB)):
+        retention = EntityValues(
+            conf.get(CONF_RETENTION), conf.get(CONF_RETENTION_DOMAIN),
+            conf.get(CONF_RETENTION_GLOB))
 
     db_url = conf.get(CONF_DB_URL, None)
     if not db_url:
@@ -133,7 +169,8 @@ def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     exclude = conf.get(CONF_EXCLUDE, {})
     instance = hass.data[DATA_INSTANCE] = Recorder(
         hass=hass, keep_days=keep_days, purge_interval=purge_interval,
-        uri=db_url, include=include, exclude=exclude)
+        uri=db_url, include=include, exclude=exclude,
+        commit_interval=commit_interval, retention=retention)
     instance.async_initialize()
     instance.start()
 
@@ -155,6 +192,12 @@ def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
 
 
 PurgeTask = namedtuple('PurgeTask', ['keep_days'])
+SnapshotTask = namedtuple('SnapshotTask', ['point'])
+# Commits the queued events and sets the concurrent future
+CommitTask = namedtuple('CommitTask', ['future'])
+
+# Queued to commit the events that are waiting for the next commit
+FLUSH_TASK = object()
 
 
 class Recorder(threading.Thread):
@@ -162,18 +205,23 @@ class Recorder(threading.Thread):
 
     def __init__(self, hass: HomeAssistant, keep_days: int,
                  purge_interval: int, uri: str,
-                 include: Dict, exclude: Dict) -> None:
+                 include: Dict, exclude: Dict,
+                 commit_interval: float=DEFAULT_COMMIT_INTERVAL,
+                 retention: Optional[EntityValues]=None) -> None:
         """Initialize the recorder."""
         threading.Thread.__init__(self, name='Recorder')
 
         self.hass = hass
         self.keep_days = keep_days
         self.purge_interval = purge_interval
+        self.commit_interval = commit_interval
+        self.retention = retention
         self.queue = queue.Queue()  # type: Any
         self.recording_start = dt_util.utcnow()
         self.db_url = uri
         self.async_db_ready = asyncio.Future(loop=hass.loop)
         self.engine = None  # type: Any
+        self.read_engine = None  # type: Any
         self.run_info = None  # type: Any
 
         self.entity_filter = generate_filter(include.get(CONF_DOMAINS, []),
@@ -183,11 +231,40 @@ class Recorder(threading.Thread):
         self.exclude_t = exclude.get(CONF_EVENT_TYPES, [])
 
         self.get_session = None
+        self.get_read_session = None
+
+        # Database ids of recently written attributes, least recent first
+        self._attributes_ids = OrderedDict()
+        # Last recorded state id per entity, the old state of the next one
+        self._old_state_ids = {}
+        self._statistics = StatisticsCompiler()
+
+        # Size and duration of the last and the largest committed batches
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_commit_time = 0
+        self.max_commit_time = 0
+
+        # Progress of the running purge and duration of the last one
+        self.purge_running = False
+        self.purge_deleted_rows = 0
+        self.last_purge_time = 0
+        self._purge_start = None
+        # Entity ids grouped by retention per purge_days of a running purge
+        self.purge_state_groups = None
+
+        # Number and duration of the read sessions, they run in other threads
+        self.read_sessions = 0
+        self.read_time_total = 0
+        self.read_time_max = 0
+        self._read_stats_lock = threading.Lock()
 
     @callback
     def async_initialize(self):
         """Initialize the recorder."""
-        self.hass.bus.async_listen(MATCH_ALL, self.event_listener)
+        self.hass.bus.async_listen(
+            MATCH_ALL, self.event_listener,
+            exclude=[EVENT_TIME_CHANGED] + self.exclude_t)
 
     def do_adhoc_purge(self, keep_days):
         """Trigger an adhoc purge retaining keep_days worth of data."""
@@ -196,9 +273,8 @@ class Recorder(threading.Thread):
 
     def run(self):
         """Start processing events to save."""
-        from .models import States, Events
+        from .models import Events
         from homeassistant.components import persistent_notification
-        from sqlalchemy import exc
 
         tries = 1
         connected = False
@@ -259,6 +335,14 @@ class Recorder(threading.Thread):
                 self.hass.bus.async_listen_once(EVENT_HOMEASSISTANT_START,
                                                 notify_hass_started)
 
+            @callback
+            def async_snapshot(now):
+                """Queue a snapshot of the states before the hour."""
+                self.queue.put(SnapshotTask(snapshot.snapshot_point(now)))
+
+            self.hass.helpers.event.async_track_utc_time_change(
+                async_snapshot, minute=snapshot.SNAPSHOT_MINUTE, second=0)
+
             if self.keep_days and self.purge_interval:
                 @callback
                 def async_purge(now):
@@ -287,22 +371,46 @@ class Recorder(threading.Thread):
         if result is shutdown_task:
             return
 
+        # Events that are written to the database in the next commit
+        batch = []
+        batch_start = None
+
         while True:
-            event = self.queue.get()
+            if batch:
+                timeout = batch_start + self.commit_interval - \
+                    time.monotonic()
+                try:
+                    event = self.queue.get(timeout=max(timeout, 0))
+                except queue.Empty:
+                    self._commit_batch(batch)
+                    continue
+            else:
+                event = self.queue.get()
 
             if event is None:
+                self._commit_batch(batch)
                 self._close_run()
                 self._close_connection()
                 self.queue.task_done()
                 return
             elif isinstance(event, PurgeTask):
-                purge.purge_old_data(self, event.keep_days)
+                self._commit_batch(batch)
+                self._run_purge_step(event)
+                self.queue.task_done()
+                continue
+            elif isinstance(event, SnapshotTask):
+                self._commit_batch(batch)
+                self._write_snapshot(event)
                 self.queue.task_done()
                 continue
-            elif event.event_type == EVENT_TIME_CHANGED:
+            elif event is FLUSH_TASK:
+                self._commit_batch(batch)
                 self.queue.task_done()
                 continue
-            elif event.event_type in self.exclude_t:
+            elif isinstance(event, CommitTask):
+                self._commit_batch(batch)
+                if event.future.set_running_or_notify_cancel():
+                    event.future.set_result(None)
                 self.queue.task_done()
                 continue
 
@@ -312,54 +420,256 @@ class Recorder(threading.Thread):
                     self.queue.task_done()
                     continue
 
-            tries = 1
-            updated = False
-            while not updated and tries <= 10:
-                if tries != 1:
-                    time.sleep(CONNECT_RETRY_WAIT)
-                try:
-                    with session_scope(session=self.get_session()) as session:
-                        dbevent = Events.from_event(event)
-                        session.add(dbevent)
+            if not batch:
+                batch_start = time.monotonic()
 
+            batch.append(event)
+
+            if len(batch) >= MAX_BATCH_SIZE or not self.commit_interval:
+                self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        """Write the events of batch in a single transaction."""
+        from .models import States, Events
+        from sqlalchemy import exc
+
+        if not batch:
+            return
+
+        start = time.monotonic()
+        tries = 1
+        updated = False
+        while not updated and tries <= 10:
+            if tries != 1:
+                time.sleep(CONNECT_RETRY_WAIT)
+            # Attributes that are new to the cache in this transaction
+            new_attributes = {}
+            # Last state per entity that is added in this transaction
+            new_states = {}
+            try:
+                with session_scope(session=self.get_session()) as session:
+                    dbevents = [
+                        Events.from_event(event, keep_states)
+                        for event, keep_states
+                        in zip(batch, self._keep_event_states(batch))]
+                    session.add_all(dbevents)
+                    # Assign the event ids the states refer to
+                    session.flush()
+
+                    for event, dbevent in zip(batch, dbevents):
                         if event.event_type == EVENT_STATE_CHANGED:
                             dbstate = States.from_event(event)
                             dbstate.event_id = dbevent.event_id
+                            dbstate.attributes_id = self._get_attributes_id(
+                                session, dbstate.attributes, new_attributes)
+                            dbstate.attributes = None
+                            if event.data.get('old_state') is not None:
+                                dbstate.old_state_id = self._get_old_state_id(
+                                    session, dbstate.entity_id, new_states)
                             session.add(dbstate)
-                    updated = True
-
-                except exc.OperationalError as err:
-                    _LOGGER.error("Error in database connectivity: %s. "
-                                  "(retrying in %s seconds)", err,
-                                  CONNECT_RETRY_WAIT)
-                    tries += 1
+                            new_states[dbstate.entity_id] = dbstate
+
+                    changed_statistics = self._statistics.add_states(
+                        session, (event.data.get('new_state')
+                                  for event in batch
+                                  if event.event_type == EVENT_STATE_CHANGED))
+
+                    # Assign the state ids the next states refer to
+                    session.flush()
+                    new_state_ids = {entity_id: dbstate.state_id
+                                     for entity_id, dbstate
+                                     in new_states.items()}
+                updated = True
+
+            except exc.OperationalError as err:
+                _LOGGER.error("Error in database connectivity: %s. "
+                              "(retrying in %s seconds)", err,
+                              CONNECT_RETRY_WAIT)
+                tries += 1
 
-            if not updated:
-                _LOGGER.error("Error in database update. Could not save "
-                              "after %d tries. Giving up", tries)
+        if updated:
+            self._attributes_ids.update(new_attributes)
+            self._old_state_ids.update(new_state_ids)
+            self._statistics.committed(changed_statistics)
+            while len(self._attributes_ids) > ATTRIBUTES_CACHE_SIZE:
+                self._attributes_ids.popitem(last=False)
+
+            self.last_batch_size = len(batch)
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self.last_commit_time = time.monotonic() - start
+            self.max_commit_time = max(
+                self.max_commit_time, self.last_commit_time)
+            _LOGGER.debug("Committed %d events in %.3f seconds",
+                          self.last_batch_size, self.last_commit_time)
+        else:
+            _LOGGER.error("Error in database update. Could not save "
+                          "after %d tries. Giving up", tries)
 
+        for _ in batch:
             self.queue.task_done()
 
+        batch.clear()
+
+    def _run_purge_step(self, task):
+        """Delete a chunk of old data, queue task again if there is more.
+
+        Events that are queued in the meantime are written between the
+        purge steps, so they do not have to wait for the whole purge.
+        """
+        from sqlalchemy import exc
+
+        if not self.purge_running:
+            self.purge_running = True
+            self.purge_deleted_rows = 0
+            self.purge_state_groups = None
+            self._purge_start = time.monotonic()
+
+        try:
+            finished = purge.purge_old_data(self, task.keep_days)
+        except exc.SQLAlchemyError as err:
+            _LOGGER.error("Error purging the database: %s", err)
+            finished = True
+
+        # Purged attributes may still be cached
+        self._attributes_ids.clear()
+
+        if not finished:
+            self.queue.put(task)
+            return
+
+        self.purge_running = False
+        self.purge_state_groups = None
+        self.last_purge_time = time.monotonic() - self._purge_start
+        _LOGGER.info("Purged %d rows in %.3f seconds",
+                     self.purge_deleted_rows, self.last_purge_time)
+
+    def _write_snapshot(self, task):
+        """Write a snapshot of the states of this run before task.point."""
+        from sqlalchemy import exc
+
+        if task.point < self.run_info.start:
+            return
+
+        try:
+            with session_scope(session=self.get_session()) as session:
+                snapshot.write_snapshot(
+                    session, task.point, self.run_info.start)
+        except exc.SQLAlchemyError as err:
+            _LOGGER.error("Error writing snapshot of the states: %s", err)
+
+    def _keep_event_states(self, batch):
+        """Yield for each event of batch if its states are stored with it.
+
+        A state_changed event whose old state is not recorded in this run
+        keeps its states, the new state can not refer to the old one.
+        """
+        entity_ids = set()
+
+        for event in batch:
+            if event.event_type != EVENT_STATE_CHANGED:
+                yield False
+                continue
+
+            entity_id = event.data['entity_id']
+            yield (event.data.get('old_state') is not None and
+                   entity_id not in entity_ids and
+                   entity_id not in self._old_state_ids)
+            entity_ids.add(entity_id)
+
+    def _get_old_state_id(self, session, entity_id, new_states):
+        """Return the id of the last state of entity_id recorded this run.
+
+        States that are added earlier in the transaction are flushed first
+        to assign their id. States of earlier runs are never referred to, an
+        entity starts without an old state after a restart.
+        """
+        dbstate = new_states.get(entity_id)
+        if dbstate is not None:
+            if dbstate.state_id is None:
+                session.flush()
+            return dbstate.state_id
+
+        return self._old_state_ids.get(entity_id)
+
+    def _get_attributes_id(self, session, shared_attrs, new_attributes):
+        """Return the id of the shared attributes, added if needed.
+
+        The ids that are not cached yet are stored in new_attributes, so
+        they are only cached when the transaction is committed.
+        """
+        from .models import StateAttributes
+
+        attributes_id = self._attributes_ids.get(shared_attrs)
+        if attributes_id is not None:
+            self._attributes_ids.move_to_end(shared_attrs)
+            return attributes_id
+
+        attributes_id = new_attributes.get(shared_attrs)
+        if attributes_id is not None:
+            return attributes_id
+
+        attr_hash = StateAttributes.hash_shared_attrs(shared_attrs)
+
+        for attributes_id, attrs in session.query(
+                StateAttributes.attributes_id,
+                StateAttributes.shared_attrs).filter_by(hash=attr_hash):
+            if attrs == shared_attrs:
+                break
+        else:
+            dbattrs = StateAttributes(
+                hash=attr_hash, shared_attrs=shared_attrs)
+            session.add(dbattrs)
+            session.flush()
+            attributes_id = dbattrs.attributes_id
+
+        new_attributes[shared_attrs] = attributes_id
+        return attributes_id
+
     @callback
     def event_listener(self, event):
         """Listen for new events and put them in the process queue."""
         self.queue.put(event)
 
     def block_till_done(self):
-        """Block till all events processed."""
+        """Block till all events processed and committed."""
+        if self.is_alive():
+            self.queue.put(FLUSH_TASK)
         self.queue.join()
 
+    @asyncio.coroutine
+    def async_commit(self):
+        """Wait until the events that are queued now are committed.
+
+        Unlike block_till_done the events that are fired while waiting are
+        not waited for.
+        """
+        if not self.is_alive():
+            return
+
+        future = concurrent.futures.Future()
+        self.queue.put(CommitTask(future))
+        yield from asyncio.wrap_future(future, loop=self.hass.loop)
+
+    def record_read_session(self, duration):
+        """Add a finished read session to the stats."""
+        with self._read_stats_lock:
+            self.read_sessions += 1
+            self.read_time_total += duration
+            self.read_time_max = max(self.read_time_max, duration)
+
     def _setup_connection(self):
         """Ensure database is ready to fly."""
         from sqlalchemy import create_engine, event
         from sqlalchemy.engine import Engine
         from sqlalchemy.orm import scoped_session
         from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import QueuePool, StaticPool
         from sqlite3 import Connection
 
         from . import models
 
         kwargs = {}
+        read_kwargs = None
 
         # pylint: disable=unused-variable
         @event.listens_for(Engine, "connect")
@@ -369,31 +679,64 @@ class Recorder(threading.Thread):
                 old_isolation = dbapi_connection.isolation_level
                 dbapi_connection.isolation_level = None
                 cursor = dbapi_connection.cursor()
+                # Only applies to new databases, allows incremental vacuum
+                cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
                 cursor.execute("PRAGMA journal_mode=WAL")
                 cursor.close()
                 dbapi_connection.isolation_level = old_isolation
 
         if self.db_url == 'sqlite://' or ':memory:' in self.db_url:
-            from sqlalchemy.pool import StaticPool
-
+            # Readers have to share the connection of the in memory database
             kwargs['connect_args'] = {'check_same_thread': False}
             kwargs['poolclass'] = StaticPool
             kwargs['pool_reset_on_return'] = None
+        elif self.db_url.startswith('sqlite'):
+            # With WAL the readers do not block the writer and the other way
+            # around, as long as they use their own connections. Keep them
+            # open instead of connecting for every session.
+            kwargs['echo'] = False
+            kwargs['connect_args'] = {'check_same_thread': False}
+            kwargs['poolclass'] = QueuePool
+            kwargs['pool_size'] = 1
+            read_kwargs = dict(kwargs, pool_size=READ_POOL_SIZE)
         else:
             kwargs['echo'] = False
+            read_kwargs = dict(kwargs, pool_size=READ_POOL_SIZE)
 
         if self.engine is not None:
             self.engine.dispose()
+        if self.read_engine not in (None, self.engine):
+            self.read_engine.dispose()
 
         self.engine = create_engine(self.db_url, **kwargs)
         models.Base.metadata.create_all(self.engine)
         self.get_session = scoped_session(sessionmaker(bind=self.engine))
 
+        if read_kwargs is None:
+            self.read_engine = self.engine
+        else:
+            self.read_engine = create_engine(self.db_url, **read_kwargs)
+
+            @event.listens_for(self.read_engine, "connect")
+            def set_sqlite_query_only(dbapi_connection, connection_record):
+                """Do not allow the read connections to write."""
+                if isinstance(dbapi_connection, Connection):
+                    cursor = dbapi_connection.cursor()
+                    cursor.execute("PRAGMA query_only=ON")
+                    cursor.close()
+
+        self.get_read_session = scoped_session(
+            sessionmaker(bind=self.read_engine))
+
     def _close_connection(self):
         """Close the connection."""
+        if self.read_engine is not self.engine:
+            self.read_engine.dispose()
+        self.read_engine = None
         self.engine.dispose()
         self.engine = None
         self.get_session = None
+        self.get_read_session = None
 
     def _setup_run(self):
         """Log the start of the current run."""
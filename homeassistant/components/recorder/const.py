@@ -1,3 +1,5 @@
 """Recorder constants."""
 
 DATA_INSTANCE = 'recorder_instance'
+
+CONF_PURGE_KEEP_DAYS = 'purge_keep_days'
@@ -57,6 +57,21 @@ def _create_index(engine, table_name, index_name):
     _LOGGER.debug("Finished creating %s", index_name)
 
 
+def _add_columns(engine, table_name, columns_def):
+    """Add columns to a table."""
+    from sqlalchemy import text
+
+    _LOGGER.info("Adding columns %s to table %s. Note: this can take several "
+                 "minutes on large databases and slow computers. Please "
+                 "be patient!", ', '.join(column.split(' ')[0]
+                                          for column in columns_def),
+                 table_name)
+
+    for column_def in columns_def:
+        engine.execute(text("ALTER TABLE {table} ADD COLUMN {column}".format(
+            table=table_name, column=column_def)))
+
+
 def _drop_index(engine, table_name, index_name):
     """Drop an index from a specified table.
 
@@ -143,6 +158,21 @@ def _apply_update(engine, new_version, old_version):
         _drop_index(engine, "states", "ix_states_entity_id_created")
 
         _create_index(engine, "states", "ix_states_entity_id_last_updated")
+    elif new_version == 5:
+        # The state_attributes table is created with the other missing
+        # tables. Existing states keep their own attributes.
+        _add_columns(engine, "states", ["attributes_id INTEGER"])
+        _create_index(engine, "states", "ix_states_attributes_id")
+    elif new_version == 6:
+        # The states of new state_changed events are only in the states table
+        _add_columns(engine, "states", ["old_state_id INTEGER"])
+        _create_index(engine, "states", "ix_states_event_id")
+    elif new_version == 7:
+        # The statistics tables are created with the other missing tables
+        pass
+    elif new_version == 8:
+        # The snapshot tables are created with the other missing tables
+        pass
     else:
         raise ValueError("No schema migration defined for version {}"
                          .format(new_version))
@@ -1,14 +1,17 @@
 """Models for SQLAlchemy."""
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
+import zlib
 
 from sqlalchemy import (
-    Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text,
-    distinct)
+    BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer,
+    String, Text, distinct)
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 
 import homeassistant.util.dt as dt_util
+from homeassistant.const import EVENT_STATE_CHANGED
 from homeassistant.core import Event, EventOrigin, State, split_entity_id
 from homeassistant.remote import JSONEncoder
 
@@ -16,7 +19,7 @@ from homeassistant.remote import JSONEncoder
 # pylint: disable=invalid-name
 Base = declarative_base()
 
-SCHEMA_VERSION = 4
+SCHEMA_VERSION = 8
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -33,19 +36,43 @@ class Events(Base):  # type: ignore
     created = Column(DateTime(timezone=True), default=datetime.utcnow)
 
     @staticmethod
-    def from_event(event):
-        """Create an event database object from a native event."""
+    def from_event(event, keep_states=False):
+        """Create an event database object from a native event.
+
+        The states of a state_changed event are only stored in the states
+        table, which refers to the event, unless keep_states is set because
+        the old state can not be referred to.
+        """
+        if event.event_type == EVENT_STATE_CHANGED and not keep_states:
+            event_data = '{}'
+        else:
+            event_data = json.dumps(event.data, cls=JSONEncoder)
+
         return Events(event_type=event.event_type,
-                      event_data=json.dumps(event.data, cls=JSONEncoder),
+                      event_data=event_data,
                       origin=str(event.origin),
                       time_fired=event.time_fired)
 
-    def to_native(self):
-        """Convert to a natve HA Event."""
+    def to_native(self, dbstate=None, old_dbstate=None):
+        """Convert to a natve HA Event.
+
+        The states of a state_changed event are added to the event data
+        from dbstate, its row in the states table, and old_dbstate, the row
+        of the previous state.
+        """
         try:
+            data = json.loads(self.event_data)
+
+            if dbstate is not None and not data:
+                data = {
+                    'entity_id': dbstate.entity_id,
+                    'old_state': _state_to_dict(old_dbstate),
+                    'new_state': _state_to_dict(dbstate),
+                }
+
             return Event(
                 self.event_type,
-                json.loads(self.event_data),
+                data,
                 EventOrigin(self.origin),
                 _process_timestamp(self.time_fired)
             )
@@ -63,8 +90,14 @@ class States(Base):   # type: ignore
     domain = Column(String(64))
     entity_id = Column(String(255))
     state = Column(String(255))
+    # Only set on rows written before attributes were shared between states
     attributes = Column(Text)
-    event_id = Column(Integer, ForeignKey('events.event_id'))
+    attributes_id = Column(
+        Integer, ForeignKey('state_attributes.attributes_id'), index=True)
+    event_id = Column(
+        Integer, ForeignKey('events.event_id'), index=True)
+    # State id of the previous state of the entity
+    old_state_id = Column(Integer)
     last_changed = Column(DateTime(timezone=True), default=datetime.utcnow)
     last_updated = Column(DateTime(timezone=True), default=datetime.utcnow,
                           index=True)
@@ -76,6 +109,10 @@ class States(Base):   # type: ignore
         Index(
             'ix_states_entity_id_last_updated', 'entity_id', 'last_updated'),)
 
+    # Loaded with the state in the same query
+    state_attributes = relationship(
+        'StateAttributes', lazy='joined', viewonly=True)
+
     @staticmethod
     def from_event(event):
         """Create object from a state_changed event."""
@@ -103,10 +140,17 @@ class States(Base):   # type: ignore
 
     def to_native(self):
         """Convert to an HA state object."""
+        if self.attributes is not None:
+            attributes = self.attributes
+        elif self.state_attributes is not None:
+            attributes = self.state_attributes.shared_attrs
+        else:
+            attributes = '{}'
+
         try:
-            return State(
+            return State.from_trusted(
                 self.entity_id, self.state,
-                json.loads(self.attributes),
+                json.loads(attributes),
                 _process_timestamp(self.last_changed),
                 _process_timestamp(self.last_updated)
             )
@@ -116,6 +160,97 @@ class States(Base):   # type: ignore
             return None
 
 
+class StateAttributes(Base):   # type: ignore
+    """Attributes that are shared between states."""
+
+    __tablename__ = 'state_attributes'
+    attributes_id = Column(Integer, primary_key=True)
+    hash = Column(BigInteger, index=True)
+    shared_attrs = Column(Text)
+
+    @staticmethod
+    def hash_shared_attrs(shared_attrs):
+        """Return the hash that is used to look up shared_attrs."""
+        return zlib.crc32(shared_attrs.encode('utf-8'))
+
+
+class StatisticsBase(object):
+    """Aggregates of the numeric states of an entity over a period."""
+
+    id = Column(Integer, primary_key=True)
+    entity_id = Column(String(255))
+    start = Column(DateTime(timezone=True))
+    mean = Column(Float)
+    min = Column(Float)
+    max = Column(Float)
+    last = Column(Float)
+    count = Column(Integer)
+
+    # Length of the periods and the fields of a time that are reset to get
+    # the start of its period
+    duration = None  # type: timedelta
+    _truncate = {}  # type: dict
+
+    @classmethod
+    def period_start(cls, time):
+        """Return the start of the period that contains time."""
+        return dt_util.as_utc(time).replace(microsecond=0, **cls._truncate)
+
+    def to_native(self, attributes=None):
+        """Convert to a native HA state with the mean as state.
+
+        The mean is rounded to the decimals of the last state, the sensor
+        reported that precision.
+        """
+        start = _process_timestamp(self.start)
+        mean = self.mean
+        decimals = _decimals(self.last)
+        if mean is not None and decimals is not None:
+            mean = round(mean, decimals)
+        return State(self.entity_id, str(mean), attributes, start, start)
+
+
+class StatisticsHour(Base, StatisticsBase):   # type: ignore
+    """Hourly aggregates of numeric states."""
+
+    __tablename__ = 'statistics_hour'
+    __table_args__ = (
+        Index('ix_statistics_hour_entity_id_start', 'entity_id', 'start'),)
+
+    duration = timedelta(hours=1)
+    _truncate = {'minute': 0, 'second': 0}
+
+
+class StatisticsDay(Base, StatisticsBase):   # type: ignore
+    """Daily aggregates of numeric states, the days start at UTC midnight."""
+
+    __tablename__ = 'statistics_day'
+    __table_args__ = (
+        Index('ix_statistics_day_entity_id_start', 'entity_id', 'start'),)
+
+    duration = timedelta(days=1)
+    _truncate = {'hour': 0, 'minute': 0, 'second': 0}
+
+
+class StateSnapshots(Base):   # type: ignore
+    """Checkpoint of the last recorded state of every entity."""
+
+    __tablename__ = 'state_snapshots'
+    snapshot_id = Column(Integer, primary_key=True)
+    # The snapshot has the last state before this time of every entity
+    point = Column(DateTime(timezone=True), index=True)
+    created = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class SnapshotStates(Base):   # type: ignore
+    """State of an entity in a snapshot."""
+
+    __tablename__ = 'snapshot_states'
+    snapshot_id = Column(
+        Integer, ForeignKey('state_snapshots.snapshot_id'), primary_key=True)
+    state_id = Column(Integer, primary_key=True)
+
+
 class RecorderRuns(Base):   # type: ignore
     """Representation of recorder run."""
 
@@ -164,6 +299,34 @@ class SchemaChanges(Base):   # type: ignore
     changed = Column(DateTime(timezone=True), default=datetime.utcnow)
 
 
+def _state_to_dict(dbstate):
+    """Convert a states row to the event data of a state.
+
+    Returns None if there is no row or the row records a removed state.
+    """
+    if dbstate is None or dbstate.state == '':
+        return None
+
+    state = dbstate.to_native()
+    return None if state is None else state.as_dict()
+
+
+def _decimals(value):
+    """Return the number of decimals of a float, None if it has an exponent.
+
+    The shortest representation is used, so it matches the state the float
+    was parsed from, apart from trailing zeros.
+    """
+    if value is None:
+        return None
+
+    text = repr(value)
+    if 'e' in text or '.' not in text:
+        return None
+
+    return len(text) - text.index('.') - 1
+
+
 def _process_timestamp(ts):
     """Process a timestamp into datetime object."""
     if ts is None:
@@ -4,34 +4,200 @@ import logging
 
 import homeassistant.util.dt as dt_util
 
+from .const import CONF_PURGE_KEEP_DAYS
 from .util import session_scope
 
 _LOGGER = logging.getLogger(__name__)
 
+# Max number of rows that are deleted from a table in one purge step, the
+# ids are passed as parameters and SQLite allows 999 parameters per query
+MAX_ROWS_TO_PURGE = 998
+# Max number of entity ids in a single query
+MAX_ENTITIES_PER_QUERY = 500
 
-def purge_old_data(instance, purge_days):
-    """Purge events and states older than purge_days ago."""
-    from .models import States, Events
-    purge_before = dt_util.utcnow() - timedelta(days=purge_days)
+
+def purge_old_data(instance, purge_days, max_rows=MAX_ROWS_TO_PURGE):
+    """Purge events, states and snapshots older than purge_days ago.
+
+    The states of entities with a retention rule are kept for the days of
+    their rule instead. Deletes at most max_rows rows per table, so the
+    database is not locked for long. Returns True when all old data is
+    purged, False if the purge has to be run again to delete the remaining
+    rows.
+    """
+    from sqlalchemy import exists
+    from .models import States, StateAttributes, Events
+    now = dt_util.utcnow()
+    purge_before = now - timedelta(days=purge_days)
 
     with session_scope(session=instance.get_session()) as session:
-        deleted_rows = session.query(States) \
-                              .filter((States.last_updated < purge_before)) \
-                              .delete(synchronize_session=False)
-        _LOGGER.debug("Deleted %s states", deleted_rows)
-
-        deleted_rows = session.query(Events) \
-                              .filter((Events.time_fired < purge_before)) \
-                              .delete(synchronize_session=False)
+        if instance.retention is None:
+            state_filters = [States.last_updated < purge_before]
+        else:
+            state_filters = [
+                States.entity_id.in_(entity_ids) &
+                (States.last_updated < now - timedelta(days=keep_days))
+                for keep_days, entity_ids in _state_groups(
+                    instance, session, purge_days)]
+
+        for state_filter in state_filters:
+            deleted_rows = _purge_states(session, state_filter, max_rows)
+            instance.purge_deleted_rows += deleted_rows
+
+            if deleted_rows == max_rows:
+                return False
+
+        deleted_rows = _purge_snapshots(session, purge_before, max_rows)
+        instance.purge_deleted_rows += deleted_rows
+
+        if deleted_rows == max_rows:
+            return False
+
+        event_filter = Events.time_fired < purge_before
+        if instance.retention is not None:
+            # Events of states that are kept longer are deleted with them
+            event_filter &= ~exists().where(
+                States.event_id == Events.event_id)
+
+        event_ids = session.query(Events.event_id) \
+                           .filter(event_filter) \
+                           .limit(max_rows)
+        deleted_rows = _delete_rows(session, Events.event_id, event_ids)
+        instance.purge_deleted_rows += deleted_rows
         _LOGGER.debug("Deleted %s events", deleted_rows)
 
-    # Execute sqlite vacuum command to free up space on disk
-    _LOGGER.debug("DB engine driver: %s", instance.engine.driver)
+        if deleted_rows == max_rows:
+            return False
+
+        used_attributes = session.query(States.attributes_id).filter(
+            States.attributes_id.isnot(None))
+        attributes_ids = session.query(StateAttributes.attributes_id) \
+                                .filter(~StateAttributes.attributes_id.in_(
+                                    used_attributes)) \
+                                .limit(max_rows)
+        deleted_rows = _delete_rows(
+            session, StateAttributes.attributes_id, attributes_ids)
+        instance.purge_deleted_rows += deleted_rows
+        _LOGGER.debug("Deleted %s state attributes", deleted_rows)
+
+        if deleted_rows == max_rows:
+            return False
+
+    # Free the pages of the deleted rows. A full VACUUM rewrites the whole
+    # database, the incremental vacuum only works on databases that are
+    # created with auto_vacuum set to incremental and does nothing on others.
     if instance.engine.driver == 'pysqlite':
         from sqlalchemy import exc
 
-        _LOGGER.info("Vacuuming SQLite to free space")
+        _LOGGER.debug("Running incremental vacuum on SQLite")
         try:
-            instance.engine.execute("VACUUM")
+            instance.engine.execute("PRAGMA incremental_vacuum")
         except exc.OperationalError as err:
             _LOGGER.error("Error vacuuming SQLite: %s.", err)
+
+    return True
+
+
+def _state_groups(instance, session, purge_days):
+    """Return the entity ids grouped by the days to keep them.
+
+    While a purge is running the groups are computed by its first step and
+    reused by the next ones, entities that are new since then have no old
+    states to purge.
+    """
+    cache = instance.purge_state_groups
+    groups = None if cache is None else cache.get(purge_days)
+
+    if groups is None:
+        groups = list(_entities_by_keep_days(
+            session, instance.retention, purge_days))
+
+        if instance.purge_running:
+            if cache is None:
+                cache = instance.purge_state_groups = {}
+            cache[purge_days] = groups
+
+    return groups
+
+
+def _entities_by_keep_days(session, retention, purge_days):
+    """Yield the recorded entity ids grouped by the days to keep them.
+
+    The groups are split so the queries that use them can use the index on
+    entity_id and last_updated.
+    """
+    from .models import States
+
+    groups = {}
+
+    for entity_id, in session.query(States.entity_id).distinct():
+        keep_days = retention.get(entity_id).get(
+            CONF_PURGE_KEEP_DAYS, purge_days)
+        groups.setdefault(keep_days, []).append(entity_id)
+
+    for keep_days, entity_ids in groups.items():
+        for idx in range(0, len(entity_ids), MAX_ENTITIES_PER_QUERY):
+            yield keep_days, entity_ids[idx:idx + MAX_ENTITIES_PER_QUERY]
+
+
+def _purge_states(session, state_filter, max_rows):
+    """Delete max_rows states that match state_filter and their events."""
+    from .models import States, Events
+
+    rows = session.query(States.state_id, States.event_id) \
+                  .filter(state_filter) \
+                  .limit(max_rows) \
+                  .all()
+
+    if not rows:
+        return 0
+
+    deleted_rows = session.query(States) \
+                          .filter(States.state_id.in_(
+                              [state_id for state_id, _ in rows])) \
+                          .delete(synchronize_session=False)
+    _LOGGER.debug("Deleted %s states", deleted_rows)
+
+    event_ids = [event_id for _, event_id in rows if event_id is not None]
+    if event_ids:
+        deleted_events = session.query(Events) \
+                                .filter(Events.event_id.in_(event_ids)) \
+                                .delete(synchronize_session=False)
+        _LOGGER.debug("Deleted %s events of the states", deleted_events)
+
+    return deleted_rows
+
+
+def _purge_snapshots(session, purge_before, max_rows):
+    """Delete max_rows snapshots before purge_before and their states."""
+    from .models import SnapshotStates, StateSnapshots
+
+    snapshot_ids = [row[0] for row in session.query(
+        StateSnapshots.snapshot_id).filter(
+            StateSnapshots.point < purge_before).limit(max_rows)]
+
+    if not snapshot_ids:
+        return 0
+
+    session.query(SnapshotStates) \
+           .filter(SnapshotStates.snapshot_id.in_(snapshot_ids)) \
+           .delete(synchronize_session=False)
+    deleted_rows = session.query(StateSnapshots) \
+                          .filter(StateSnapshots.snapshot_id.in_(
+                              snapshot_ids)) \
+                          .delete(synchronize_session=False)
+    _LOGGER.debug("Deleted %s snapshots", deleted_rows)
+
+    return deleted_rows
+
+
+def _delete_rows(session, column, ids_query):
+    """Delete the rows of the ids in ids_query, return how many."""
+    ids = [row[0] for row in ids_query]
+
+    if not ids:
+        return 0
+
+    return session.query(column.class_) \
+                  .filter(column.in_(ids)) \
+                  .delete(synchronize_session=False)
@@ -0,0 +1,89 @@
+"""Snapshots of the recorded states for point in time queries."""
+import logging
+
+import homeassistant.util.dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+# A snapshot of the states before every hour is written at this minute past
+# the hour, so the states before the hour are committed
+SNAPSHOT_MINUTE = 1
+
+
+def snapshot_point(time):
+    """Return the start of the hour of time, the point of its snapshot."""
+    return dt_util.as_utc(time).replace(minute=0, second=0, microsecond=0)
+
+
+def last_state_ids(session, point_in_time, run_start, entity_ids=None):
+    """Return a query of the id of the last state per entity.
+
+    Only states between run_start and point_in_time are looked at. The
+    states before the last snapshot are read from the snapshot, so only the
+    states since the snapshot are scanned.
+    """
+    from sqlalchemy import and_, func
+    from .models import SnapshotStates, StateSnapshots, States
+
+    snapshot = session.query(
+        StateSnapshots.snapshot_id, StateSnapshots.point
+    ).filter(
+        (StateSnapshots.point >= run_start) &
+        (StateSnapshots.point <= point_in_time)
+    ).order_by(StateSnapshots.point.desc()).first()
+
+    def states_query():
+        """Return a query of the states of entity_ids."""
+        query = session.query(
+            States.state_id.label('state_id'),
+            States.entity_id.label('entity_id'),
+            States.last_updated.label('last_updated'))
+        if entity_ids:
+            query = query.filter(States.entity_id.in_(entity_ids))
+        return query
+
+    scan_start = run_start if snapshot is None else snapshot.point
+
+    candidates = states_query().filter(
+        (States.last_updated >= scan_start) &
+        (States.last_updated < point_in_time))
+
+    if snapshot is not None:
+        candidates = candidates.union_all(
+            states_query().join(
+                SnapshotStates, SnapshotStates.state_id == States.state_id
+            ).filter(SnapshotStates.snapshot_id == snapshot.snapshot_id))
+
+    candidates = candidates.subquery()
+
+    most_recent_states_by_date = session.query(
+        candidates.c.entity_id.label('max_entity_id'),
+        func.max(candidates.c.last_updated).label('max_last_updated')
+    ).group_by(candidates.c.entity_id).subquery()
+
+    return session.query(
+        func.max(candidates.c.state_id).label('max_state_id')
+    ).select_from(candidates).join(most_recent_states_by_date, and_(
+        candidates.c.entity_id == most_recent_states_by_date.c.max_entity_id,
+        candidates.c.last_updated ==
+        most_recent_states_by_date.c.max_last_updated
+    )).group_by(candidates.c.entity_id)
+
+
+def write_snapshot(session, point, run_start):
+    """Write a snapshot of the last state before point of every entity."""
+    from .models import SnapshotStates, StateSnapshots
+
+    state_ids = [row.max_state_id for row in last_state_ids(
+        session, point, run_start)]
+
+    snapshot = StateSnapshots(point=point, created=dt_util.utcnow())
+    session.add(snapshot)
+    session.flush()
+
+    if state_ids:
+        session.execute(SnapshotStates.__table__.insert(), [
+            {'snapshot_id': snapshot.snapshot_id, 'state_id': state_id}
+            for state_id in state_ids])
+
+    _LOGGER.debug("Wrote snapshot of %d states at %s", len(state_ids), point)
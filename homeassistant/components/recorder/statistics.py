@@ -0,0 +1,178 @@
+"""Maintain long-term statistics of numeric states."""
+import logging
+import math
+
+from homeassistant.const import ATTR_UNIT_OF_MEASUREMENT
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def numeric_value(state):
+    """Return the state as float if it has statistics, else None.
+
+    Only states with a unit of measurement are aggregated.
+    """
+    if state is None or \
+            ATTR_UNIT_OF_MEASUREMENT not in state.attributes:
+        return None
+
+    try:
+        value = float(state.state)
+    except ValueError:
+        return None
+
+    return value if math.isfinite(value) else None
+
+
+class _Period(object):
+    """Aggregates of an entity over a single period."""
+
+    __slots__ = ['id', 'start', 'mean', 'min', 'max', 'last', 'count']
+
+    def __init__(self, start, value, row_id=None):
+        """Initialize the period with its first value."""
+        self.id = row_id
+        self.start = start
+        self.mean = self.min = self.max = self.last = value
+        self.count = 1
+
+    def copy(self):
+        """Return a copy of the period."""
+        period = _Period(self.start, self.last, self.id)
+        period.mean = self.mean
+        period.min = self.min
+        period.max = self.max
+        period.count = self.count
+        return period
+
+    def add(self, value):
+        """Add a value to the aggregates."""
+        self.count += 1
+        self.mean += (value - self.mean) / self.count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.last = value
+
+    def values(self):
+        """Return the aggregates as column values."""
+        return {
+            'mean': self.mean,
+            'min': self.min,
+            'max': self.max,
+            'last': self.last,
+            'count': self.count,
+        }
+
+
+class StatisticsCompiler(object):
+    """Update the hourly and daily statistics as states are recorded.
+
+    The aggregates of the current period of every entity are kept in
+    memory, so recording a state only writes the periods it changed. The
+    changes of a transaction are made on copies that are only kept when
+    the transaction is committed, so a failed commit can be retried with
+    the same states.
+    """
+
+    def __init__(self):
+        """Initialize the compiler."""
+        from .models import StatisticsDay, StatisticsHour
+
+        self.models = (StatisticsHour, StatisticsDay)
+        # Current period per model and entity id
+        self._periods = {}
+
+    def add_states(self, session, states):
+        """Add states to the statistics and write the changed periods.
+
+        Returns the changed periods to pass to committed.
+        """
+        # Latest changed period per model and entity id
+        changed = {}
+        # Every period that is changed in this transaction
+        dirty = []
+
+        for state in states:
+            value = numeric_value(state)
+            if value is None:
+                continue
+
+            for model in self.models:
+                key = (model, state.entity_id)
+                start = model.period_start(state.last_updated)
+                period = changed.get(key) or self._periods.get(key)
+
+                if period is not None and period.start == start:
+                    if key not in changed:
+                        period = changed[key] = period.copy()
+                        dirty.append((model, state.entity_id, period))
+                    period.add(value)
+                elif period is None:
+                    # Not known since the start of the recorder
+                    period = changed[key] = self._load_period(
+                        session, model, state.entity_id, start, value)
+                    dirty.append((model, state.entity_id, period))
+                elif period.start < start:
+                    period = changed[key] = _Period(start, value)
+                    dirty.append((model, state.entity_id, period))
+                # States of a period that is done are not added again
+
+        pending = []
+        updates = {}
+        for model, entity_id, period in dirty:
+            if period.id is None:
+                row = model(entity_id=entity_id, start=period.start,
+                            **period.values())
+                session.add(row)
+                pending.append((period, row))
+            else:
+                values = period.values()
+                values['period_id'] = period.id
+                updates.setdefault(model, []).append(values)
+
+        if pending:
+            session.flush()
+            for period, row in pending:
+                period.id = row.id
+
+        # Update the periods of a model in a single statement
+        for model, values in updates.items():
+            session.execute(self._update_statement(model), values)
+
+        return changed
+
+    @staticmethod
+    def _update_statement(model):
+        """Return the statement to update the aggregates of a period."""
+        from sqlalchemy import bindparam
+
+        table = model.__table__
+        return table.update().where(
+            table.c.id == bindparam('period_id')).values(
+                {column: bindparam(column)
+                 for column in ('mean', 'min', 'max', 'last', 'count')})
+
+    def committed(self, changed):
+        """Keep the periods of a committed transaction."""
+        self._periods.update(changed)
+
+    @staticmethod
+    def _load_period(session, model, entity_id, start, value):
+        """Return the period that starts at start with value added.
+
+        The period is read from the database if it was written before, for
+        example before a restart.
+        """
+        row = session.query(model).filter(
+            (model.entity_id == entity_id) & (model.start == start)).first()
+
+        if row is None:
+            return _Period(start, value)
+
+        period = _Period(start, row.last, row.id)
+        period.mean = row.mean
+        period.min = row.min
+        period.max = row.max
+        period.count = row.count
+        period.add(value)
+        return period
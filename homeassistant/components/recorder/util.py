@@ -12,14 +12,26 @@ QUERY_RETRY_WAIT = 0.1
 
 
 @contextmanager
-def session_scope(*, hass=None, session=None):
-    """Provide a transactional scope around a series of operations."""
+def session_scope(*, hass=None, session=None, read_only=False):
+    """Provide a transactional scope around a series of operations.
+
+    Pass read_only to use a connection of the read pool of the recorder,
+    which does not wait for the writes of the recorder.
+    """
+    instance = None
+
     if session is None and hass is not None:
-        session = hass.data[DATA_INSTANCE].get_session()
+        instance = hass.data[DATA_INSTANCE]
+        if read_only:
+            session = instance.get_read_session()
+        else:
+            session = instance.get_session()
 
     if session is None:
         raise RuntimeError('Session required')
 
+    start = time.monotonic()
+
     try:
         yield session
         session.commit()
@@ -30,6 +42,9 @@ def session_scope(*, hass=None, session=None):
     finally:
         session.close()
 
+        if read_only and instance is not None:
+            instance.record_read_session(time.monotonic() - start)
+
 
 def commit(session, work):
     """Commit & retry work: Either a model or in a function."""
@@ -49,9 +64,10 @@ def commit(session, work):
     return False
 
 
-def execute(qry):
+def execute(qry, to_native=None):
     """Query the database and convert the objects to HA native form.
 
+    Pass to_native to convert rows that are not a single model.
     This method also retries a few times in the case of stale connections.
     """
     from sqlalchemy.exc import SQLAlchemyError
@@ -61,7 +77,8 @@ def execute(qry):
             timer_start = time.perf_counter()
             result = [
                 row for row in
-                (row.to_native() for row in qry)
+                (row.to_native() if to_native is None else to_native(row)
+                 for row in qry)
                 if row is not None]
 
             if _LOGGER.isEnabledFor(logging.DEBUG):
@@ -0,0 +1,70 @@
+"""
+Sensor for the latency of the Home Assistant event loop.
+
+For more details about this platform, please refer to the documentation at
+https://home-assistant.io/components/sensor.loop_lag/
+"""
+import asyncio
+import logging
+
+import voluptuous as vol
+
+import homeassistant.helpers.config_validation as cv
+from homeassistant.components.sensor import PLATFORM_SCHEMA
+from homeassistant.const import CONF_NAME
+from homeassistant.helpers.entity import Entity
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_NAME = 'Event loop lag'
+
+PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
+    vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
+})
+
+
+@asyncio.coroutine
+def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
+    """Set up the event loop lag sensor platform."""
+    if hass.loop_watchdog is None:
+        _LOGGER.error("The event loop watchdog is disabled, set "
+                      "loop_lag_threshold in the homeassistant section")
+        return
+
+    async_add_devices([LoopLagSensor(
+        config.get(CONF_NAME), hass.loop_watchdog)], True)
+
+
+class LoopLagSensor(Entity):
+    """Representation of the max event loop lag since the last update."""
+
+    def __init__(self, name, watchdog):
+        """Initialize the event loop lag sensor."""
+        self._name = name
+        self._watchdog = watchdog
+        self._state = None
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def icon(self):
+        """Icon to display in the front end."""
+        return 'mdi:timer-sand'
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement the value is expressed in."""
+        return 'ms'
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        return self._state
+
+    @asyncio.coroutine
+    def async_update(self):
+        """Update the state of the sensor."""
+        self._state = round(self._watchdog.async_pop_max_lag() * 1000, 1)
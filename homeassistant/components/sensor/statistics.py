@@ -208,7 +208,7 @@ class StatisticsSensor(Entity):
         _LOGGER.debug("initializing values for %s from the database",
                       self.entity_id)
 
-        with session_scope(hass=self._hass) as session:
+        with session_scope(hass=self._hass, read_only=True) as session:
             query = session.query(States)\
                 .filter(States.entity_id == self._entity_id.lower())\
                 .order_by(States.last_updated.desc())\
@@ -18,7 +18,8 @@ from homeassistant.const import (
 from homeassistant.exceptions import TemplateError
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity import Entity, async_generate_entity_id
-from homeassistant.helpers.event import async_track_state_change
+from homeassistant.helpers.event import (
+    RenderTracker, async_track_state_change)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -47,8 +48,7 @@ def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
         icon_template = device_config.get(CONF_ICON_TEMPLATE)
         entity_picture_template = device_config.get(
             CONF_ENTITY_PICTURE_TEMPLATE)
-        entity_ids = (device_config.get(ATTR_ENTITY_ID) or
-                      state_template.extract_entities())
+        entity_ids = device_config.get(ATTR_ENTITY_ID)
         friendly_name = device_config.get(ATTR_FRIENDLY_NAME, device)
         unit_of_measurement = device_config.get(ATTR_UNIT_OF_MEASUREMENT)
 
@@ -98,6 +98,7 @@ class SensorTemplate(Entity):
         self._icon = None
         self._entity_picture = None
         self._entities = entity_ids
+        self._tracker = None
 
     @asyncio.coroutine
     def async_added_to_hass(self):
@@ -110,8 +111,13 @@ class SensorTemplate(Entity):
         @callback
         def template_sensor_startup(event):
             """Update template on startup."""
-            async_track_state_change(
-                self.hass, self._entities, template_sensor_state_listener)
+            if self._entities is not None:
+                async_track_state_change(
+                    self.hass, self._entities, template_sensor_state_listener)
+            else:
+                # Track the states that the templates read
+                self._tracker = RenderTracker(
+                    self.hass, template_sensor_state_listener)
 
             self.async_schedule_update_ha_state(True)
 
@@ -148,9 +154,24 @@ class SensorTemplate(Entity):
         """No polling needed."""
         return False
 
+    @property
+    def state_fingerprint(self):
+        """Return the rendered values, the only parts that can change."""
+        return (self._state, self._icon, self._entity_picture)
+
     @asyncio.coroutine
     def async_update(self):
         """Update the state from the template."""
+        if self._tracker is None:
+            self._async_render()
+            return
+
+        with self._tracker.async_collect():
+            self._async_render()
+
+    @callback
+    def _async_render(self):
+        """Render the templates."""
         try:
             self._state = self._template.async_render()
         except TemplateError as ex:
@@ -19,7 +19,8 @@ from homeassistant.const import (
 from homeassistant.exceptions import TemplateError
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity import async_generate_entity_id
-from homeassistant.helpers.event import async_track_state_change
+from homeassistant.helpers.event import (
+    RenderTracker, async_track_state_change)
 from homeassistant.helpers.script import Script
 
 _LOGGER = logging.getLogger(__name__)
@@ -57,8 +58,7 @@ def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
             CONF_ENTITY_PICTURE_TEMPLATE)
         on_action = device_config[ON_ACTION]
         off_action = device_config[OFF_ACTION]
-        entity_ids = (device_config.get(ATTR_ENTITY_ID) or
-                      state_template.extract_entities())
+        entity_ids = device_config.get(ATTR_ENTITY_ID)
 
         state_template.hass = hass
 
@@ -102,6 +102,7 @@ class SwitchTemplate(SwitchDevice):
         self._icon = None
         self._entity_picture = None
         self._entities = entity_ids
+        self._tracker = None
 
     @asyncio.coroutine
     def async_added_to_hass(self):
@@ -114,8 +115,13 @@ class SwitchTemplate(SwitchDevice):
         @callback
         def template_switch_startup(event):
             """Update template on startup."""
-            async_track_state_change(
-                self.hass, self._entities, template_switch_state_listener)
+            if self._entities is not None:
+                async_track_state_change(
+                    self.hass, self._entities, template_switch_state_listener)
+            else:
+                # Track the states that the templates read
+                self._tracker = RenderTracker(
+                    self.hass, template_switch_state_listener)
 
             self.async_schedule_update_ha_state(True)
 
@@ -165,6 +171,16 @@ class SwitchTemplate(SwitchDevice):
     @asyncio.coroutine
     def async_update(self):
         """Update the state from the template."""
+        if self._tracker is None:
+            self._async_render()
+            return
+
+        with self._tracker.async_collect():
+            self._async_render()
+
+    @callback
+    def _async_render(self):
+        """Render the templates."""
         try:
             state = self._template.async_render().lower()
 
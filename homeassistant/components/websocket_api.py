@@ -21,6 +21,7 @@ from homeassistant.components import frontend
 from homeassistant.core import callback
 from homeassistant.remote import JSONEncoder
 from homeassistant.helpers import config_validation as cv
+import homeassistant.util.dt as dt_util
 from homeassistant.components.http import HomeAssistantView
 from homeassistant.components.http.auth import validate_password
 from homeassistant.components.http.const import KEY_AUTHENTICATED
@@ -36,6 +37,7 @@ MAX_PENDING_MSG = 512
 ERR_ID_REUSE = 1
 ERR_INVALID_FORMAT = 2
 ERR_NOT_FOUND = 3
+ERR_UNKNOWN_ERROR = 4
 
 TYPE_AUTH = 'auth'
 TYPE_AUTH_INVALID = 'auth_invalid'
@@ -47,10 +49,12 @@ TYPE_GET_CONFIG = 'get_config'
 TYPE_GET_PANELS = 'get_panels'
 TYPE_GET_SERVICES = 'get_services'
 TYPE_GET_STATES = 'get_states'
+TYPE_LOGBOOK = 'logbook'
 TYPE_PING = 'ping'
 TYPE_PONG = 'pong'
 TYPE_RESULT = 'result'
 TYPE_SUBSCRIBE_EVENTS = 'subscribe_events'
+TYPE_SUBSCRIBE_LOGBOOK = 'subscribe_logbook'
 TYPE_UNSUBSCRIBE_EVENTS = 'unsubscribe_events'
 
 _LOGGER = logging.getLogger(__name__)
@@ -68,6 +72,14 @@ SUBSCRIBE_EVENTS_MESSAGE_SCHEMA = vol.Schema({
     vol.Optional('event_type', default=MATCH_ALL): str,
 })
 
+SUBSCRIBE_LOGBOOK_MESSAGE_SCHEMA = vol.Schema({
+    vol.Required('id'): cv.positive_int,
+    vol.Required('type'): TYPE_SUBSCRIBE_LOGBOOK,
+    vol.Optional('start_time'): cv.datetime,
+    vol.Optional('entity_id'): cv.entity_id,
+    vol.Optional('page_size'): vol.All(vol.Coerce(int), vol.Range(min=1)),
+})
+
 UNSUBSCRIBE_EVENTS_MESSAGE_SCHEMA = vol.Schema({
     vol.Required('id'): cv.positive_int,
     vol.Required('type'): TYPE_UNSUBSCRIBE_EVENTS,
@@ -111,6 +123,7 @@ BASE_COMMAND_MESSAGE_SCHEMA = vol.Schema({
     vol.Required('id'): cv.positive_int,
     vol.Required('type'): vol.Any(TYPE_CALL_SERVICE,
                                   TYPE_SUBSCRIBE_EVENTS,
+                                  TYPE_SUBSCRIBE_LOGBOOK,
                                   TYPE_UNSUBSCRIBE_EVENTS,
                                   TYPE_GET_STATES,
                                   TYPE_GET_SERVICES,
@@ -153,6 +166,16 @@ def event_message(iden, event):
     }
 
 
+def logbook_message(iden, entries, backfill):
+    """Return a logbook entries message."""
+    return {
+        'id': iden,
+        'type': TYPE_LOGBOOK,
+        'entries': entries,
+        'backfill': backfill,
+    }
+
+
 def error_message(iden, code, message):
     """Return an error result message."""
     return {
@@ -411,10 +434,58 @@ class ActiveConnection:
 
             self.send_message_outside(event_message(msg['id'], event))
 
-        self.event_listeners[msg['id']] = self.hass.bus.async_listen(
-            msg['event_type'], forward_events)
+        if msg['event_type'] == MATCH_ALL:
+            self.event_listeners[msg['id']] = self.hass.bus.async_listen(
+                MATCH_ALL, forward_events, exclude=[EVENT_TIME_CHANGED])
+        else:
+            self.event_listeners[msg['id']] = self.hass.bus.async_listen(
+                msg['event_type'], forward_events)
+
+        self.to_write.put_nowait(result_message(msg['id']))
+
+    def handle_subscribe_logbook(self, msg):
+        """Handle subscribe logbook command.
+
+        The entries since start_time are sent first, then the entries of
+        the new events. The subscription is ended with unsubscribe_events.
+
+        Async friendly.
+        """
+        msg = SUBSCRIBE_LOGBOOK_MESSAGE_SCHEMA(msg)
+
+        if 'logbook' not in self.hass.config.components:
+            self.to_write.put_nowait(error_message(
+                msg['id'], ERR_NOT_FOUND, 'Logbook not loaded.'))
+            return
+
+        from homeassistant.components import logbook
+
+        page_size = vol.Range(max=logbook.MAX_LIMIT)(
+            msg.get('page_size', logbook.DEFAULT_PAGE_SIZE))
+
+        @asyncio.coroutine
+        def send_entries(entries, backfill):
+            """Send logbook entries, the backfill waits for the client."""
+            message = logbook_message(msg['id'], entries, backfill)
+            if backfill:
+                yield from self.to_write.put(message)
+            else:
+                self.send_message_outside(message)
+
+        @asyncio.coroutine
+        def send_error(message):
+            """Send the error that ended the subscription."""
+            yield from self.to_write.put(error_message(
+                msg['id'], ERR_UNKNOWN_ERROR, message))
+
+        start_time = msg.get('start_time', dt_util.start_of_local_day())
+        subscription = logbook.LogbookSubscription(
+            self.hass, self.hass.data[logbook.DOMAIN], send_entries,
+            msg.get('entity_id'), send_error)
+        self.event_listeners[msg['id']] = subscription.async_stop
 
         self.to_write.put_nowait(result_message(msg['id']))
+        subscription.async_start(dt_util.as_utc(start_time), page_size)
 
     def handle_unsubscribe_events(self, msg):
         """Handle unsubscribe events command.
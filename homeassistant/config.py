@@ -19,7 +19,7 @@ from homeassistant.const import (
     CONF_TIME_ZONE, CONF_ELEVATION, CONF_UNIT_SYSTEM_METRIC,
     CONF_UNIT_SYSTEM_IMPERIAL, CONF_TEMPERATURE_UNIT, TEMP_CELSIUS,
     __version__, CONF_CUSTOMIZE, CONF_CUSTOMIZE_DOMAIN, CONF_CUSTOMIZE_GLOB,
-    CONF_WHITELIST_EXTERNAL_DIRS)
+    CONF_WHITELIST_EXTERNAL_DIRS, CONF_LOOP_LAG_THRESHOLD)
 from homeassistant.core import callback, DOMAIN as CONF_CORE
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.loader import get_component, get_platform
@@ -147,6 +147,8 @@ CORE_CONFIG_SCHEMA = CUSTOMIZE_CONFIG_SCHEMA.extend({
         # pylint: disable=no-value-for-parameter
         vol.All(cv.ensure_list, [vol.IsDir()]),
     vol.Optional(CONF_PACKAGES, default={}): PACKAGES_CONFIG_SCHEMA,
+    vol.Optional(CONF_LOOP_LAG_THRESHOLD): vol.All(
+        vol.Coerce(float), vol.Range(min=0)),
 })
 
 
@@ -393,10 +395,13 @@ def async_process_ha_core_config(hass, config):
     for key, attr in ((CONF_LATITUDE, 'latitude'),
                       (CONF_LONGITUDE, 'longitude'),
                       (CONF_NAME, 'location_name'),
-                      (CONF_ELEVATION, 'elevation')):
+                      (CONF_ELEVATION, 'elevation'),
+                      (CONF_LOOP_LAG_THRESHOLD, 'loop_lag_threshold')):
         if key in config:
             setattr(hac, attr, config[key])
 
+    hass.async_setup_loop_watchdog()
+
     if CONF_TIME_ZONE in config:
         set_time_zone(config.get(CONF_TIME_ZONE))
 
@@ -86,6 +86,7 @@ CONF_IP_ADDRESS = 'ip_address'
 CONF_LATITUDE = 'latitude'
 CONF_LONGITUDE = 'longitude'
 CONF_LIGHTS = 'lights'
+CONF_LOOP_LAG_THRESHOLD = 'loop_lag_threshold'
 CONF_MAC = 'mac'
 CONF_METHOD = 'method'
 CONF_MAXIMUM = 'maximum'
@@ -6,6 +6,7 @@ of entities and react to changes.
 """
 # pylint: disable=unused-import, too-many-lines
 import asyncio
+import bisect
 from concurrent.futures import ThreadPoolExecutor
 import enum
 import logging
@@ -39,6 +40,8 @@ from homeassistant.util.async import (
 import homeassistant.util as util
 import homeassistant.util.dt as dt_util
 import homeassistant.util.location as location
+from homeassistant.util.executor import ExecutorPools, job_owner
+from homeassistant.util.loop_watchdog import LoopWatchdog
 from homeassistant.util.unit_system import UnitSystem, METRIC_SYSTEM  # NOQA
 
 DOMAIN = 'homeassistant'
@@ -117,16 +120,18 @@ class HomeAssistant(object):
         else:
             self.loop = loop or asyncio.get_event_loop()
 
-        executor_opts = {'max_workers': 10}
+        max_workers = 10
         if sys.version_info[:2] >= (3, 5):
-            # It will default set to the number of processors on the machine,
-            # multiplied by 5. That is better for overlap I/O workers.
-            executor_opts['max_workers'] = None
+            # The number of processors on the machine, multiplied by 5, the
+            # default of Python 3.5. That is better for overlap I/O workers.
+            max_workers = (os.cpu_count() or 1) * 5
+        executor_opts = {'max_workers': max_workers}
         if sys.version_info[:2] >= (3, 6):
             executor_opts['thread_name_prefix'] = 'SyncWorker'
 
         self.executor = ThreadPoolExecutor(**executor_opts)
         self.loop.set_default_executor(self.executor)
+        self.executors = ExecutorPools(self.loop, self.executor, max_workers)
         self.loop.set_exception_handler(async_loop_exception_handler)
         self._pending_tasks = []
         self._track_task = True
@@ -140,6 +145,9 @@ class HomeAssistant(object):
         self.data = {}
         self.state = CoreState.not_running
         self.exit_code = None
+        # Object with a wrap_job method to time jobs, set by the profiler
+        self.job_profiler = None
+        self.loop_watchdog = None  # type: Optional[LoopWatchdog]
 
     @property
     def is_running(self) -> bool:
@@ -175,6 +183,7 @@ class HomeAssistant(object):
 
         # pylint: disable=protected-access
         self.loop._thread_ident = threading.get_ident()
+        self.async_setup_loop_watchdog()
         self.bus.async_fire(EVENT_HOMEASSISTANT_START)
 
         try:
@@ -215,14 +224,21 @@ class HomeAssistant(object):
         """
         task = None
 
+        if not (asyncio.iscoroutine(target) or is_callback(target) or
+                asyncio.iscoroutinefunction(target)):
+            # Jobs of the same integration share an executor pool
+            return self.async_add_executor_job(
+                job_owner(target), target, *args)
+
+        if self.job_profiler is not None:
+            target = self.job_profiler.wrap_job(target)
+
         if asyncio.iscoroutine(target):
             task = self.loop.create_task(target)
         elif is_callback(target):
             self.loop.call_soon(target, *args)
-        elif asyncio.iscoroutinefunction(target):
-            task = self.loop.create_task(target(*args))
         else:
-            task = self.loop.run_in_executor(None, target, *args)
+            task = self.loop.create_task(target(*args))
 
         # If a task is scheduled
         if self._track_task and task is not None:
@@ -230,6 +246,57 @@ class HomeAssistant(object):
 
         return task
 
+    @callback
+    def async_add_executor_job(self, pool: str, target: Callable[..., Any],
+                               *args: Any) -> asyncio.Future:
+        """Add a job to run in a worker of the executor pool named pool.
+
+        This method must be run in the event loop.
+
+        pool: name of the executor pool, usually the owning integration.
+        target: target to call.
+        args: parameters for method to call.
+        """
+        if self.job_profiler is not None:
+            target = self.job_profiler.wrap_job(target)
+
+        task = self.executors.async_submit(pool, target, *args)
+
+        if self._track_task:
+            self._pending_tasks.append(task)
+
+        return task
+
+    @callback
+    def async_setup_loop_watchdog(self):
+        """Start the event loop watchdog if it is enabled in the config.
+
+        This is done when the core config is processed, so the set up of
+        the components is watched as well. A watchdog that is running
+        already takes the threshold of the config.
+
+        This method must be run in the event loop.
+        """
+        threshold = self.config.loop_lag_threshold
+
+        if self.loop_watchdog is not None:
+            if threshold:
+                self.loop_watchdog.threshold = threshold
+            return
+
+        if not threshold:
+            return
+
+        self.loop_watchdog = LoopWatchdog(self.loop, threshold)
+
+        @callback
+        def stop_watchdog(event):
+            """Stop the watchdog."""
+            self.loop_watchdog.async_stop()
+
+        self.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, stop_watchdog)
+        self.loop_watchdog.async_start()
+
     @callback
     def async_track_tasks(self):
         """Track tasks so you can wait for all tasks to be done."""
@@ -250,6 +317,8 @@ class HomeAssistant(object):
         args: parameters for method to call.
         """
         if not asyncio.iscoroutine(target) and is_callback(target):
+            if self.job_profiler is not None:
+                target = self.job_profiler.wrap_job(target)
             target(*args)
         else:
             self.async_add_job(target, *args)
@@ -362,6 +431,11 @@ class EventBus(object):
     def __init__(self, hass: HomeAssistant) -> None:
         """Initialize a new event bus."""
         self._listeners = {}
+        self._filtered_listeners = []
+        self._filtered_listener_cache = {}
+        self._entity_listeners = {}
+        self._domain_listeners = {}
+        self._entity_listener_count = 0
         self._hass = hass
 
     @callback
@@ -370,8 +444,19 @@ class EventBus(object):
 
         This method must be run in the event loop.
         """
-        return {key: len(self._listeners[key])
-                for key in self._listeners}
+        listeners = {key: len(self._listeners[key])
+                     for key in self._listeners}
+
+        if self._filtered_listeners:
+            listeners[MATCH_ALL] = listeners.get(MATCH_ALL, 0) + \
+                len(self._filtered_listeners)
+
+        if self._entity_listener_count:
+            listeners[EVENT_STATE_CHANGED] = \
+                listeners.get(EVENT_STATE_CHANGED, 0) + \
+                self._entity_listener_count
+
+        return listeners
 
     @property
     def listeners(self):
@@ -400,6 +485,25 @@ class EventBus(object):
                 event_type != EVENT_HOMEASSISTANT_CLOSE):
             listeners = match_all_listeners + listeners
 
+        if (self._filtered_listeners and
+                event_type != EVENT_HOMEASSISTANT_CLOSE):
+            filtered_listeners = self._async_filtered_listeners(event_type)
+            if filtered_listeners:
+                listeners = filtered_listeners + listeners
+
+        if (event_type == EVENT_STATE_CHANGED and
+                self._entity_listener_count and event_data is not None):
+            entity_id = event_data.get('entity_id')
+            entity_listeners = self._entity_listeners.get(entity_id)
+            if entity_listeners is not None:
+                listeners = listeners + entity_listeners
+
+            if self._domain_listeners and entity_id is not None:
+                domain_listeners = self._domain_listeners.get(
+                    entity_id.split('.', 1)[0])
+                if domain_listeners is not None:
+                    listeners = listeners + domain_listeners
+
         event = Event(event_type, event_data, origin)
 
         if event_type != EVENT_TIME_CHANGED:
@@ -411,14 +515,15 @@ class EventBus(object):
         for func in listeners:
             self._hass.async_add_job(func, event)
 
-    def listen(self, event_type, listener):
+    def listen(self, event_type, listener, include=None, exclude=None):
         """Listen for all events or events of a specific type.
 
         To listen to all events specify the constant ``MATCH_ALL``
         as event_type.
         """
         async_remove_listener = run_callback_threadsafe(
-            self._hass.loop, self.async_listen, event_type, listener).result()
+            self._hass.loop, self.async_listen, event_type, listener,
+            include, exclude).result()
 
         def remove_listener():
             """Remove the listener."""
@@ -428,14 +533,23 @@ class EventBus(object):
         return remove_listener
 
     @callback
-    def async_listen(self, event_type, listener):
+    def async_listen(self, event_type, listener, include=None, exclude=None):
         """Listen for all events or events of a specific type.
 
         To listen to all events specify the constant ``MATCH_ALL``
-        as event_type.
+        as event_type. Listeners for all events can pass event types to
+        include or exclude, events that do not pass are never scheduled.
 
         This method must be run in the event loop.
         """
+        if include is not None or exclude is not None:
+            if event_type != MATCH_ALL:
+                raise ValueError(
+                    "Event type filters require event type {}".format(
+                        MATCH_ALL))
+
+            return self._async_listen_filtered(listener, include, exclude)
+
         if event_type in self._listeners:
             self._listeners[event_type].append(listener)
         else:
@@ -447,6 +561,104 @@ class EventBus(object):
 
         return remove_listener
 
+    @callback
+    def _async_listen_filtered(self, listener, include, exclude):
+        """Listen for all events with a type that passes the filters.
+
+        This method must be run in the event loop.
+        """
+        entry = (listener,
+                 None if include is None else frozenset(include),
+                 None if exclude is None else frozenset(exclude))
+        self._filtered_listeners.append(entry)
+        self._filtered_listener_cache.clear()
+
+        def remove_listener():
+            """Remove the listener."""
+            try:
+                self._filtered_listeners.remove(entry)
+            except ValueError:
+                _LOGGER.warning(
+                    "Unable to remove unknown listener %s", listener)
+                return
+            self._filtered_listener_cache.clear()
+
+        return remove_listener
+
+    @callback
+    def _async_filtered_listeners(self, event_type):
+        """Return the filtered listeners that want events of event_type.
+
+        This method must be run in the event loop.
+        """
+        listeners = self._filtered_listener_cache.get(event_type)
+
+        if listeners is None:
+            listeners = self._filtered_listener_cache[event_type] = [
+                listener for listener, include, exclude
+                in self._filtered_listeners
+                if (include is None or event_type in include) and
+                (exclude is None or event_type not in exclude)]
+
+        return listeners
+
+    @callback
+    def async_listen_entity(self, entity_ids, listener):
+        """Listen for state_changed events of specific entities.
+
+        The listener is indexed by entity_id so that it is only scheduled for
+        state changes of the given entities, instead of being called for
+        every state change on the bus.
+
+        This method must be run in the event loop.
+        """
+        return self._async_listen_indexed(
+            self._entity_listeners, entity_ids, listener)
+
+    @callback
+    def async_listen_domain(self, domains, listener):
+        """Listen for state_changed events of the entities of domains.
+
+        The listener is indexed by domain like the listeners of
+        async_listen_entity.
+
+        This method must be run in the event loop.
+        """
+        return self._async_listen_indexed(
+            self._domain_listeners, domains, listener)
+
+    @callback
+    def _async_listen_indexed(self, index, keys, listener):
+        """Add a state_changed listener to index for each of keys.
+
+        This method must be run in the event loop.
+        """
+        if isinstance(keys, str):
+            keys = (keys,)
+
+        keys = tuple(key.lower() for key in keys)
+
+        for key in keys:
+            if key in index:
+                index[key].append(listener)
+            else:
+                index[key] = [listener]
+
+        self._entity_listener_count += 1
+        removed = False
+
+        def remove_listener():
+            """Remove the listener."""
+            nonlocal removed
+            if removed:
+                _LOGGER.warning(
+                    "Unable to remove unknown listener %s", listener)
+                return
+            removed = True
+            self._async_remove_indexed_listener(index, keys, listener)
+
+        return remove_listener
+
     def listen_once(self, event_type, listener):
         """Listen once for event of a specific type.
 
@@ -510,6 +722,37 @@ class EventBus(object):
             # ValueError if listener did not exist within event_type
             _LOGGER.warning("Unable to remove unknown listener %s", listener)
 
+    @callback
+    def _async_remove_indexed_listener(self, index, keys, listener):
+        """Remove a listener of specific entity_ids or domains.
+
+        This method must be run in the event loop.
+        """
+        self._entity_listener_count -= 1
+
+        for key in keys:
+            listeners = index.get(key)
+            if listeners is None:
+                continue
+
+            # A listener can be registered twice for the same key if keys
+            # contained duplicates, remove one per entry.
+            try:
+                listeners.remove(listener)
+            except ValueError:
+                continue
+
+            if not listeners:
+                index.pop(key)
+
+
+def _attributes_proxy(attributes):
+    """Return a read-only view of attributes, reusing an existing one."""
+    if isinstance(attributes, MappingProxyType):
+        return attributes
+
+    return MappingProxyType(attributes or {})
+
 
 class State(object):
     """Object to represent a state within the state machine.
@@ -521,7 +764,7 @@ class State(object):
     last_updated: last time this object was updated.
     """
 
-    __slots__ = ['entity_id', 'state', 'attributes',
+    __slots__ = ['entity_id', 'state', 'attributes', 'domain', 'object_id',
                  'last_changed', 'last_updated']
 
     def __init__(self, entity_id, state, attributes=None, last_changed=None,
@@ -540,20 +783,31 @@ class State(object):
                 "State max length is 255 characters.").format(entity_id))
 
         self.entity_id = entity_id.lower()
+        self.domain, self.object_id = split_entity_id(self.entity_id)
         self.state = state
-        self.attributes = MappingProxyType(attributes or {})
+        self.attributes = _attributes_proxy(attributes)
         self.last_updated = last_updated or dt_util.utcnow()
         self.last_changed = last_changed or self.last_updated
 
-    @property
-    def domain(self):
-        """Domain of this state."""
-        return split_entity_id(self.entity_id)[0]
+    @classmethod
+    def from_trusted(cls, entity_id, state, attributes=None,
+                     last_changed=None, last_updated=None):
+        """Initialize a state from data that has been validated before.
 
-    @property
-    def object_id(self):
-        """Object id of this state."""
-        return split_entity_id(self.entity_id)[1]
+        Skips the validation of the entity id and state, so only use this for
+        data that originates from a State, like database rows or restored
+        states. The entity id has to be lower case and the state a string.
+
+        Async friendly.
+        """
+        obj = cls.__new__(cls)
+        obj.entity_id = entity_id
+        obj.domain, obj.object_id = split_entity_id(entity_id)
+        obj.state = state
+        obj.attributes = _attributes_proxy(attributes)
+        obj.last_updated = last_updated or dt_util.utcnow()
+        obj.last_changed = last_changed or obj.last_updated
+        return obj
 
     @property
     def name(self):
@@ -624,6 +878,12 @@ class StateMachine(object):
     def __init__(self, bus, loop):
         """Initialize state machine."""
         self._states = {}
+        # The entity ids per domain and the sorted domains
+        self._domain_index = {}
+        self._domains = []
+        # Sorted entity ids per domain, built when first read
+        self._sorted_index = {}
+        self._suppressed_writes = {}
         self._bus = bus
         self._loop = loop
 
@@ -638,27 +898,106 @@ class StateMachine(object):
     def async_entity_ids(self, domain_filter=None):
         """List of entity ids that are being tracked.
 
+        The entity ids of a domain_filter are sorted.
+
         This method must be run in the event loop.
         """
         if domain_filter is None:
             return list(self._states.keys())
 
-        domain_filter = domain_filter.lower()
+        return list(self._async_sorted_entity_ids(domain_filter.lower()))
 
-        return [state.entity_id for state in self._states.values()
-                if state.domain == domain_filter]
+    @callback
+    def async_entity_ids_count(self, domain_filter=None):
+        """Count the entity ids that are being tracked.
 
-    def all(self):
+        This method must be run in the event loop.
+        """
+        if domain_filter is None:
+            return len(self._states)
+
+        return len(self._domain_index.get(domain_filter.lower(), ()))
+
+    @callback
+    def async_domains(self):
+        """List the domains of the tracked entities, sorted.
+
+        This method must be run in the event loop.
+        """
+        return list(self._domains)
+
+    def all(self, domain_filter=None):
         """Create a list of all states."""
-        return run_callback_threadsafe(self._loop, self.async_all).result()
+        return run_callback_threadsafe(
+            self._loop, self.async_all, domain_filter).result()
 
     @callback
-    def async_all(self):
+    def async_all(self, domain_filter=None):
         """Create a list of all states.
 
+        The states of a domain_filter are sorted by entity id.
+
+        This method must be run in the event loop.
+        """
+        if domain_filter is None:
+            return list(self._states.values())
+
+        states = self._states
+        return [states[entity_id] for entity_id
+                in self._async_sorted_entity_ids(domain_filter.lower())]
+
+    @callback
+    def _async_sorted_entity_ids(self, domain):
+        """Return the sorted entity ids of domain.
+
+        This method must be run in the event loop.
+        """
+        sorted_ids = self._sorted_index.get(domain)
+
+        if sorted_ids is None:
+            entity_ids = self._domain_index.get(domain)
+            if entity_ids is None:
+                return ()
+            sorted_ids = self._sorted_index[domain] = sorted(entity_ids)
+
+        return sorted_ids
+
+    @callback
+    def _async_index_add(self, entity_id, domain):
+        """Add a new entity to the domain index.
+
         This method must be run in the event loop.
         """
-        return list(self._states.values())
+        entity_ids = self._domain_index.get(domain)
+
+        if entity_ids is None:
+            self._domain_index[domain] = {entity_id}
+            bisect.insort(self._domains, domain)
+            return
+
+        entity_ids.add(entity_id)
+        sorted_ids = self._sorted_index.get(domain)
+        if sorted_ids is not None:
+            bisect.insort(sorted_ids, entity_id)
+
+    @callback
+    def _async_index_remove(self, entity_id, domain):
+        """Remove an entity from the domain index.
+
+        This method must be run in the event loop.
+        """
+        entity_ids = self._domain_index[domain]
+        entity_ids.remove(entity_id)
+
+        if not entity_ids:
+            del self._domain_index[domain]
+            self._sorted_index.pop(domain, None)
+            del self._domains[bisect.bisect_left(self._domains, domain)]
+            return
+
+        sorted_ids = self._sorted_index.get(domain)
+        if sorted_ids is not None:
+            del sorted_ids[bisect.bisect_left(sorted_ids, entity_id)]
 
     def get(self, entity_id):
         """Retrieve state of entity_id or None if not found.
@@ -697,6 +1036,7 @@ class StateMachine(object):
         if old_state is None:
             return False
 
+        self._async_index_remove(entity_id, old_state.domain)
         self._bus.async_fire(EVENT_STATE_CHANGED, {
             'entity_id': entity_id,
             'old_state': old_state,
@@ -736,20 +1076,46 @@ class StateMachine(object):
         is_existing = old_state is not None
         same_state = (is_existing and old_state.state == new_state and
                       not force_update)
-        same_attr = is_existing and old_state.attributes == attributes
+        same_attr = is_existing and (old_state.attributes is attributes or
+                                     old_state.attributes == attributes)
 
         if same_state and same_attr:
+            self.async_write_suppressed(entity_id)
             return
 
+        if same_attr:
+            # Share the attributes with the previous state
+            attributes = old_state.attributes
+
         last_changed = old_state.last_changed if same_state else None
         state = State(entity_id, new_state, attributes, last_changed)
         self._states[entity_id] = state
+        if not is_existing:
+            self._async_index_add(entity_id, state.domain)
         self._bus.async_fire(EVENT_STATE_CHANGED, {
             'entity_id': entity_id,
             'old_state': old_state,
             'new_state': state,
         })
 
+    @callback
+    def async_write_suppressed(self, entity_id):
+        """Count a write of entity_id that was skipped as nothing changed.
+
+        This method must be run in the event loop.
+        """
+        domain = split_entity_id(entity_id)[0]
+        self._suppressed_writes[domain] = \
+            self._suppressed_writes.get(domain, 0) + 1
+
+    @callback
+    def async_suppressed_writes(self):
+        """Return the number of skipped writes per domain.
+
+        This method must be run in the event loop.
+        """
+        return dict(self._suppressed_writes)
+
 
 class Service(object):
     """Representation of a callable service."""
@@ -1023,20 +1389,25 @@ class ServiceRegistry(object):
             return
 
         service_call = ServiceCall(domain, service, service_data, call_id)
+        func = service_handler.func
+
+        if self._hass.job_profiler is not None:
+            func = self._hass.job_profiler.wrap_job(func, 'service')
 
         if service_handler.is_callback:
-            service_handler.func(service_call)
+            func(service_call)
             fire_service_executed()
         elif service_handler.is_coroutinefunction:
-            yield from service_handler.func(service_call)
+            yield from func(service_call)
             fire_service_executed()
         else:
             def execute_service():
                 """Execute a service and fires a SERVICE_EXECUTED event."""
-                service_handler.func(service_call)
+                func(service_call)
                 fire_service_executed()
 
-            self._hass.async_add_job(execute_service)
+            self._hass.async_add_executor_job(
+                job_owner(service_handler.func), execute_service)
 
 
 class Config(object):
@@ -1066,6 +1437,10 @@ class Config(object):
         # List of allowed external dirs to access
         self.whitelist_external_dirs = set()
 
+        # Seconds the event loop can be blocked before it is reported,
+        # 0 disables the watchdog
+        self.loop_lag_threshold = 1.0  # type: float
+
     def distance(self: object, lat: float, lon: float) -> float:
         """Calculate distance from Home Assistant.
 
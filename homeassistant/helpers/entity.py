@@ -78,6 +78,14 @@ class Entity(object):
     # Process updates pararell
     parallel_updates = None
 
+    # Executor pool that runs the sync update of the entity
+    executor_pool = None
+
+    # State fingerprint, customize and state object of the last written state
+    _written_fingerprint = None
+    _written_customize = None
+    _written_state = None
+
     @property
     def should_poll(self) -> bool:
         """Return True if entity has to be polled for state.
@@ -166,6 +174,18 @@ class Entity(object):
         """Flag supported features."""
         return None
 
+    @property
+    def state_fingerprint(self):
+        """Return a value that changes when the state changes.
+
+        Updates with the same fingerprint as the last written state are
+        skipped without building the attributes. Entities that can cheaply
+        tell if their state, attributes or availability changed can return
+        one. By default the state and the properties the attributes are
+        built from are compared.
+        """
+        return None
+
     def update(self):
         """Retrieve latest state.
 
@@ -203,33 +223,52 @@ class Entity(object):
 
         start = timer()
 
-        if not self.available:
+        # Without a fingerprint the properties the state is built from are
+        # compared. They are read once, some change when they are read
+        fingerprint = self.state_fingerprint
+        sources = None
+        if fingerprint is None:
+            sources = fingerprint = self._read_state_sources()
+
+        customize = self.hass.data.get(DATA_CUSTOMIZE)
+
+        if not self.force_update and \
+                fingerprint == self._written_fingerprint and \
+                customize is self._written_customize and \
+                self.hass.states.get(self.entity_id) is self._written_state:
+            self.hass.states.async_write_suppressed(self.entity_id)
+            return
+
+        if sources is None:
+            sources = self._read_state_sources()
+
+        available, state, state_attr, device_attr, unit_of_measurement, \
+            name, icon, entity_picture, hidden, assumed_state, \
+            supported_features, device_class = sources
+
+        if not available:
             state = STATE_UNAVAILABLE
-            attr = {}
+        elif state is None:
+            state = STATE_UNKNOWN
         else:
-            state = self.state
+            state = str(state)
 
-            if state is None:
-                state = STATE_UNKNOWN
-            else:
-                state = str(state)
-
-            attr = self.state_attributes or {}
-            device_attr = self.device_state_attributes
-            if device_attr is not None:
-                attr.update(device_attr)
+        # The sources are copied, they may be the last written fingerprint
+        attr = dict(state_attr) if state_attr else {}
+        if device_attr is not None:
+            attr.update(device_attr)
 
-        self._attr_setter('unit_of_measurement', str, ATTR_UNIT_OF_MEASUREMENT,
+        self._attr_setter(unit_of_measurement, str, ATTR_UNIT_OF_MEASUREMENT,
                           attr)
 
-        self._attr_setter('name', str, ATTR_FRIENDLY_NAME, attr)
-        self._attr_setter('icon', str, ATTR_ICON, attr)
-        self._attr_setter('entity_picture', str, ATTR_ENTITY_PICTURE, attr)
-        self._attr_setter('hidden', bool, ATTR_HIDDEN, attr)
-        self._attr_setter('assumed_state', bool, ATTR_ASSUMED_STATE, attr)
-        self._attr_setter('supported_features', int, ATTR_SUPPORTED_FEATURES,
+        self._attr_setter(name, str, ATTR_FRIENDLY_NAME, attr)
+        self._attr_setter(icon, str, ATTR_ICON, attr)
+        self._attr_setter(entity_picture, str, ATTR_ENTITY_PICTURE, attr)
+        self._attr_setter(hidden, bool, ATTR_HIDDEN, attr)
+        self._attr_setter(assumed_state, bool, ATTR_ASSUMED_STATE, attr)
+        self._attr_setter(supported_features, int, ATTR_SUPPORTED_FEATURES,
                           attr)
-        self._attr_setter('device_class', str, ATTR_DEVICE_CLASS, attr)
+        self._attr_setter(device_class, str, ATTR_DEVICE_CLASS, attr)
 
         end = timer()
 
@@ -265,6 +304,10 @@ class Entity(object):
         self.hass.states.async_set(
             self.entity_id, state, attr, self.force_update)
 
+        self._written_fingerprint = fingerprint
+        self._written_customize = customize
+        self._written_state = self.hass.states.get(self.entity_id)
+
     def schedule_update_ha_state(self, force_refresh=False):
         """Schedule a update ha state change task.
 
@@ -302,6 +345,9 @@ class Entity(object):
             if hasattr(self, 'async_update'):
                 # pylint: disable=no-member
                 yield from self.async_update()
+            elif self.executor_pool is not None:
+                yield from self.hass.async_add_executor_job(
+                    self.executor_pool, self.update)
             else:
                 yield from self.hass.async_add_job(self.update)
         finally:
@@ -325,14 +371,9 @@ class Entity(object):
         """
         self.hass.states.async_remove(self.entity_id)
 
-    def _attr_setter(self, name, typ, attr, attrs):
+    def _attr_setter(self, value, typ, attr, attrs):
         """Populate attributes based on properties."""
-        if attr in attrs:
-            return
-
-        value = getattr(self, name)
-
-        if value is None:
+        if attr in attrs or value is None:
             return
 
         try:
@@ -340,6 +381,26 @@ class Entity(object):
         except (TypeError, ValueError):
             pass
 
+    def _read_state_sources(self):
+        """Return the properties the state and its attributes are built from.
+
+        The attribute dicts are copied, entities may change them in place.
+        """
+        if not self.available:
+            sources = (False, None, None, None)
+        else:
+            state = self.state
+            state_attr = self.state_attributes
+            device_attr = self.device_state_attributes
+            sources = (True, state,
+                       None if state_attr is None else dict(state_attr),
+                       None if device_attr is None else dict(device_attr))
+
+        return sources + (
+            self.unit_of_measurement, self.name, self.icon,
+            self.entity_picture, self.hidden, self.assumed_state,
+            self.supported_features, self.device_class)
+
     def __eq__(self, other):
         """Return the comparison."""
         return (isinstance(other, Entity) and
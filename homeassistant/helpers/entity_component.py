@@ -162,8 +162,9 @@ class EntityComponent(object):
             else:
                 # This should not be replaced with hass.async_add_job because
                 # we don't want to track this task in case it blocks startup.
-                task = self.hass.loop.run_in_executor(
-                    None, platform.setup_platform, self.hass, platform_config,
+                task = self.hass.executors.async_submit(
+                    entity_platform.executor_pool, platform.setup_platform,
+                    self.hass, platform_config,
                     entity_platform.schedule_add_entities, discovery_info
                 )
             yield from asyncio.wait_for(
@@ -332,6 +333,11 @@ class EntityPlatform(object):
         self.platform = platform
         self.scan_interval = scan_interval
         self.parallel_updates = None
+        if platform == component.domain:
+            # Entities added by the component itself
+            self.executor_pool = platform
+        else:
+            self.executor_pool = '{}.{}'.format(component.domain, platform)
         self.entity_namespace = entity_namespace
         self.platform_entities = []
         self._tasks = []
@@ -342,6 +348,13 @@ class EntityPlatform(object):
             self.parallel_updates = asyncio.Semaphore(
                 parallel_updates, loop=component.hass.loop)
 
+            # Allow the executor pool to run all parallel updates at once
+            executors = component.hass.executors
+            if parallel_updates > executors.async_get_limit(
+                    self.executor_pool):
+                executors.async_set_limit(
+                    self.executor_pool, parallel_updates)
+
     @asyncio.coroutine
     def async_block_entities_done(self):
         """Wait until all entities add to hass."""
@@ -395,6 +408,7 @@ class EntityPlatform(object):
         def async_process_entity(new_entity):
             """Add entities to StateMachine."""
             new_entity.parallel_updates = self.parallel_updates
+            new_entity.executor_pool = self.executor_pool
             ret = yield from self.component.async_add_entity(
                 new_entity, self, update_before_add=update_before_add
             )
@@ -1,14 +1,23 @@
 """Helpers for listening to events."""
+from calendar import monthrange
+from contextlib import contextmanager
+from datetime import datetime, timedelta, MAXYEAR
 import functools as ft
+import heapq
+import itertools
 
 from homeassistant.loader import bind_hass
 from homeassistant.helpers.sun import get_astral_event_next
-from ..core import HomeAssistant, callback
+from homeassistant.helpers.template import RenderInfo
+from ..core import HomeAssistant, callback, split_entity_id
 from ..const import (
     ATTR_NOW, EVENT_STATE_CHANGED, EVENT_TIME_CHANGED, MATCH_ALL)
+from ..exceptions import TemplateError
 from ..util import dt as dt_util
 from ..util.async import run_callback_threadsafe
 
+DATA_TIMER_SCHEDULER = 'event_timer_scheduler'
+
 # PyLint does not like the use of threaded_listener_factory
 # pylint: disable=invalid-name
 
@@ -62,10 +71,6 @@ def async_track_state_change(hass, entity_ids, action, from_state=None,
     @callback
     def state_change_listener(event):
         """Handle specific state changes."""
-        if entity_ids != MATCH_ALL and \
-           event.data.get('entity_id') not in entity_ids:
-            return
-
         old_state = event.data.get('old_state')
         if old_state is not None:
             old_state = old_state.state
@@ -79,16 +84,110 @@ def async_track_state_change(hass, entity_ids, action, from_state=None,
                                event.data.get('old_state'),
                                event.data.get('new_state'))
 
-    return hass.bus.async_listen(EVENT_STATE_CHANGED, state_change_listener)
+    if entity_ids == MATCH_ALL:
+        return hass.bus.async_listen(
+            EVENT_STATE_CHANGED, state_change_listener)
+
+    # Only get called for the entities we track instead of filtering
+    # every state change in the system.
+    return hass.bus.async_listen_entity(entity_ids, state_change_listener)
 
 
 track_state_change = threaded_listener_factory(async_track_state_change)
 
 
+class RenderTracker(object):
+    """Track the state changes of the states that templates read.
+
+    The renders inside async_collect are recorded, the state changes of the
+    states they read are passed to action until the next renders read other
+    states. Renders that read no state track every state change.
+    """
+
+    def __init__(self, hass, action):
+        """Initialize the tracker."""
+        self.hass = hass
+        self._action = action
+        # (entity_ids, domains) or MATCH_ALL
+        self._tracked = None
+        self._unsubs = []
+
+    @property
+    def entity_ids(self):
+        """Return the tracked entity ids, MATCH_ALL if they are unknown."""
+        if self._tracked is None or self._tracked == MATCH_ALL or \
+                self._tracked[1]:
+            return MATCH_ALL
+        return list(self._tracked[0])
+
+    @contextmanager
+    def async_collect(self):
+        """Record the renders inside the block and update the listeners.
+
+        The block must not yield to the event loop.
+        """
+        render_info = RenderInfo(self.hass)
+        try:
+            with render_info:
+                yield render_info
+        finally:
+            self.async_track(render_info)
+
+    @callback
+    def async_track(self, render_info):
+        """Listen to the state changes of the states render_info read."""
+        if render_info.all_states or \
+                not (render_info.entities or render_info.domains):
+            tracked = MATCH_ALL
+        else:
+            domains = frozenset(render_info.domains)
+            tracked = (frozenset(
+                entity_id for entity_id in render_info.entities
+                if split_entity_id(entity_id)[0] not in domains), domains)
+
+        if tracked == self._tracked:
+            return
+
+        self.async_remove()
+        self._tracked = tracked
+
+        if tracked == MATCH_ALL:
+            self._unsubs.append(self.hass.bus.async_listen(
+                EVENT_STATE_CHANGED, self._async_state_changed))
+            return
+
+        entity_ids, domains = tracked
+        if entity_ids:
+            self._unsubs.append(self.hass.bus.async_listen_entity(
+                entity_ids, self._async_state_changed))
+        if domains:
+            self._unsubs.append(self.hass.bus.async_listen_domain(
+                domains, self._async_state_changed))
+
+    @callback
+    def async_remove(self):
+        """Remove the listeners."""
+        for unsub in self._unsubs:
+            unsub()
+        self._unsubs = []
+        self._tracked = None
+
+    @callback
+    def _async_state_changed(self, event):
+        """Pass a state change to action."""
+        self.hass.async_run_job(
+            self._action, event.data.get('entity_id'),
+            event.data.get('old_state'), event.data.get('new_state'))
+
+
 @callback
 @bind_hass
 def async_track_template(hass, template, action, variables=None):
-    """Add a listener that track state changes with template condition."""
+    """Add a listener that track state changes with template condition.
+
+    Only the state changes of the states that the template read in its
+    last render are tracked.
+    """
     from . import condition
 
     # Local variable to keep track of if the action has already been triggered
@@ -98,7 +197,9 @@ def async_track_template(hass, template, action, variables=None):
     def template_condition_listener(entity_id, from_s, to_s):
         """Check if condition is correct and run action."""
         nonlocal already_triggered
-        template_result = condition.async_template(hass, template, variables)
+        with tracker.async_collect():
+            template_result = condition.async_template(
+                hass, template, variables)
 
         # Check to see if template returns true
         if template_result and not already_triggered:
@@ -107,9 +208,16 @@ def async_track_template(hass, template, action, variables=None):
         elif not template_result:
             already_triggered = False
 
-    return async_track_state_change(
-        hass, template.extract_entities(variables),
-        template_condition_listener)
+    tracker = RenderTracker(hass, template_condition_listener)
+
+    # Render once to find the states the template reads
+    with tracker.async_collect():
+        try:
+            template.async_render(variables)
+        except TemplateError:
+            pass
+
+    return tracker.async_remove
 
 
 track_template = threaded_listener_factory(async_track_template)
@@ -191,28 +299,7 @@ def async_track_point_in_utc_time(hass, action, point_in_time):
     # Ensure point_in_time is UTC
     point_in_time = dt_util.as_utc(point_in_time)
 
-    @callback
-    def point_in_time_listener(event):
-        """Listen for matching time_changed events."""
-        now = event.data[ATTR_NOW]
-
-        if now < point_in_time or hasattr(point_in_time_listener, 'run'):
-            return
-
-        # Set variable so that we will never run twice.
-        # Because the event bus might have to wait till a thread comes
-        # available to execute this listener it might occur that the
-        # listener gets lined up twice to be executed. This will make
-        # sure the second time it does nothing.
-        point_in_time_listener.run = True
-        async_unsub()
-
-        hass.async_run_job(action, now)
-
-    async_unsub = hass.bus.async_listen(EVENT_TIME_CHANGED,
-                                        point_in_time_listener)
-
-    return async_unsub
+    return _async_get_scheduler(hass).async_schedule(point_in_time, action)
 
 
 track_point_in_utc_time = threaded_listener_factory(
@@ -328,22 +415,31 @@ def async_track_utc_time_change(hass, action, year=None, month=None, day=None,
     year, month, day = pmp(year), pmp(month), pmp(day)
     hour, minute, second = pmp(hour), pmp(minute), pmp(second)
 
+    # All values that can match, to look up the next matching time
+    ptv = _process_time_values
+    values = (ptv(month, 1, 12), ptv(day, 1, 31), ptv(hour, 0, 23),
+              ptv(minute, 0, 59), ptv(second, 0, 59))
+
     @callback
-    def pattern_time_change_listener(event):
-        """Listen for matching time_changed events."""
-        now = event.data[ATTR_NOW]
+    def next_pattern_time(utc_start):
+        """Return first time at or after utc_start that matches."""
+        return _find_next_time(utc_start, year, values, local)
 
+    @callback
+    def pattern_time_change_listener(now):
+        """Run the action if the time matches the pattern."""
         if local:
             now = dt_util.as_local(now)
 
+        # Time can have progressed further than the calculated point in time
         # pylint: disable=too-many-boolean-expressions
         if second(now.second) and minute(now.minute) and hour(now.hour) and \
            day(now.day) and month(now.month) and year(now.year):
 
             hass.async_run_job(action, now)
 
-    return hass.bus.async_listen(EVENT_TIME_CHANGED,
-                                 pattern_time_change_listener)
+    return _async_get_scheduler(hass).async_schedule_repeating(
+        next_pattern_time, pattern_time_change_listener)
 
 
 track_utc_time_change = threaded_listener_factory(async_track_utc_time_change)
@@ -373,6 +469,111 @@ def _process_state_match(parameter):
     return lambda state: state in parameter
 
 
+def _process_time_values(match, first, last):
+    """Return a tuple with all values in a range that pass match."""
+    return tuple(value for value in range(first, last + 1) if match(value))
+
+
+def _find_next_time_fields(start, match_year, values):
+    """Find the first naive time at or after start with matching fields."""
+    months, days, hours, minutes, seconds = values
+
+    if not all(values):
+        return None
+
+    for year in range(start.year, MAXYEAR + 1):
+        if not match_year(year):
+            continue
+
+        in_start = year == start.year
+
+        for month in months:
+            if in_start and month < start.month:
+                continue
+
+            in_start_month = in_start and month == start.month
+            days_in_month = monthrange(year, month)[1]
+
+            for day in days:
+                if day > days_in_month:
+                    break
+                if in_start_month and day < start.day:
+                    continue
+
+                in_start_day = in_start_month and day == start.day
+
+                for hour in hours:
+                    if in_start_day and hour < start.hour:
+                        continue
+
+                    in_start_hour = in_start_day and hour == start.hour
+
+                    for minute in minutes:
+                        if in_start_hour and minute < start.minute:
+                            continue
+
+                        in_start_minute = \
+                            in_start_hour and minute == start.minute
+
+                        for second in seconds:
+                            if in_start_minute and second < start.second:
+                                continue
+
+                            return datetime(
+                                year, month, day, hour, minute, second)
+
+    return None
+
+
+def _find_next_time(utc_start, match_year, values, local):
+    """Find the first UTC time at or after utc_start that matches.
+
+    For local times the fields are matched against the local time of each
+    instant, like dt_util.as_local does. Wall clock times that are skipped
+    when DST starts never match, times that repeat when DST ends match twice.
+    """
+    utc_start = utc_start.replace(microsecond=0)
+
+    if not local:
+        found = _find_next_time_fields(
+            utc_start.replace(tzinfo=None), match_year, values)
+        return None if found is None else found.replace(tzinfo=dt_util.UTC)
+
+    def utcoffset(utc_time):
+        """Return the local UTC offset at utc_time."""
+        return dt_util.as_local(utc_time).utcoffset()
+
+    # Search per stretch of time with a constant UTC offset. A day is short
+    # enough to never contain more than one offset change.
+    while True:
+        offset = utcoffset(utc_start)
+        found = _find_next_time_fields(
+            (utc_start + offset).replace(tzinfo=None), match_year, values)
+
+        if found is None:
+            return None
+
+        found = (found - offset).replace(tzinfo=dt_util.UTC)
+        end = min(found, utc_start + timedelta(days=1))
+
+        if utcoffset(end) == offset:
+            if found == end:
+                return found
+            utc_start = end
+            continue
+
+        # Look up the first second with the new offset and continue there
+        while end - utc_start > timedelta(seconds=1):
+            middle = utc_start + (end - utc_start) // 2
+            middle = middle.replace(microsecond=0)
+            if utcoffset(middle) == offset:
+                utc_start = middle
+            else:
+                end = middle
+
+        utc_start = end
+
+
 def _process_time_match(parameter):
     """Wrap parameter in a tuple if it is not one and returns it."""
     if parameter is None or parameter == MATCH_ALL:
@@ -387,3 +588,199 @@ def _process_time_match(parameter):
 
     parameter = tuple(parameter)
     return lambda time: time in parameter
+
+
+@callback
+def _async_get_scheduler(hass):
+    """Return the timer scheduler of hass."""
+    scheduler = hass.data.get(DATA_TIMER_SCHEDULER)
+
+    if scheduler is None:
+        scheduler = hass.data[DATA_TIMER_SCHEDULER] = _TimerScheduler(hass)
+
+    return scheduler
+
+
+class _Timer(object):
+    """Representation of a timer in the timer scheduler."""
+
+    __slots__ = ['action', 'reschedule']
+
+    def __init__(self, action, reschedule=None):
+        """Initialize a timer."""
+        self.action = action
+        self.reschedule = reschedule
+
+
+class _TimerScheduler(object):
+    """Run point in time listeners from a single time changed listener.
+
+    Pending timers are kept in a heap ordered by their point in time, so a
+    time changed event only has to look at the timers that are due instead
+    of waking up every pending timer.
+    """
+
+    def __init__(self, hass):
+        """Initialize the scheduler."""
+        self._hass = hass
+        self._heap = []
+        self._repeating = set()
+        self._counter = itertools.count()
+        self._cancelled = 0
+        self._last_now = None
+        self._async_unsub = None
+
+    @callback
+    def async_schedule(self, point_in_time, action):
+        """Schedule action to be run once at point_in_time.
+
+        Returns a function that can be called to cancel the timer.
+        """
+        timer = _Timer(action)
+        self._async_push(point_in_time, timer)
+        return self._async_cancel_func(timer)
+
+    @callback
+    def async_schedule_repeating(self, reschedule, action):
+        """Schedule action to be run repeatedly until cancelled.
+
+        reschedule is called with a UTC time and returns the first point in
+        time at or after it that action should run, or None if there is
+        none.
+
+        Returns a function that can be called to cancel the timer.
+        """
+        now = dt_util.utcnow()
+
+        # Points are calculated from now, so time going back from here on
+        # means that they need to be recalculated.
+        if self._last_now is None or self._last_now < now:
+            self._last_now = now
+
+        timer = _Timer(action, reschedule)
+        self._repeating.add(timer)
+        point_in_time = reschedule(now)
+
+        if point_in_time is not None:
+            self._async_push(point_in_time, timer)
+        else:
+            self._async_listen()
+
+        return self._async_cancel_func(timer)
+
+    @callback
+    def _async_push(self, point_in_time, timer):
+        """Add a timer to the heap."""
+        # The counter makes sure entries with an equal point in time are run
+        # in the order they were scheduled and that timers are never compared
+        heapq.heappush(
+            self._heap, (point_in_time, next(self._counter), timer))
+        self._async_listen()
+
+    @callback
+    def _async_listen(self):
+        """Start listening for time changes."""
+        if self._async_unsub is None:
+            self._async_unsub = self._hass.bus.async_listen(
+                EVENT_TIME_CHANGED, self._async_time_changed)
+
+    @callback
+    def _async_cancel_func(self, timer):
+        """Return a function that cancels timer."""
+        @callback
+        def cancel():
+            """Cancel the timer if it has not run yet."""
+            if timer.action is None:
+                return
+
+            timer.action = None
+
+            if timer.reschedule is not None:
+                self._repeating.discard(timer)
+
+            self._cancelled += 1
+            self._async_compact()
+
+        return cancel
+
+    @callback
+    def _async_compact(self):
+        """Remove cancelled timers once they make up half of the heap."""
+        if self._heap and self._cancelled * 2 < len(self._heap):
+            return
+
+        self._heap = [entry for entry in self._heap
+                      if entry[2].action is not None]
+        heapq.heapify(self._heap)
+        self._cancelled = 0
+        self._async_check_idle()
+
+    @callback
+    def _async_check_idle(self):
+        """Stop listening for time changes when no timers are pending."""
+        if (not self._heap and not self._repeating and
+                self._async_unsub is not None):
+            self._async_unsub()
+            self._async_unsub = None
+
+    @callback
+    def _async_time_jumped_back(self, now):
+        """Recalculate the points of repeating timers from now."""
+        heap = [entry for entry in self._heap
+                if entry[2].action is not None and
+                entry[2].reschedule is None]
+
+        for timer in self._repeating:
+            point_in_time = timer.reschedule(now)
+
+            if point_in_time is not None:
+                heap.append((point_in_time, next(self._counter), timer))
+
+        heapq.heapify(heap)
+        self._heap = heap
+        self._cancelled = 0
+
+    @callback
+    def _async_time_changed(self, event):
+        """Run all timers that are due."""
+        now = event.data[ATTR_NOW]
+
+        if now.tzinfo is None:
+            utc_now = now.replace(tzinfo=dt_util.UTC)
+        else:
+            utc_now = now
+
+        if self._last_now is not None and utc_now < self._last_now:
+            self._async_time_jumped_back(utc_now)
+
+        self._last_now = utc_now
+        heap = self._heap
+        due = []
+
+        while heap and (heap[0][2].action is None or heap[0][0] <= utc_now):
+            timer = heapq.heappop(heap)[2]
+            action = timer.action
+
+            if action is None:
+                self._cancelled -= 1
+                continue
+
+            if timer.reschedule is None:
+                # Mark as run so that cancelling it afterwards is a no-op.
+                timer.action = None
+            else:
+                point_in_time = timer.reschedule(
+                    utc_now.replace(microsecond=0) + timedelta(seconds=1))
+
+                if point_in_time is not None:
+                    heapq.heappush(
+                        heap, (point_in_time, next(self._counter), timer))
+
+            due.append(action)
+
+        self._async_check_idle()
+
+        # Actions run after the heap is updated as they can add or cancel
+        # timers themselves.
+        for action in due:
+            self._hass.async_run_job(action, now)
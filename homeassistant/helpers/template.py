@@ -1,5 +1,6 @@
 """Template helper methods for rendering strings with Home Assistant data."""
 from datetime import datetime
+from functools import lru_cache
 import json
 import logging
 import random
@@ -23,6 +24,11 @@ _LOGGER = logging.getLogger(__name__)
 _SENTINEL = object()
 DATE_STR_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+DATA_RENDER_INFO = 'template_render_info'
+
+# Number of template sources of which the compiled code is kept
+COMPILE_CACHE_SIZE = 1024
+
 _RE_NONE_ENTITIES = re.compile(r"distance\(|closest\(", re.I | re.M)
 _RE_GET_ENTITIES = re.compile(
     r"(?:(?:states\.|(?:is_state|is_state_attr|states)"
@@ -67,6 +73,72 @@ def extract_entities(template, variables=None):
     return MATCH_ALL
 
 
+class RenderInfo(object):
+    """Record the states that templates read while they are rendered.
+
+    The renders of the templates of hass inside a with block are recorded,
+    the block must not yield to the event loop.
+    """
+
+    def __init__(self, hass):
+        """Initialize the render info."""
+        self._hass = hass
+        self._previous = None
+        # If all states were iterated
+        self.all_states = False
+        # The domains of which all states were iterated
+        self.domains = set()
+        # The entity ids of the states that were read
+        self.entities = set()
+
+    def __enter__(self):
+        """Start recording."""
+        self._previous = self._hass.data.get(DATA_RENDER_INFO)
+        self._hass.data[DATA_RENDER_INFO] = self
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop recording."""
+        if self._previous is None:
+            self._hass.data.pop(DATA_RENDER_INFO, None)
+        else:
+            self._hass.data[DATA_RENDER_INFO] = self._previous
+            self._previous = None
+
+
+def _get_state(hass, entity_id):
+    """Return the state of entity_id and record that it was read."""
+    render_info = hass.data.get(DATA_RENDER_INFO)
+    if render_info is not None:
+        render_info.entities.add(entity_id.lower())
+    return hass.states.get(entity_id)
+
+
+def _record_domain(hass, domain):
+    """Record that all states of domain were read, None for all states."""
+    render_info = hass.data.get(DATA_RENDER_INFO)
+    if render_info is None:
+        return
+    if domain is None:
+        render_info.all_states = True
+    else:
+        render_info.domains.add(domain.lower())
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def _compile(source):
+    """Compile the source of a template.
+
+    The compiled code is shared by all templates with the same source.
+    """
+    return ENV.compile(source)
+
+
+def compile_cache_info():
+    """Return the hits, misses and size of the compiled template cache."""
+    return _compile.cache_info()
+
+
 class Template(object):
     """Class to hold a template and manage caching and rendering."""
 
@@ -86,7 +158,7 @@ class Template(object):
             return
 
         try:
-            self._compiled_code = ENV.compile(self.template)
+            self._compiled_code = _compile(self.template)
         except jinja2.exceptions.TemplateSyntaxError as err:
             raise TemplateError(err)
 
@@ -165,7 +237,7 @@ class Template(object):
         global_vars = ENV.make_globals({
             'closest': template_methods.closest,
             'distance': template_methods.distance,
-            'is_state': self.hass.states.is_state,
+            'is_state': template_methods.is_state,
             'is_state_attr': template_methods.is_state_attr,
             'states': AllStates(self.hass),
         })
@@ -195,18 +267,21 @@ class AllStates(object):
 
     def __iter__(self):
         """Return all states."""
+        _record_domain(self._hass, None)
+        states = self._hass.states
+        # The domains and their states are sorted by the state machine
         return iter(
-            _wrap_state(state) for state in
-            sorted(self._hass.states.async_all(),
-                   key=lambda state: state.entity_id))
+            _wrap_state(state) for domain in states.async_domains()
+            for state in states.async_all(domain))
 
     def __len__(self):
         """Return number of states."""
-        return len(self._hass.states.async_entity_ids())
+        _record_domain(self._hass, None)
+        return self._hass.states.async_entity_ids_count()
 
     def __call__(self, entity_id):
         """Return the states."""
-        state = self._hass.states.get(entity_id)
+        state = _get_state(self._hass, entity_id)
         return STATE_UNKNOWN if state is None else state.state
 
 
@@ -221,18 +296,18 @@ class DomainStates(object):
     def __getattr__(self, name):
         """Return the states."""
         return _wrap_state(
-            self._hass.states.get('{}.{}'.format(self._domain, name)))
+            _get_state(self._hass, '{}.{}'.format(self._domain, name)))
 
     def __iter__(self):
         """Return the iteration over all the states."""
-        return iter(sorted(
-            (_wrap_state(state) for state in self._hass.states.async_all()
-             if state.domain == self._domain),
-            key=lambda state: state.entity_id))
+        _record_domain(self._hass, self._domain)
+        return iter([_wrap_state(state) for state
+                     in self._hass.states.async_all(self._domain)])
 
     def __len__(self):
         """Return number of states."""
-        return len(self._hass.states.async_entity_ids(self._domain))
+        _record_domain(self._hass, self._domain)
+        return self._hass.states.async_entity_ids_count(self._domain)
 
 
 class TemplateState(State):
@@ -336,7 +411,8 @@ class TemplateMethods(object):
 
             group = get_component('group')
 
-            states = [self._hass.states.get(entity_id) for entity_id
+            _get_state(self._hass, gr_entity_id)
+            states = [_get_state(self._hass, entity_id) for entity_id
                       in group.expand_entity_ids(self._hass, [gr_entity_id])]
 
         return _wrap_state(loc_helper.closest(latitude, longitude, states))
@@ -389,9 +465,14 @@ class TemplateMethods(object):
         return self._hass.config.units.length(
             loc_util.distance(*locations[0] + locations[1]), 'm')
 
+    def is_state(self, entity_id, state):
+        """Test if a state is a specific value."""
+        state_obj = _get_state(self._hass, entity_id)
+        return state_obj is not None and state_obj.state == state
+
     def is_state_attr(self, entity_id, name, value):
         """Test if a state is a specific attribute."""
-        state_obj = self._hass.states.get(entity_id)
+        state_obj = _get_state(self._hass, entity_id)
         return state_obj is not None and \
             state_obj.attributes.get(name) == value
 
@@ -400,7 +481,7 @@ class TemplateMethods(object):
         if isinstance(entity_id_or_state, State):
             return entity_id_or_state
         elif isinstance(entity_id_or_state, str):
-            return self._hass.states.get(entity_id_or_state)
+            return _get_state(self._hass, entity_id_or_state)
         return None
 
 
@@ -2,17 +2,28 @@
 import asyncio
 import argparse
 from contextlib import suppress
-from datetime import datetime
+from datetime import datetime, timedelta
+import json
 import logging
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import tracemalloc
 from timeit import default_timer as timer
 
 from homeassistant.const import (
-    EVENT_TIME_CHANGED, ATTR_NOW, EVENT_STATE_CHANGED)
-from homeassistant import core
+    __version__, EVENT_TIME_CHANGED, ATTR_NOW, EVENT_STATE_CHANGED)
+from homeassistant import core, loader
+from homeassistant.setup import async_setup_component
 from homeassistant.util import dt as dt_util
 
 BENCHMARKS = {}
 
+# Slowdown compared to the baseline that is reported as a regression
+DEFAULT_TOLERANCE = 0.1
+
 
 def run(args):
     """Handle ensure config commandline script."""
@@ -21,26 +32,127 @@ def run(args):
 
     parser = argparse.ArgumentParser(
         description=("Run a Home Assistant benchmark."))
-    parser.add_argument('name', choices=BENCHMARKS)
+    parser.add_argument('name', choices=sorted(BENCHMARKS) + ['all'])
+    parser.add_argument(
+        '--rounds', type=int, default=0,
+        help="Number of times to run each benchmark, 0 runs until "
+             "interrupted")
+    parser.add_argument(
+        '--json', metavar='FILE',
+        help="Write the results as JSON to FILE, - for stdout")
+    parser.add_argument(
+        '--compare', metavar='FILE',
+        help="Compare the results with the JSON results in FILE")
+    parser.add_argument(
+        '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+        help="Slowdown that is reported as a regression (default: "
+             "{})".format(DEFAULT_TOLERANCE))
     parser.add_argument('--script', choices=['benchmark'])
 
     args = parser.parse_args()
 
-    bench = BENCHMARKS[args.name]
+    if args.name == 'all':
+        benches = [BENCHMARKS[name] for name in sorted(BENCHMARKS)]
+    else:
+        benches = [BENCHMARKS[args.name]]
+
+    # Keep stdout clean when it is used for the JSON results
+    out = sys.stderr if args.json == '-' else sys.stdout
 
-    print('Using event loop:', asyncio.get_event_loop_policy().__module__)
+    print('Using event loop:', asyncio.get_event_loop_policy().__module__,
+          file=out)
+
+    runs = {}
+    rounds = 0
 
     with suppress(KeyboardInterrupt):
-        while True:
-            loop = asyncio.new_event_loop()
-            hass = core.HomeAssistant(loop)
-            hass.async_stop_track_tasks()
-            runtime = loop.run_until_complete(bench(hass))
-            print('Benchmark {} done in {}s'.format(bench.__name__, runtime))
-            loop.run_until_complete(hass.async_stop())
-            loop.close()
+        while not args.rounds or rounds < args.rounds:
+            rounds += 1
+
+            for bench in benches:
+                for key, runtime in _run_benchmark(bench).items():
+                    runs.setdefault(key, []).append(runtime)
+                    print('Benchmark {} done in {}s'.format(key, runtime),
+                          file=out)
+
+    results = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'results': {key: {
+            'runs': values,
+            'min': min(values),
+            'median': statistics.median(values),
+        } for key, values in runs.items()},
+    }
+
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as fil:
+            json.dump(results, fil, indent=2, sort_keys=True)
+
+    if not args.compare:
+        return 0
+
+    with open(args.compare) as fil:
+        baseline = json.load(fil)
+
+    regressed = False
+
+    for key, base, current, change, regression in compare_results(
+            baseline, results, args.tolerance):
+        regressed = regressed or regression
+        print('{} {}: {:.4f}s -> {:.4f}s ({:+.1%})'.format(
+            'REGRESSION' if regression else 'ok', key, base, current, change),
+              file=out)
+
+    return 1 if regressed else 0
+
+
+def compare_results(baseline, results, tolerance=DEFAULT_TOLERANCE):
+    """Compare the fastest runs of results with those of baseline.
+
+    Returns tuples of name, baseline time, time, relative change and if the
+    change is a regression, for the benchmarks that are in both results.
+    """
+    compared = []
+
+    for key in sorted(results['results']):
+        if key not in baseline['results']:
+            continue
 
-    return 0
+        base = baseline['results'][key]['min']
+        current = results['results'][key]['min']
+        change = (current - base) / base if base else 0
+        compared.append((key, base, current, change, change > tolerance))
+
+    return compared
+
+
+def _run_benchmark(bench):
+    """Run a benchmark in a new Home Assistant instance.
+
+    Returns a dictionary with the runtime of every measurement.
+    """
+    loop = asyncio.new_event_loop()
+    hass = core.HomeAssistant(loop)
+    hass.async_stop_track_tasks()
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass.config.config_dir = config_dir
+        hass.config.skip_pip = True
+        loader.prepare(hass)
+        runtime = loop.run_until_complete(bench(hass))
+        loop.run_until_complete(hass.async_stop())
+
+    loop.close()
+
+    if isinstance(runtime, dict):
+        return {'{}.{}'.format(bench.__name__, key): value
+                for key, value in runtime.items()}
+
+    return {bench.__name__: runtime}
 
 
 def benchmark(func):
@@ -144,3 +256,585 @@ def async_million_state_changed_helper(hass):
     yield from event.wait()
 
     return timer() - start
+
+
+@benchmark
+@asyncio.coroutine
+# pylint: disable=invalid-name
+def async_state_changed_helper_10k_listeners(hass):
+    """Run state changes with 10k entity specific state changed helpers."""
+    count = 0
+    entity_id = 'light.kitchen'
+    events_to_fire = 10**5
+    event = asyncio.Event(loop=hass.loop)
+
+    @core.callback
+    def listener(*args):
+        """Handle event."""
+        nonlocal count
+        count += 1
+
+        if count == events_to_fire:
+            event.set()
+
+    @core.callback
+    def other_listener(*args):
+        """Handle state changes of entities we don't change."""
+        pass
+
+    for idx in range(10**4 - 1):
+        hass.helpers.event.async_track_state_change(
+            'light.bench_{}'.format(idx), other_listener)
+
+    hass.helpers.event.async_track_state_change(entity_id, listener)
+    event_data = {
+        'entity_id': entity_id,
+        'old_state': core.State(entity_id, 'off'),
+        'new_state': core.State(entity_id, 'on'),
+    }
+
+    start = timer()
+
+    for _ in range(events_to_fire):
+        hass.bus.async_fire(EVENT_STATE_CHANGED, event_data)
+
+    yield from event.wait()
+
+    return timer() - start
+
+
+@benchmark
+@asyncio.coroutine
+# pylint: disable=invalid-name
+def async_50k_states(hass):
+    """Create, update and hydrate states of 50k entities."""
+    entity_ids = ['sensor.bench_{}'.format(idx) for idx in range(5 * 10**4)]
+    attributes = {'unit_of_measurement': '°C', 'friendly_name': 'Bench'}
+
+    start = timer()
+
+    for entity_id in entity_ids:
+        hass.states.async_set(entity_id, '20', dict(attributes))
+
+    for entity_id in entity_ids:
+        hass.states.async_set(entity_id, '21', dict(attributes))
+
+    states = [core.State.from_trusted(state.entity_id, state.state,
+                                      dict(state.attributes),
+                                      state.last_changed, state.last_updated)
+              for state in hass.states.async_all()]
+
+    for state in states:
+        assert state.domain == 'sensor'
+
+    runtime = timer() - start
+
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    states = hass.states.async_all()
+    for state in states:
+        hass.states.async_set(state.entity_id, '22', dict(attributes))
+    del states
+    size = sum(stat.size_diff for stat in
+               tracemalloc.take_snapshot().compare_to(snapshot, 'filename'))
+    tracemalloc.stop()
+
+    print('Memory used by 50k state updates: {} kB'.format(size // 1024),
+          file=sys.stderr)
+
+    return runtime
+
+
+@asyncio.coroutine
+def _async_setup_recorder(hass):
+    """Set up the recorder with a database in the config dir."""
+    from homeassistant.components import recorder
+
+    # The recorder only starts writing when Home Assistant is running
+    hass.state = core.CoreState.running
+
+    assert (yield from async_setup_component(hass, recorder.DOMAIN, {
+        recorder.DOMAIN: {
+            recorder.CONF_DB_URL: 'sqlite:///{}'.format(
+                hass.config.path('benchmark.db')),
+        }
+    }))
+
+    return hass.data[recorder.DATA_INSTANCE]
+
+
+@benchmark
+@asyncio.coroutine
+def async_recorder_insert(hass):
+    """Record 10k state changes."""
+    instance = yield from _async_setup_recorder(hass)
+    attributes = {'unit_of_measurement': '°C', 'friendly_name': 'Bench'}
+
+    start = timer()
+
+    for idx in range(10**4):
+        hass.states.async_set(
+            'sensor.bench_{}'.format(idx % 100), idx, attributes)
+
+    # Wait until the recorder queue has all events and then until it is empty
+    yield from asyncio.sleep(0, loop=hass.loop)
+    yield from hass.loop.run_in_executor(None, instance.block_till_done)
+
+    return timer() - start
+
+
+@benchmark
+@asyncio.coroutine
+def async_history_logbook_30_days(hass):
+    """Query history and logbook of a 30 day database.
+
+    The database has the states of 20 sensors that change every 30 minutes.
+    """
+    from homeassistant.components import history, logbook
+    from homeassistant.components.recorder.models import RecorderRuns
+    from homeassistant.components.recorder.util import session_scope
+
+    instance = yield from _async_setup_recorder(hass)
+    now = dt_util.utcnow()
+    first = now - timedelta(days=30)
+    entity_ids = ['sensor.bench_{}'.format(idx) for idx in range(20)]
+    attributes = {'unit_of_measurement': '°C', 'friendly_name': 'Bench'}
+
+    def add_run():
+        """Add a recorder run that covers the generated history."""
+        with session_scope(hass=hass) as session:
+            session.add(RecorderRuns(start=first, end=now, created=first))
+
+    yield from hass.loop.run_in_executor(None, add_run)
+
+    # Let the recorder write the generated history
+    point = first
+    value = 0
+    while point < now:
+        for entity_id in entity_ids:
+            state = core.State(
+                entity_id, str(value), attributes, point, point)
+            instance.queue.put(core.Event(EVENT_STATE_CHANGED, {
+                'entity_id': entity_id,
+                'new_state': state,
+            }, time_fired=point))
+        point += timedelta(minutes=30)
+        value = (value + 1) % 40
+
+    yield from hass.loop.run_in_executor(None, instance.block_till_done)
+
+    def query(func, *args):
+        """Return the time it takes to run func."""
+        start = timer()
+        func(*args)
+        return timer() - start
+
+    def humanify_events(start_day, end_day):
+        """Fetch and convert the events of a period like the logbook."""
+        return list(logbook.humanify(
+            logbook._get_events(  # pylint: disable=protected-access
+                hass, start_day, end_day)))
+
+    one_day = now - timedelta(days=1)
+    runtimes = {}
+
+    for key, func, args in (
+            ('history_30_days', history.get_significant_states,
+             (hass, first)),
+            ('history_1_day', history.get_significant_states,
+             (hass, one_day)),
+            ('history_1_entity_30_days', history.get_significant_states,
+             (hass, first, None, entity_ids[:1])),
+            ('states_point_in_time', history.get_states,
+             (hass, now - timedelta(days=15))),
+            ('logbook_1_day', humanify_events, (one_day, now)),
+            ('logbook_7_days', humanify_events,
+             (now - timedelta(days=7), now))):
+        runtimes[key] = yield from hass.loop.run_in_executor(
+            None, query, func, *args)
+
+    return runtimes
+
+
+@benchmark
+@asyncio.coroutine
+def async_states_point_in_time(hass):
+    """Query the states at a point in time before and after snapshots.
+
+    The database has the states of 50 sensors that change every 10 minutes
+    during a recorder run of 7 days.
+    """
+    from homeassistant.components import history
+    from homeassistant.components.recorder.models import RecorderRuns
+    from homeassistant.components.recorder.snapshot import (
+        snapshot_point, write_snapshot)
+    from homeassistant.components.recorder.util import session_scope
+
+    instance = yield from _async_setup_recorder(hass)
+    now = dt_util.utcnow()
+    first = snapshot_point(now - timedelta(days=7))
+    entity_ids = ['sensor.bench_{}'.format(idx) for idx in range(50)]
+    attributes = {'unit_of_measurement': '°C', 'friendly_name': 'Bench'}
+
+    def add_run():
+        """Add a recorder run that covers the generated history."""
+        with session_scope(hass=hass) as session:
+            session.add(RecorderRuns(start=first, end=now, created=first))
+
+    yield from hass.loop.run_in_executor(None, add_run)
+
+    point = first
+    value = 0
+    while point < now:
+        for entity_id in entity_ids:
+            state = core.State(
+                entity_id, str(value), attributes, point, point)
+            instance.queue.put(core.Event(EVENT_STATE_CHANGED, {
+                'entity_id': entity_id,
+                'new_state': state,
+            }, time_fired=point))
+        point += timedelta(minutes=10)
+        value = (value + 1) % 40
+
+    yield from hass.loop.run_in_executor(None, instance.block_till_done)
+
+    # Late in the run, where the states since the run start are the most
+    point = now - timedelta(minutes=30)
+
+    def query():
+        """Return the time it takes to get the states at point."""
+        start = timer()
+        history.get_states(hass, point)
+        return timer() - start
+
+    def write_snapshots():
+        """Write the hourly snapshots the recorder writes during the run."""
+        start = timer()
+        with session_scope(hass=hass) as session:
+            snapshot = first + timedelta(hours=1)
+            while snapshot <= point:
+                write_snapshot(session, snapshot, first)
+                snapshot += timedelta(hours=1)
+        return timer() - start
+
+    runtimes = {}
+    runtimes['without_snapshots'] = yield from hass.loop.run_in_executor(
+        None, query)
+    runtimes['write_snapshots'] = yield from hass.loop.run_in_executor(
+        None, write_snapshots)
+    runtimes['with_snapshots'] = yield from hass.loop.run_in_executor(
+        None, query)
+
+    return runtimes
+
+
+@benchmark
+@asyncio.coroutine
+def async_render_templates(hass):
+    """Render templates of single entities and of a domain of 1000 states."""
+    from homeassistant.helpers.template import Template
+
+    for idx in range(1000):
+        hass.states.async_set('sensor.bench_{}'.format(idx), idx)
+
+    entity_templates = [Template(template, hass) for template in (
+        "{{ states('sensor.bench_1') | float + 1 }}",
+        "{{ is_state('sensor.bench_2', '2') }}",
+        "{{ states.sensor.bench_3.state }}",
+    )]
+    domain_template = Template(
+        "{{ states.sensor | selectattr('state', 'eq', '4') | list | count }}",
+        hass)
+
+    start = timer()
+
+    for _ in range(10**4):
+        for template in entity_templates:
+            template.async_render()
+
+    entity_runtime = timer() - start
+    start = timer()
+
+    for _ in range(100):
+        domain_template.async_render()
+
+    return {
+        'entity_30k': entity_runtime,
+        'domain_100': timer() - start,
+    }
+
+
+@benchmark
+@asyncio.coroutine
+def async_track_templates(hass):
+    """Change 1000 states next to 100 tracked templates of a domain."""
+    from homeassistant.helpers.event import async_track_template
+    from homeassistant.helpers.template import Template
+
+    count = 0
+
+    @core.callback
+    def action(*args):
+        """Count the template changes."""
+        nonlocal count
+        count += 1
+
+    for idx in range(10):
+        hass.states.async_set('light.bench_{}'.format(idx), 'off')
+
+    for idx in range(100):
+        async_track_template(hass, Template(
+            "{{{{ states.light | selectattr('state', 'eq', 'on') | list | "
+            "count > {} }}}}".format(idx % 10), hass), action)
+
+    yield from hass.async_block_till_done()
+    start = timer()
+
+    for idx in range(1000):
+        hass.states.async_set('sensor.bench_{}'.format(idx % 100), idx)
+
+    hass.states.async_set('light.bench_0', 'on')
+    yield from hass.async_block_till_done()
+
+    assert count == 10
+
+    return timer() - start
+
+
+@benchmark
+@asyncio.coroutine
+def async_compile_templates(hass):
+    """Validate 10k templates of 100 distinct sources, as a config load."""
+    from homeassistant.helpers.template import Template
+
+    sources = [
+        "{{{{ states('sensor.bench_{}') | float * 1.8 + 32 }}}}".format(idx)
+        for idx in range(100)]
+
+    start = timer()
+
+    for idx in range(10**4):
+        Template(sources[idx % 100], hass).ensure_valid()
+
+    return timer() - start
+
+
+@benchmark
+@asyncio.coroutine
+def async_automation_trigger(hass):
+    """Measure trigger to action latency of 1000 state triggers."""
+    count = 0
+    runs = 1000
+    event = asyncio.Event(loop=hass.loop)
+
+    # Automations are enabled right away when Home Assistant is running
+    hass.state = core.CoreState.running
+
+    assert (yield from async_setup_component(hass, 'automation', {
+        'automation': [{
+            'trigger': {
+                'platform': 'state',
+                'entity_id': 'sensor.bench_{}'.format(idx),
+            },
+            'action': {
+                'event': 'benchmark_event',
+            },
+        } for idx in range(100)]
+    }))
+
+    @core.callback
+    def listener(_):
+        """Handle the event fired by the action."""
+        nonlocal count
+        count += 1
+        event.set()
+
+    hass.bus.async_listen('benchmark_event', listener)
+
+    start = timer()
+
+    for idx in range(runs):
+        event.clear()
+        hass.states.async_set('sensor.bench_{}'.format(idx % 100), idx)
+        yield from event.wait()
+
+    assert count == runs
+
+    return timer() - start
+
+
+@benchmark
+@asyncio.coroutine
+def async_websocket_fan_out(hass):
+    """Send 200 state changes to 50 websocket clients."""
+    import aiohttp
+
+    clients = 50
+    events = 200
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    # The API only accepts requests when Home Assistant is running
+    hass.state = core.CoreState.running
+
+    assert (yield from async_setup_component(hass, 'websocket_api', {
+        'http': {
+            'server_host': '127.0.0.1',
+            'server_port': port,
+        }
+    }))
+    yield from hass.http.start()
+
+    session = aiohttp.ClientSession(loop=hass.loop)
+    url = 'http://127.0.0.1:{}/api/websocket'.format(port)
+
+    @asyncio.coroutine
+    def connect():
+        """Connect a client that subscribes to state changes."""
+        wsock = yield from session.ws_connect(url)
+        msg = yield from wsock.receive_json()
+        assert msg['type'] == 'auth_ok'
+        yield from wsock.send_json({
+            'id': 1,
+            'type': 'subscribe_events',
+            'event_type': EVENT_STATE_CHANGED,
+        })
+        msg = yield from wsock.receive_json()
+        assert msg['success']
+        return wsock
+
+    @asyncio.coroutine
+    def receive(wsock):
+        """Receive all state changes."""
+        for _ in range(events):
+            msg = yield from wsock.receive_json()
+            assert msg['type'] == 'event'
+
+    try:
+        wsocks = yield from asyncio.gather(
+            *(connect() for _ in range(clients)), loop=hass.loop)
+
+        start = timer()
+
+        for idx in range(events):
+            hass.states.async_set('sensor.bench', idx)
+
+        yield from asyncio.gather(
+            *(receive(wsock) for wsock in wsocks), loop=hass.loop)
+
+        runtime = timer() - start
+
+        for wsock in wsocks:
+            yield from wsock.close()
+    finally:
+        session.close()
+        yield from hass.http.stop()
+
+    return runtime
+
+
+class _BenchmarkMQTT(object):
+    """Stand-in for the MQTT client that accepts all subscriptions."""
+
+    @asyncio.coroutine
+    def async_subscribe(self, topic, qos):
+        """Subscribe to a topic."""
+        pass
+
+
+@benchmark
+@asyncio.coroutine
+# pylint: disable=invalid-name
+def async_mqtt_dispatch_1k_subscriptions(hass):
+    """Dispatch 100 MQTT messages to 1000 subscriptions."""
+    from homeassistant.components import mqtt
+    from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+    count = 0
+    messages = 100
+    event = asyncio.Event(loop=hass.loop)
+
+    @core.callback
+    def listener(*args):
+        """Handle a message."""
+        nonlocal count
+        count += 1
+
+        # Every message matches the wildcard and one other subscription
+        if count == 2 * messages:
+            event.set()
+
+    # Messages are received from the broker by the MQTT client
+    hass.data[mqtt.DATA_MQTT] = _BenchmarkMQTT()
+
+    yield from mqtt.async_subscribe(hass, 'bench/+/state', listener)
+
+    for idx in range(999):
+        yield from mqtt.async_subscribe(
+            hass, 'bench/{}/state'.format(idx), listener)
+
+    start = timer()
+
+    for idx in range(messages):
+        async_dispatcher_send(
+            hass, mqtt.SIGNAL_MQTT_MESSAGE_RECEIVED,
+            'bench/{}/state'.format(idx % 999), b'on', 0)
+
+    yield from event.wait()
+
+    return timer() - start
+
+
+@benchmark
+@asyncio.coroutine
+def async_bootstrap_large_config(hass):
+    """Set up a configuration with 1000 entities and 200 automations."""
+    from homeassistant import bootstrap
+
+    config = {
+        'homeassistant': {
+            'latitude': 32.87336,
+            'longitude': -117.22743,
+            'elevation': 0,
+            'time_zone': 'UTC',
+        },
+        'input_boolean': {
+            'bench_{}'.format(idx): {} for idx in range(500)
+        },
+        'sensor': [{
+            'platform': 'template',
+            'sensors': {
+                'bench_{}'.format(idx): {
+                    'value_template':
+                        "{{{{ states('input_boolean.bench_{}') }}}}".format(
+                            idx),
+                } for idx in range(500)
+            },
+        }],
+        'automation': [{
+            'trigger': {
+                'platform': 'state',
+                'entity_id': 'input_boolean.bench_{}'.format(idx),
+            },
+            'action': {
+                'service': 'input_boolean.turn_on',
+                'entity_id': 'input_boolean.bench_{}'.format(idx + 1),
+            },
+        } for idx in range(200)],
+    }
+
+    # Bootstrap waits for the tasks that set up components
+    hass.async_track_tasks()
+
+    start = timer()
+
+    assert (yield from bootstrap.async_from_config_dict(
+        config, hass, config_dir=hass.config.config_dir, enable_log=False,
+        skip_pip=True)) is hass
+
+    yield from hass.async_block_till_done()
+    assert len(hass.states.async_entity_ids('sensor')) == 500
+
+    return timer() - start
@@ -133,23 +133,33 @@ def run(script_args: List) -> int:
     override_measurement = args.override_measurement
     default_measurement = args.default_measurement
 
-    query = session.query(models.Events).filter(
-        models.Events.event_type == "state_changed").order_by(
-            models.Events.time_fired)
+    query = session.query(models.Events, models.States).outerjoin(
+        models.States,
+        models.States.event_id == models.Events.event_id).filter(
+            models.Events.event_type == "state_changed").order_by(
+                models.Events.time_fired)
 
     points = []
     count = 0
     from collections import defaultdict
     entities = defaultdict(int)
 
-    for event in query:
+    for event, dbstate in query:
+        # Recent events only store their states in the states table
         event_data = json.loads(event.event_data)
-        state = State.from_dict(event_data.get("new_state"))
+        if event_data:
+            state = State.from_dict(event_data.get("new_state"))
+        elif dbstate is not None and dbstate.state != '':
+            state = dbstate.to_native()
+        else:
+            state = None
 
         if not state or (
                 excl_entities and state.entity_id in excl_entities) or (
                     excl_domains and state.domain in excl_domains):
             session.expunge(event)
+            if dbstate is not None:
+                session.expunge(dbstate)
             continue
 
         try:
@@ -200,6 +210,8 @@ def run(script_args: List) -> int:
         point['tags'].update(tags)
         points.append(point)
         session.expunge(event)
+        if dbstate is not None:
+            session.expunge(dbstate)
         if len(points) >= step:
             if not simulate:
                 print("Write {} points to the database".format(len(points)))
@@ -0,0 +1,208 @@
+"""Named executor pools that share a thread pool fairly."""
+import asyncio
+from collections import deque
+import functools as ft
+import logging
+from time import monotonic
+
+_LOGGER = logging.getLogger(__name__)
+
+# Owners of jobs that other jobs of the same owner may wait for. Their pools
+# may use every worker unless a limit is set, so they can not deadlock.
+UNLIMITED_OWNERS = ('core', 'helpers', 'util')
+
+
+def job_owner(target):
+    """Return the component or module that owns target."""
+    while isinstance(target, ft.partial):
+        target = target.func
+
+    # Coroutine objects have no module, use the one of their function
+    frame = getattr(target, 'cr_frame', None) or \
+        getattr(target, 'gi_frame', None)
+    if frame is not None:
+        module = frame.f_globals.get('__name__') or ''
+    else:
+        module = getattr(target, '__module__', None) or ''
+
+    for prefix in ('homeassistant.components.', 'homeassistant.',
+                   'custom_components.'):
+        if module.startswith(prefix):
+            return module[len(prefix):]
+
+    return module
+
+
+class _Pool(object):
+    """Jobs of a single pool and their stats."""
+
+    __slots__ = ['name', 'limit', 'pending', 'running', 'ready', 'submitted',
+                 'max_queued', 'wait_total', 'wait_max']
+
+    def __init__(self, name, limit):
+        """Initialize the pool."""
+        self.name = name
+        self.limit = limit
+        self.pending = deque()
+        self.running = 0
+        # If the pool is in the ready queue of the executor pools
+        self.ready = False
+        self.submitted = 0
+        self.max_queued = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def runnable(self):
+        """Return if the pool has a job that it is allowed to start."""
+        return bool(self.pending) and self.running < self.limit
+
+
+class ExecutorPools(object):
+    """Run jobs of named pools in a shared executor.
+
+    Every pool may only use limit workers of the executor at the same time,
+    so a single integration with slow jobs can not starve the others. The
+    pools of UNLIMITED_OWNERS have no default limit. When the executor is
+    busy, the next free worker goes to the pools with queued jobs in turn.
+    """
+
+    def __init__(self, loop, executor, max_workers, default_limit=None):
+        """Initialize the executor pools."""
+        self.loop = loop
+        self.executor = executor
+        self.max_workers = max_workers
+        self.default_limit = default_limit or max(1, max_workers // 2)
+        self._pools = {}
+        self._ready = deque()
+        self._running = 0
+
+    def _default_limit(self, name):
+        """Return the limit of pool name if none is set."""
+        if name.split('.', 1)[0] in UNLIMITED_OWNERS:
+            return self.max_workers
+        return self.default_limit
+
+    def _async_get_pool(self, name):
+        """Return the pool with name, created if needed."""
+        pool = self._pools.get(name)
+
+        if pool is None:
+            pool = self._pools[name] = _Pool(name, self._default_limit(name))
+
+        return pool
+
+    def async_get_limit(self, name):
+        """Return the max number of workers that pool name may use.
+
+        This method must be run in the event loop.
+        """
+        pool = self._pools.get(name)
+        return self._default_limit(name) if pool is None else pool.limit
+
+    def async_set_limit(self, name, limit):
+        """Set the max number of workers that pool name may use.
+
+        This method must be run in the event loop.
+        """
+        pool = self._async_get_pool(name)
+        pool.limit = max(1, limit)
+        self._async_mark_ready(pool)
+        self._async_dispatch()
+
+    def async_submit(self, name, target, *args):
+        """Run target with args in a worker of pool name.
+
+        Returns a future with the result of target.
+        This method must be run in the event loop.
+        """
+        pool = self._async_get_pool(name)
+        future = asyncio.Future(loop=self.loop)
+        pool.pending.append((future, target, args, monotonic()))
+        pool.submitted += 1
+        pool.max_queued = max(pool.max_queued, len(pool.pending))
+        self._async_mark_ready(pool)
+        self._async_dispatch()
+        return future
+
+    def async_stats(self):
+        """Return the stats of all pools.
+
+        This method must be run in the event loop.
+        """
+        return {pool.name: {
+            'limit': pool.limit,
+            'running': pool.running,
+            'queued': len(pool.pending),
+            'max_queued': pool.max_queued,
+            'submitted': pool.submitted,
+            'wait_total': pool.wait_total,
+            'wait_max': pool.wait_max,
+        } for pool in self._pools.values()}
+
+    def _async_mark_ready(self, pool):
+        """Queue pool for a worker if it can start a job."""
+        if not pool.ready and pool.runnable:
+            pool.ready = True
+            self._ready.append(pool)
+
+    def _async_dispatch(self):
+        """Start queued jobs while there are free workers."""
+        while self._running < self.max_workers and self._ready:
+            pool = self._ready.popleft()
+            pool.ready = False
+            self._async_start(pool)
+            self._async_mark_ready(pool)
+
+    def _async_start(self, pool):
+        """Start the next job of pool in the executor."""
+        while pool.pending:
+            future, target, args, queued = pool.pending.popleft()
+
+            if future.cancelled():
+                continue
+
+            wait = monotonic() - queued
+            pool.wait_total += wait
+            pool.wait_max = max(pool.wait_max, wait)
+            pool.running += 1
+            self._running += 1
+
+            try:
+                self.executor.submit(self._run, pool, future, target, args)
+            except RuntimeError as err:
+                # The executor has been shut down
+                pool.running -= 1
+                self._running -= 1
+                future.set_exception(err)
+            return
+
+    def _run(self, pool, future, target, args):
+        """Run a job in a worker and report back to the event loop."""
+        result = error = None
+
+        try:
+            result = target(*args)
+        except BaseException as err:  # pylint: disable=broad-except
+            error = err
+
+        try:
+            self.loop.call_soon_threadsafe(
+                self._async_done, pool, future, result, error)
+        except RuntimeError:
+            _LOGGER.debug("Event loop closed before job of %s finished",
+                          pool.name)
+
+    def _async_done(self, pool, future, result, error):
+        """Handle a finished job and start the next ones."""
+        pool.running -= 1
+        self._running -= 1
+
+        if not future.cancelled():
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+        self._async_mark_ready(pool)
+        self._async_dispatch()
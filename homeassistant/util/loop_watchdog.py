@@ -0,0 +1,110 @@
+"""Watchdog that reports when the event loop is blocked."""
+import asyncio
+import logging
+import sys
+import threading
+from time import monotonic
+import traceback
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _running_handle(frame):
+    """Return the loop handle that is running in the stack of frame."""
+    while frame is not None:
+        if frame.f_code.co_name == '_run':
+            handle = frame.f_locals.get('self')
+            if isinstance(handle, asyncio.Handle):
+                return handle
+        frame = frame.f_back
+
+    return None
+
+
+class LoopWatchdog(object):
+    """Measure the latency of an event loop and report when it is blocked.
+
+    A heartbeat is scheduled on the loop every interval. The lag is how much
+    later than planned the heartbeat runs. A helper thread checks the last
+    heartbeat and logs the stack of the loop thread when the loop has not
+    run a heartbeat for longer than the threshold.
+    """
+
+    def __init__(self, loop, threshold, interval=None):
+        """Initialize the watchdog."""
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = interval or min(threshold / 2, 1)
+        self.lag = 0
+        self.max_lag = 0
+        self._loop_thread_id = None
+        self._last_beat = None
+        self._reported = False
+        self._handle = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def async_start(self):
+        """Start the watchdog.
+
+        This method must be run in the event loop.
+        """
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._beat(monotonic())
+        self._thread = threading.Thread(
+            target=self._watch, name='LoopWatchdog', daemon=True)
+        self._thread.start()
+
+    def async_stop(self):
+        """Stop the watchdog.
+
+        This method must be run in the event loop.
+        """
+        self._stop.set()
+
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def async_pop_max_lag(self):
+        """Return the max lag since the last call and reset it.
+
+        This method must be run in the event loop.
+        """
+        max_lag, self.max_lag = self.max_lag, self.lag
+        return max_lag
+
+    def _beat(self, planned):
+        """Record the lag of the loop and schedule the next heartbeat."""
+        now = monotonic()
+        self.lag = now - planned
+        self.max_lag = max(self.max_lag, self.lag)
+        self._last_beat = now
+        self._reported = False
+        self._handle = self.loop.call_later(
+            self.interval, self._beat, now + self.interval)
+
+    def _watch(self):
+        """Check the heartbeats of the loop from the helper thread."""
+        while not self._stop.wait(self.interval):
+            blocked = monotonic() - self._last_beat
+
+            if blocked < self.threshold or self._reported:
+                continue
+
+            self._reported = True
+            self._report(blocked)
+
+    def _report(self, blocked):
+        """Log what the blocked loop thread is running."""
+        frame = sys._current_frames().get(  # pylint: disable=protected-access
+            self._loop_thread_id)
+
+        if frame is None:
+            return
+
+        _LOGGER.warning(
+            "Event loop blocked for %.1f seconds while running %s:\n%s",
+            blocked, _running_handle(frame) or 'unknown',
+            ''.join(traceback.format_stack(frame)))
@@ -132,6 +132,8 @@ def async_test_home_assistant(loop):
     hass.config.time_zone = date_util.get_time_zone('US/Pacific')
     hass.config.units = METRIC_SYSTEM
     hass.config.skip_pip = True
+    # The event loop watchdog is only started by tests that enable it
+    hass.config.loop_lag_threshold = 0
 
     if 'custom_components.test' not in loader.AVAILABLE_COMPONENTS:
         yield from loop.run_in_executor(None, loader.prepare, hass)
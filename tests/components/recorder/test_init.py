@@ -1,18 +1,24 @@
 """The tests for the Recorder component."""
 # pylint: disable=protected-access
+from datetime import timedelta
 import unittest
 from unittest.mock import patch
 
 import pytest
+from sqlalchemy import exc
 
-from homeassistant.core import callback
+from homeassistant.core import callback, State
 from homeassistant.const import MATCH_ALL
-from homeassistant.components.recorder import Recorder
+from homeassistant.setup import setup_component
+from homeassistant.components.recorder import DOMAIN, Recorder
 from homeassistant.components.recorder.const import DATA_INSTANCE
 from homeassistant.components.recorder.util import session_scope
-from homeassistant.components.recorder.models import States, Events
+from homeassistant.components.recorder.models import (
+    States, StateAttributes, Events)
+import homeassistant.util.dt as dt_util
 
-from tests.common import get_test_home_assistant, init_recorder_component
+from tests.common import (
+    get_test_home_assistant, init_recorder_component, mock_state_change_event)
 
 
 class TestRecorder(unittest.TestCase):
@@ -201,3 +207,246 @@ def test_recorder_setup_failure():
         rec.join()
 
     hass.stop()
+
+
+def test_saving_states_in_one_commit(hass_recorder):
+    """Test queued events are written in a single transaction."""
+    hass = hass_recorder({'commit_interval': 30})
+    instance = hass.data[DATA_INSTANCE]
+
+    for idx in range(3):
+        hass.states.set('test.recorder_{}'.format(idx), 'on')
+        hass.block_till_done()
+    instance.block_till_done()
+
+    assert instance.last_batch_size == 3
+    assert instance.max_batch_size >= 3
+
+    with session_scope(hass=hass) as session:
+        for dbstate in session.query(States):
+            dbevent = session.query(Events).get(dbstate.event_id)
+            assert dbevent.event_type == 'state_changed'
+            assert dbevent.to_native(dbstate).data['entity_id'] == \
+                dbstate.entity_id
+
+
+def test_commit_interval(hass_recorder):
+    """Test queued events are committed after the commit interval."""
+    hass = hass_recorder({'commit_interval': 0.05})
+    instance = hass.data[DATA_INSTANCE]
+
+    hass.states.set('test.recorder', 'on')
+    hass.block_till_done()
+    # Returns when the events are committed without requesting a commit
+    instance.queue.join()
+
+    with session_scope(hass=hass) as session:
+        assert session.query(States).count() == 1
+
+
+def test_retry_commit(hass_recorder):
+    """Test the batch is written again when the database fails."""
+    from sqlalchemy.exc import OperationalError
+
+    hass = hass_recorder()
+    from_event = States.from_event
+    calls = []
+
+    def fail_once(event):
+        """Fail to convert the state the first time."""
+        calls.append(event)
+        if len(calls) == 1:
+            raise OperationalError('insert', {}, None)
+        return from_event(event)
+
+    with patch('homeassistant.components.recorder.time.sleep'), \
+            patch.object(States, 'from_event', side_effect=fail_once):
+        hass.states.set('test.recorder', 'on')
+        hass.block_till_done()
+        hass.data[DATA_INSTANCE].block_till_done()
+
+    assert len(calls) == 2
+
+    with session_scope(hass=hass) as session:
+        assert session.query(States).count() == 1
+        assert session.query(Events).filter_by(
+            event_type='state_changed').count() == 1
+
+
+def test_saving_shared_attributes(hass_recorder):
+    """Test states with the same attributes share them in the database."""
+    hass = hass_recorder()
+    instance = hass.data[DATA_INSTANCE]
+
+    hass.states.set('test.recorder', 'on', {'test_attr': 5})
+    hass.states.set('test.recorder', 'off', {'test_attr': 5})
+    hass.states.set('test.recorder', 'on', {'test_attr': 6})
+    hass.block_till_done()
+    instance.block_till_done()
+
+    # Attributes that are not cached are looked up in the database
+    instance._attributes_ids.clear()
+    hass.states.set('test.recorder', 'off', {'test_attr': 5})
+    hass.block_till_done()
+    instance.block_till_done()
+
+    with session_scope(hass=hass) as session:
+        assert session.query(StateAttributes).count() == 2
+        dbstates = list(session.query(States).order_by(States.state_id))
+        assert all(dbstate.attributes is None for dbstate in dbstates)
+        assert len(set(dbstate.attributes_id for dbstate in dbstates)) == 2
+        assert [dbstate.to_native().attributes for dbstate in dbstates] == [
+            {'test_attr': 5}, {'test_attr': 5}, {'test_attr': 6},
+            {'test_attr': 5}]
+
+
+def test_saving_old_state_id(hass_recorder):
+    """Test states refer to the previous state of the entity."""
+    hass = hass_recorder()
+    instance = hass.data[DATA_INSTANCE]
+
+    hass.states.set('test.recorder', 'on')
+    hass.block_till_done()
+    instance.block_till_done()
+
+    # States of an earlier and of the same commit are referred to
+    hass.states.set('test.recorder', 'off')
+    hass.states.set('test.other', 'on')
+    hass.states.set('test.recorder', 'on')
+    hass.block_till_done()
+    instance.block_till_done()
+
+    with session_scope(hass=hass) as session:
+        dbstates = list(session.query(States).order_by(States.state_id))
+        assert [(dbstate.entity_id, dbstate.old_state_id)
+                for dbstate in dbstates] == [
+                    ('test.recorder', None),
+                    ('test.recorder', dbstates[0].state_id),
+                    ('test.other', None),
+                    ('test.recorder', dbstates[1].state_id)]
+        assert all(dbevent.event_data == '{}' for dbevent in session.query(
+            Events).filter_by(event_type='state_changed'))
+
+
+def test_unrecorded_old_state(hass_recorder):
+    """Test the states are kept with the event if the old one is unknown."""
+    from homeassistant.components import logbook
+
+    hass = hass_recorder()
+    start = dt_util.utcnow() - timedelta(hours=1)
+
+    # The old state was set before the recorder was started
+    mock_state_change_event(hass, State('switch.a', 'on'),
+                            State('switch.a', 'off'))
+    mock_state_change_event(hass, State('switch.a', 'off'),
+                            State('switch.a', 'on'))
+    hass.block_till_done()
+    hass.data[DATA_INSTANCE].block_till_done()
+
+    with session_scope(hass=hass) as session:
+        dbstates = list(session.query(States).order_by(States.state_id))
+        assert [(dbstate.state, dbstate.old_state_id)
+                for dbstate in dbstates] == [
+                    ('on', None), ('off', dbstates[0].state_id)]
+
+        dbevents = [session.query(Events).filter_by(
+            event_id=dbstate.event_id).one() for dbstate in dbstates]
+        assert [dbevent.event_data == '{}' for dbevent in dbevents] == [
+            False, True]
+        assert dbevents[0].to_native(dbstates[0]).data[
+            'old_state']['state'] == 'off'
+
+    end = dt_util.utcnow() + timedelta(hours=1)
+    events = logbook._get_events(hass, start, end)
+    assert [entry.message for entry in logbook.humanify(events)
+            if entry.entity_id == 'switch.a'] == [
+                'turned on', 'turned off']
+
+
+def test_old_state_id_after_restart(tmpdir):
+    """Test the first state after a restart has no old state."""
+    from homeassistant.components import logbook
+
+    db_url = 'sqlite:///{}'.format(tmpdir.join('restart.db'))
+
+    def start_hass():
+        """Start hass with a recorder on the database file."""
+        hass = get_test_home_assistant()
+        assert setup_component(hass, DOMAIN, {DOMAIN: {'db_url': db_url}})
+        hass.start()
+        hass.block_till_done()
+        hass.data[DATA_INSTANCE].block_till_done()
+        return hass
+
+    hass = start_hass()
+    hass.states.set('switch.a', 'on')
+    hass.block_till_done()
+    hass.data[DATA_INSTANCE].block_till_done()
+    hass.stop()
+
+    hass = start_hass()
+    try:
+        hass.states.set('switch.a', 'off')
+        hass.block_till_done()
+        hass.data[DATA_INSTANCE].block_till_done()
+
+        with session_scope(hass=hass) as session:
+            dbstates = list(session.query(States).order_by(States.state_id))
+            assert [(dbstate.state, dbstate.old_state_id)
+                    for dbstate in dbstates] == [('on', None), ('off', None)]
+
+            events = [session.query(Events).filter_by(
+                event_id=dbstate.event_id).one().to_native(dbstate)
+                      for dbstate in dbstates]
+            assert [event.data['old_state'] for event in events] == [
+                None, None]
+            start = dbstates[0].last_updated - timedelta(hours=1)
+
+        end = dt_util.utcnow() + timedelta(hours=1)
+        events = logbook._get_events(hass, start, end)
+        assert [entry for entry in logbook.humanify(events)
+                if entry.entity_id == 'switch.a'] == []
+    finally:
+        hass.stop()
+
+
+def test_retention_config(hass_recorder):
+    """Test the retention rules are set up from the config."""
+    hass = hass_recorder({
+        'purge_keep_days': 7,
+        'purge_interval': 1,
+        'retention_domain': {'lock': {'purge_keep_days': 365}},
+        'retention_glob': {'sensor.*_power': {'purge_keep_days': 2}},
+    })
+    retention = hass.data[DATA_INSTANCE].retention
+
+    assert retention.get('lock.door') == {'purge_keep_days': 365}
+    assert retention.get('sensor.main_power') == {'purge_keep_days': 2}
+    assert retention.get('switch.light') == {}
+
+
+def test_read_sessions(tmpdir):
+    """Test read sessions use their own read only connections."""
+    hass = get_test_home_assistant()
+    assert setup_component(hass, DOMAIN, {DOMAIN: {
+        'db_url': 'sqlite:///{}'.format(tmpdir.join('test.db'))}})
+    hass.start()
+    instance = hass.data[DATA_INSTANCE]
+    assert instance.read_engine is not instance.engine
+
+    hass.states.set('test.recorder', 'on')
+    hass.block_till_done()
+    instance.block_till_done()
+
+    with session_scope(hass=hass, read_only=True) as session:
+        assert session.bind is instance.read_engine
+        assert session.query(States).count() == 1
+
+    assert instance.read_sessions == 1
+    assert instance.read_time_max > 0
+
+    with pytest.raises(exc.OperationalError):
+        with session_scope(hass=hass, read_only=True) as session:
+            session.query(States).delete()
+
+    hass.stop()
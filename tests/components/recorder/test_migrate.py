@@ -65,3 +65,19 @@ def test_invalid_update():
     """Test that an invalid new version raises an exception."""
     with pytest.raises(ValueError):
         migration._apply_update(None, -1, 0)
+
+
+def test_add_attributes_id():
+    """Test the migration that shares attributes between states."""
+    from sqlalchemy.engine import reflection
+
+    engine = create_engine('sqlite://')
+    models_original.Base.metadata.create_all(engine)
+
+    migration._apply_update(engine, 5, 4)
+
+    inspector = reflection.Inspector.from_engine(engine)
+    assert 'attributes_id' in [
+        column['name'] for column in inspector.get_columns('states')]
+    assert 'ix_states_attributes_id' in [
+        index['name'] for index in inspector.get_indexes('states')]
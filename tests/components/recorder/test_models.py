@@ -9,7 +9,7 @@ import homeassistant.core as ha
 from homeassistant.const import EVENT_STATE_CHANGED
 from homeassistant.util import dt
 from homeassistant.components.recorder.models import (
-    Base, Events, States, RecorderRuns)
+    Base, Events, States, RecorderRuns, StatisticsDay, StatisticsHour)
 
 ENGINE = None
 SESSION = None
@@ -47,6 +47,37 @@ class TestEvents(unittest.TestCase):
         })
         assert event == Events.from_event(event).to_native()
 
+    def test_state_changed_event(self):
+        """Test the states of a state_changed event are not stored twice."""
+        old_state = ha.State('sensor.temperature', '18')
+        new_state = ha.State('sensor.temperature', '19', {'unit': 'C'})
+        event = ha.Event(EVENT_STATE_CHANGED, {
+            'entity_id': 'sensor.temperature',
+            'old_state': old_state,
+            'new_state': new_state,
+        })
+        db_event = Events.from_event(event)
+        assert db_event.event_data == '{}'
+
+        native = db_event.to_native(
+            States.from_event(event), States.from_event(ha.Event(
+                EVENT_STATE_CHANGED, {'entity_id': 'sensor.temperature',
+                                      'new_state': old_state})))
+        assert native.data == {
+            'entity_id': 'sensor.temperature',
+            'old_state': old_state.as_dict(),
+            'new_state': new_state.as_dict(),
+        }
+
+        # Removed and unknown states are None
+        removed = States.from_event(ha.Event(EVENT_STATE_CHANGED, {
+            'entity_id': 'sensor.temperature', 'new_state': None}))
+        assert db_event.to_native(removed).data == {
+            'entity_id': 'sensor.temperature',
+            'old_state': None,
+            'new_state': None,
+        }
+
 
 class TestStates(unittest.TestCase):
     """Test States model."""
@@ -79,6 +110,35 @@ class TestStates(unittest.TestCase):
         assert db_state.last_updated == event.time_fired
 
 
+class TestStatistics(unittest.TestCase):
+    """Test the statistics models."""
+
+    # pylint: disable=no-self-use
+
+    def test_period_start(self):
+        """Test the start of the period that contains a time."""
+        time = datetime(2017, 5, 6, 7, 8, 9, 10, tzinfo=dt.UTC)
+        assert StatisticsHour.period_start(time) == datetime(
+            2017, 5, 6, 7, tzinfo=dt.UTC)
+        assert StatisticsDay.period_start(time) == datetime(
+            2017, 5, 6, tzinfo=dt.UTC)
+
+    def test_to_native(self):
+        """Test the mean is rounded to the decimals of the states."""
+        start = datetime(2017, 5, 6, 7, tzinfo=dt.UTC)
+        period = StatisticsHour(entity_id='sensor.temperature', start=start,
+                                mean=21.333333333333332, last=21.5)
+        state = period.to_native({'unit_of_measurement': '°C'})
+        assert state.state == '21.3'
+        assert state.attributes == {'unit_of_measurement': '°C'}
+        assert state.last_updated == start
+
+        period.last = 22.0
+        assert period.to_native().state == '21.3'
+        period.last = 1e-05
+        assert period.to_native().state == '21.333333333333332'
+
+
 class TestRecorderRuns(unittest.TestCase):
     """Test recorder run model."""
 
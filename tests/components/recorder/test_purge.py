@@ -3,12 +3,17 @@ import json
 from datetime import datetime, timedelta
 from time import sleep
 import unittest
+from unittest.mock import patch
 
 from homeassistant.components import recorder
+from homeassistant.helpers.entity_values import EntityValues
 from homeassistant.components.recorder.const import DATA_INSTANCE
+from homeassistant.components.recorder import purge
 from homeassistant.components.recorder.purge import purge_old_data
-from homeassistant.components.recorder.models import States, Events
+from homeassistant.components.recorder.models import (
+    States, StateAttributes, Events)
 from homeassistant.components.recorder.util import session_scope
+import homeassistant.util.dt as dt_util
 from tests.common import get_test_home_assistant, init_recorder_component
 
 
@@ -110,6 +115,139 @@ class TestRecorderPurge(unittest.TestCase):
             # now we should only have 3 events left
             self.assertEqual(events.count(), 3)
 
+    def test_purge_unused_attributes(self):
+        """Test deleting attributes that no state refers to anymore."""
+        now = datetime.now()
+        five_days_ago = now - timedelta(days=5)
+
+        self.hass.block_till_done()
+        self.hass.data[DATA_INSTANCE].block_till_done()
+
+        with recorder.session_scope(hass=self.hass) as session:
+            for idx, timestamp in enumerate((five_days_ago, now)):
+                attributes = StateAttributes(shared_attrs='{}', hash=idx)
+                session.add(attributes)
+                session.flush()
+                session.add(States(
+                    entity_id='test.recorder2',
+                    domain='sensor',
+                    state='on',
+                    attributes_id=attributes.attributes_id,
+                    last_changed=timestamp,
+                    last_updated=timestamp,
+                    created=timestamp,
+                ))
+
+        with session_scope(hass=self.hass) as session:
+            purge_old_data(self.hass.data[DATA_INSTANCE], 4)
+
+            attributes = session.query(StateAttributes).filter(
+                StateAttributes.hash.in_([0, 1]))
+            self.assertEqual([attrs.hash for attrs in attributes], [1])
+
+    def test_purge_in_chunks(self):
+        """Test old data is deleted in chunks of max_rows rows."""
+        self._add_test_states()
+        self._add_test_events()
+        instance = self.hass.data[DATA_INSTANCE]
+        instance.purge_deleted_rows = 0
+
+        with session_scope(hass=self.hass) as session:
+            states = session.query(States)
+            events = session.query(Events).filter(
+                Events.event_type.like("EVENT_TEST%"))
+
+            self.assertFalse(purge_old_data(instance, 4, max_rows=2))
+            self.assertEqual(states.count(), 3)
+            self.assertEqual(events.count(), 5)
+
+            self.assertFalse(purge_old_data(instance, 4, max_rows=2))
+            self.assertEqual(states.count(), 2)
+            self.assertEqual(events.count(), 3)
+
+            self.assertTrue(purge_old_data(instance, 4, max_rows=2))
+            self.assertEqual(instance.purge_deleted_rows, 5)
+
+    def test_purge_task_is_requeued(self):
+        """Test the purge task is queued again until it is finished."""
+        instance = self.hass.data[DATA_INSTANCE]
+        self.hass.block_till_done()
+        instance.block_till_done()
+
+        with patch('homeassistant.components.recorder.purge.purge_old_data',
+                   side_effect=[False, True]) as mock_purge:
+            instance.do_adhoc_purge(4)
+            instance.block_till_done()
+
+        self.assertEqual(mock_purge.call_count, 2)
+        self.assertFalse(instance.purge_running)
+        self.assertGreater(instance.last_purge_time, 0)
+
+    def test_purge_retention(self):
+        """Test the states of entities with retention rules."""
+        instance = self.hass.data[DATA_INSTANCE]
+        instance.retention = EntityValues(
+            {'sensor.keep_power': {'purge_keep_days': 10}},
+            {'lock': {'purge_keep_days': 30}},
+            {'sensor.*_power': {'purge_keep_days': 1}})
+        now = dt_util.utcnow()
+
+        self.hass.block_till_done()
+        instance.block_till_done()
+
+        with recorder.session_scope(hass=self.hass) as session:
+            for entity_id, days in (
+                    ('lock.door', 6), ('switch.light', 6), ('switch.light', 2),
+                    ('sensor.main_power', 2), ('sensor.keep_power', 2)):
+                timestamp = now - timedelta(days=days)
+                event = Events(event_type='state_changed', event_data='{}',
+                               origin='LOCAL', time_fired=timestamp)
+                session.add(event)
+                session.flush()
+                session.add(States(
+                    entity_id=entity_id, domain=entity_id.split('.')[0],
+                    state='on', attributes='{}', last_changed=timestamp,
+                    last_updated=timestamp, event_id=event.event_id))
+
+        with session_scope(hass=self.hass) as session:
+            self.assertTrue(purge_old_data(instance, 4))
+
+            states = session.query(States).order_by(States.state_id)
+            self.assertEqual(
+                [(state.entity_id, dt_util.as_utc(state.last_updated))
+                 for state in states],
+                [('lock.door', now - timedelta(days=6)),
+                 ('switch.light', now - timedelta(days=2)),
+                 ('sensor.keep_power', now - timedelta(days=2))])
+
+            # The events of the purged states are deleted with them
+            self.assertEqual(
+                session.query(Events).filter(
+                    Events.event_type == 'state_changed').count(), 3)
+
+    def test_purge_retention_groups_reused(self):
+        """Test the retention groups are computed once per purge."""
+        instance = self.hass.data[DATA_INSTANCE]
+        instance.retention = EntityValues(
+            {'sensor.keep_power': {'purge_keep_days': 10}})
+        self._add_test_states()
+        self._add_test_events()
+
+        with patch('homeassistant.components.recorder.purge.'
+                   '_entities_by_keep_days',
+                   wraps=purge._entities_by_keep_days) as mock_groups, \
+                patch.object(purge.purge_old_data, '__defaults__', (2,)):
+            instance.do_adhoc_purge(4)
+            instance.block_till_done()
+
+        # The purge took several steps
+        self.assertEqual(instance.purge_deleted_rows, 5)
+        self.assertEqual(mock_groups.call_count, 1)
+        self.assertIsNone(instance.purge_state_groups)
+
+        with session_scope(hass=self.hass) as session:
+            self.assertEqual(session.query(States).count(), 2)
+
     def test_purge_method(self):
         """Test purge method."""
         service_data = {'keep_days': 4}
@@ -0,0 +1,133 @@
+"""The tests for the recorder snapshots."""
+from datetime import timedelta
+
+import pytest
+
+from homeassistant.core import State
+from homeassistant.components import history
+from homeassistant.components.recorder.const import DATA_INSTANCE
+from homeassistant.components.recorder.models import (
+    SnapshotStates, StateSnapshots)
+from homeassistant.components.recorder.purge import purge_old_data
+from homeassistant.components.recorder.snapshot import (
+    SNAPSHOT_MINUTE, snapshot_point, write_snapshot)
+from homeassistant.components.recorder.util import session_scope
+import homeassistant.util.dt as dt_util
+
+from tests.common import (
+    fire_time_changed, get_test_home_assistant, init_recorder_component,
+    mock_state_change_event)
+
+
+@pytest.fixture
+def hass_recorder():
+    """HASS fixture with in-memory recorder."""
+    hass = get_test_home_assistant()
+    init_recorder_component(hass)
+    hass.start()
+    hass.block_till_done()
+    hass.data[DATA_INSTANCE].block_till_done()
+    yield hass
+    hass.stop()
+
+
+def _record_states(hass, states):
+    """Record states, in a single transaction."""
+    for state in states:
+        mock_state_change_event(hass, state)
+    hass.block_till_done()
+    hass.data[DATA_INSTANCE].block_till_done()
+
+
+def _write_snapshot(hass, point):
+    """Let the recorder write the snapshot of point."""
+    fire_time_changed(hass, point.replace(minute=SNAPSHOT_MINUTE))
+    hass.block_till_done()
+    hass.data[DATA_INSTANCE].block_till_done()
+
+
+def _get_snapshots(hass):
+    """Return the point and number of states of every snapshot."""
+    with session_scope(hass=hass) as session:
+        return [(dt_util.as_utc(snapshot.point),
+                 session.query(SnapshotStates).filter_by(
+                     snapshot_id=snapshot.snapshot_id).count())
+                for snapshot in session.query(StateSnapshots)]
+
+
+def test_snapshot_point():
+    """Test the snapshots are at the start of the hour."""
+    time = dt_util.utcnow().replace(hour=10, minute=SNAPSHOT_MINUTE)
+    assert snapshot_point(time) == time.replace(
+        minute=0, second=0, microsecond=0)
+
+
+def test_states_at_point_in_time(hass_recorder):
+    """Test the states at a point in time with snapshots."""
+    hass = hass_recorder
+    point = snapshot_point(dt_util.utcnow()) + timedelta(hours=2)
+
+    def states_at(minutes, entity_ids=None):
+        """Return the state per entity at minutes after point."""
+        return {state.entity_id: state.state
+                for state in history.get_states(
+                    hass, point + timedelta(minutes=minutes), entity_ids)}
+
+    _record_states(hass, [
+        State('light.kitchen', 'on',
+              last_updated=point - timedelta(minutes=30)),
+        State('light.hall', 'on', last_updated=point - timedelta(minutes=20)),
+        State('light.hall', 'off', last_updated=point - timedelta(minutes=10)),
+    ])
+    expected = {
+        -15: {'light.kitchen': 'on', 'light.hall': 'on'},
+        0: {'light.kitchen': 'on', 'light.hall': 'off'},
+    }
+    for minutes, states in expected.items():
+        assert states_at(minutes) == states
+
+    _write_snapshot(hass, point)
+    assert _get_snapshots(hass) == [(point, 2)]
+
+    _record_states(hass, [
+        State('light.hall', 'on', last_updated=point + timedelta(minutes=10)),
+        State('light.porch', 'on', last_updated=point + timedelta(minutes=20)),
+    ])
+    expected.update({
+        15: {'light.kitchen': 'on', 'light.hall': 'on'},
+        30: {'light.kitchen': 'on', 'light.hall': 'on', 'light.porch': 'on'},
+    })
+    for minutes, states in expected.items():
+        assert states_at(minutes) == states
+
+    assert states_at(30, ['light.kitchen', 'light.porch']) == {
+        'light.kitchen': 'on', 'light.porch': 'on'}
+
+    # The next snapshot continues from the last one
+    _write_snapshot(hass, point + timedelta(hours=1))
+    assert _get_snapshots(hass)[1] == (point + timedelta(hours=1), 3)
+    assert states_at(90) == expected[30]
+
+
+def test_snapshot_before_run_is_skipped(hass_recorder):
+    """Test no snapshot is written for a point before the run started."""
+    hass = hass_recorder
+    _write_snapshot(hass, snapshot_point(dt_util.utcnow()))
+    assert _get_snapshots(hass) == []
+
+
+def test_purge_snapshots(hass_recorder):
+    """Test old snapshots are purged with their states."""
+    hass = hass_recorder
+    instance = hass.data[DATA_INSTANCE]
+    now = dt_util.utcnow()
+    old = now - timedelta(days=10)
+
+    _record_states(hass, [State('light.kitchen', 'on', last_updated=now)])
+    with session_scope(hass=hass) as session:
+        write_snapshot(session, old, old - timedelta(hours=1))
+        write_snapshot(session, now + timedelta(minutes=1), now)
+
+    assert _get_snapshots(hass) == [(old, 0), (now + timedelta(minutes=1), 1)]
+    assert purge_old_data(instance, 4)
+    assert _get_snapshots(hass) == [(now + timedelta(minutes=1), 1)]
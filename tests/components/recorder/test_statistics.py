@@ -0,0 +1,106 @@
+"""The tests for the recorder statistics."""
+from datetime import timedelta
+
+import pytest
+
+from homeassistant.const import ATTR_UNIT_OF_MEASUREMENT
+from homeassistant.core import State
+from homeassistant.components.recorder.const import DATA_INSTANCE
+from homeassistant.components.recorder.models import (
+    States, StatisticsDay, StatisticsHour)
+from homeassistant.components.recorder.purge import purge_old_data
+from homeassistant.components.recorder.statistics import (
+    StatisticsCompiler, numeric_value)
+from homeassistant.components.recorder.util import session_scope
+import homeassistant.util.dt as dt_util
+
+from tests.common import (
+    get_test_home_assistant, init_recorder_component, mock_state_change_event)
+
+ATTRIBUTES = {ATTR_UNIT_OF_MEASUREMENT: '°C'}
+
+
+@pytest.fixture
+def hass_recorder():
+    """HASS fixture with in-memory recorder."""
+    hass = get_test_home_assistant()
+    init_recorder_component(hass)
+    hass.start()
+    hass.block_till_done()
+    hass.data[DATA_INSTANCE].block_till_done()
+    yield hass
+    hass.stop()
+
+
+def _record_states(hass, states):
+    """Record states, in a single transaction."""
+    for state in states:
+        mock_state_change_event(hass, state)
+    hass.block_till_done()
+    hass.data[DATA_INSTANCE].block_till_done()
+
+
+def _get_periods(hass, model):
+    """Return the aggregates of all periods of model."""
+    with session_scope(hass=hass) as session:
+        return [(row.entity_id, dt_util.as_utc(row.start), row.mean, row.min,
+                 row.max, row.last, row.count)
+                for row in session.query(model).order_by(model.id)]
+
+
+def test_numeric_value():
+    """Test only numeric states with a unit have statistics."""
+    assert numeric_value(State('sensor.temp', '21.5', ATTRIBUTES)) == 21.5
+    assert numeric_value(State('sensor.temp', 'unknown', ATTRIBUTES)) is None
+    assert numeric_value(State('sensor.temp', 'nan', ATTRIBUTES)) is None
+    assert numeric_value(State('sensor.count', '5')) is None
+    assert numeric_value(None) is None
+
+
+def test_compile_statistics(hass_recorder):
+    """Test the hourly and daily statistics are updated as states arrive."""
+    hass = hass_recorder
+    day = dt_util.utcnow().replace(
+        hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    start = day + timedelta(hours=10, minutes=30)
+
+    _record_states(hass, [
+        State('sensor.temp', value, ATTRIBUTES,
+              last_updated=start + timedelta(minutes=minutes))
+        for minutes, value in ((0, '10'), (20, '20'), (40, '30'),
+                               (50, 'unavailable'))
+    ] + [State('switch.light', 'on', last_updated=start)])
+
+    hour = day + timedelta(hours=10)
+    assert _get_periods(hass, StatisticsHour) == [
+        ('sensor.temp', hour, 15, 10, 20, 20, 2),
+        ('sensor.temp', hour + timedelta(hours=1), 30, 30, 30, 30, 1)]
+    assert _get_periods(hass, StatisticsDay) == [
+        ('sensor.temp', day, 20, 10, 30, 30, 3)]
+
+    # Periods that were written before a restart are continued
+    hass.data[DATA_INSTANCE]._statistics = StatisticsCompiler()
+    _record_states(hass, [
+        State('sensor.temp', '50', ATTRIBUTES,
+              last_updated=start + timedelta(minutes=50))])
+
+    assert _get_periods(hass, StatisticsHour)[1] == (
+        'sensor.temp', hour + timedelta(hours=1), 40, 30, 50, 50, 2)
+    assert _get_periods(hass, StatisticsDay) == [
+        ('sensor.temp', day, 27.5, 10, 50, 50, 4)]
+
+
+def test_purge_keeps_statistics(hass_recorder):
+    """Test the statistics outlive the purged states."""
+    hass = hass_recorder
+    old = dt_util.utcnow() - timedelta(days=10)
+
+    _record_states(hass, [
+        State('sensor.temp', '10', ATTRIBUTES, last_updated=old)])
+    assert purge_old_data(hass.data[DATA_INSTANCE], 4)
+
+    with session_scope(hass=hass) as session:
+        assert session.query(States).count() == 0
+
+    assert len(_get_periods(hass, StatisticsHour)) == 1
+    assert len(_get_periods(hass, StatisticsDay)) == 1
@@ -0,0 +1,47 @@
+"""The tests for the event loop lag sensor platform."""
+import asyncio
+from unittest.mock import MagicMock
+
+from homeassistant import bootstrap
+from homeassistant.setup import async_setup_component
+
+
+@asyncio.coroutine
+def test_loop_lag_sensor(hass):
+    """Test the sensor reports the max lag since the last update."""
+    hass.loop_watchdog = MagicMock()
+    hass.loop_watchdog.async_pop_max_lag.return_value = 0.0123
+
+    assert (yield from async_setup_component(hass, 'sensor', {
+        'sensor': {'platform': 'loop_lag'}}))
+
+    state = hass.states.get('sensor.event_loop_lag')
+    assert state.state == '12.3'
+    assert state.attributes['unit_of_measurement'] == 'ms'
+
+
+@asyncio.coroutine
+def test_loop_lag_sensor_from_config(hass):
+    """Test the watchdog runs before the sensor is set up from config."""
+    assert (yield from bootstrap.async_from_config_dict({
+        'homeassistant': {'loop_lag_threshold': 5},
+        'sensor': {'platform': 'loop_lag'},
+    }, hass, enable_log=False, skip_pip=True)) is hass
+
+    try:
+        yield from hass.async_block_till_done()
+        assert hass.loop_watchdog is not None
+        assert hass.loop_watchdog.threshold == 5
+        assert hass.states.get('sensor.event_loop_lag') is not None
+    finally:
+        if hass.loop_watchdog is not None:
+            hass.loop_watchdog.async_stop()
+
+
+@asyncio.coroutine
+def test_loop_lag_sensor_without_watchdog(hass):
+    """Test the sensor is not added when the watchdog is disabled."""
+    assert (yield from async_setup_component(hass, 'sensor', {
+        'sensor': {'platform': 'loop_lag'}}))
+
+    assert hass.states.get('sensor.event_loop_lag') is None
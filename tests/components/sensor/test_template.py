@@ -1,4 +1,8 @@
 """The test for the Template sensor platform."""
+from unittest.mock import patch
+
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.template import Template
 from homeassistant.setup import setup_component
 
 from tests.common import get_test_home_assistant, assert_setup_component
@@ -44,6 +48,73 @@ class TestTemplateSensor:
         state = self.hass.states.get('sensor.test_template_sensor')
         assert state.state == 'It Works.'
 
+    def test_template_tracks_read_states(self):
+        """Test the sensor only updates for the states its template reads."""
+        with assert_setup_component(1):
+            assert setup_component(self.hass, 'sensor', {
+                'sensor': {
+                    'platform': 'template',
+                    'sensors': {
+                        'lights_on': {
+                            'value_template':
+                                "{{ states.light | selectattr('state', "
+                                "'eq', 'on') | list | count }}"
+                        }
+                    }
+                }
+            })
+
+        self.hass.start()
+        self.hass.block_till_done()
+
+        with patch.object(Template, 'async_render', autospec=True,
+                          side_effect=Template.async_render) as mock_render:
+            self.hass.states.set('switch.kitchen', 'on')
+            self.hass.block_till_done()
+            assert mock_render.call_count == 0
+
+            self.hass.states.set('light.kitchen', 'on')
+            self.hass.block_till_done()
+            assert mock_render.call_count == 1
+
+        state = self.hass.states.get('sensor.lights_on')
+        assert state.state == '1'
+
+    def test_unchanged_value_skips_write(self):
+        """Test an update that renders the same value is not written."""
+        with assert_setup_component(1):
+            assert setup_component(self.hass, 'sensor', {
+                'sensor': {
+                    'platform': 'template',
+                    'sensors': {
+                        'kitchen_on': {
+                            'value_template':
+                                "{{ is_state('light.kitchen', 'on') }}"
+                        }
+                    }
+                }
+            })
+
+        self.hass.start()
+        self.hass.block_till_done()
+        self.hass.states.set('light.kitchen', 'on')
+        self.hass.block_till_done()
+        state = self.hass.states.get('sensor.kitchen_on')
+        assert state.state == 'True'
+
+        with patch.object(Entity, '_attr_setter', autospec=True) \
+                as mock_attr_setter:
+            self.hass.states.set('light.kitchen', 'on', {'brightness': 10})
+            self.hass.block_till_done()
+            assert mock_attr_setter.call_count == 0
+
+        assert self.hass.states.get('sensor.kitchen_on') is state
+        assert self.hass.states.async_suppressed_writes() == {'sensor': 1}
+
+        self.hass.states.set('light.kitchen', 'off')
+        self.hass.block_till_done()
+        assert self.hass.states.get('sensor.kitchen_on').state == 'False'
+
     def test_icon_template(self):
         """Test icon template."""
         with assert_setup_component(1):
@@ -1,13 +1,20 @@
 """The tests the History component."""
 # pylint: disable=protected-access,invalid-name
+import asyncio
 from datetime import timedelta
+import json
 import unittest
 from unittest.mock import patch, sentinel
 
-from homeassistant.setup import setup_component
+from aiohttp import ClientError, ClientPayloadError
+import pytest
+from sqlalchemy.exc import SQLAlchemyError
+
+from homeassistant.setup import setup_component, async_setup_component
 import homeassistant.core as ha
 import homeassistant.util.dt as dt_util
 from homeassistant.components import history, recorder
+from homeassistant.remote import JSONEncoder
 
 from tests.common import (
     init_recorder_component, mock_http_component, mock_state_change_event,
@@ -133,6 +140,75 @@ class TestComponentHistory(unittest.TestCase):
 
         self.assertEqual(states, hist[entity_id])
 
+    def test_get_long_term_states(self):
+        """Test numeric states of long periods come from the statistics."""
+        self.init_recorder()
+        attributes = {'unit_of_measurement': '°C'}
+
+        self.hass.states.set('sensor.temp', '20', attributes)
+        self.hass.states.set('sensor.temp', '22', attributes)
+        self.hass.states.set('media_player.test', 'idle')
+        self.hass.states.set('zone.home', 'zoning')
+        self.wait_recording_done()
+
+        now = dt_util.utcnow()
+        start = now - timedelta(days=10)
+        end = now + timedelta(hours=1)
+        hist = history.get_long_term_states(
+            self.hass, start, end, filters=history.Filters())
+
+        self.assertEqual(
+            sorted(hist), ['media_player.test', 'sensor.temp'])
+        temp = hist['sensor.temp']
+        self.assertEqual(len(temp), 1)
+        self.assertEqual(temp[0].state, '21.0')
+        self.assertEqual(temp[0].attributes, attributes)
+        self.assertEqual(temp[0].last_updated,
+                         now.replace(minute=0, second=0, microsecond=0))
+        self.assertEqual(
+            hist['media_player.test'],
+            [self.hass.states.get('media_player.test')])
+
+        # Requested entities without statistics have their states
+        hist = history.get_long_term_states(
+            self.hass, start, end, ['media_player.test'])
+        self.assertEqual(list(hist), ['media_player.test'])
+
+        filters = history.Filters()
+        filters.excluded_domains = ['sensor']
+        hist = history.get_long_term_states(
+            self.hass, start, end, filters=filters)
+        self.assertEqual(list(hist), ['media_player.test'])
+
+    def test_stream_long_term_states(self):
+        """Test the streamed JSON matches the long term states."""
+        self.init_recorder()
+        attributes = {'unit_of_measurement': '°C'}
+
+        self.hass.states.set('sensor.temp', '20', attributes)
+        self.hass.states.set('sensor.temp', '22', attributes)
+        self.hass.states.set('media_player.test', 'idle')
+        self.wait_recording_done()
+
+        now = dt_util.utcnow()
+        start = now - timedelta(days=10)
+        end = now + timedelta(hours=1)
+
+        for entity_ids in (None, ['sensor.temp'], ['media_player.test']):
+            chunks = []
+            with patch.object(history, 'STREAM_CHUNK_STATES', 2):
+                history.stream_long_term_states(
+                    self.hass, chunks.append, start, end, entity_ids)
+            expected = sorted(
+                history.get_long_term_states(
+                    self.hass, start, end, entity_ids).values(),
+                key=lambda entity_states: entity_states[0].entity_id)
+            hist = sorted(json.loads(''.join(chunks)),
+                          key=lambda entity_states: entity_states[0][
+                              'entity_id'])
+            self.assertEqual(
+                hist, json.loads(json.dumps(expected, cls=JSONEncoder)))
+
     def test_get_significant_states(self):
         """Test that only significant states are returned.
 
@@ -145,6 +221,50 @@ class TestComponentHistory(unittest.TestCase):
             self.hass, zero, four, filters=history.Filters())
         assert states == hist
 
+    def test_stream_significant_states(self):
+        """Test the streamed JSON matches the significant states."""
+        zero, four, states = self.record_states()
+        with patch('homeassistant.components.recorder.dt_util.utcnow',
+                   return_value=four):
+            self.hass.states.set('light.unchanged', 'on')
+            self.wait_recording_done()
+        start = four + timedelta(seconds=1)
+        with patch('homeassistant.components.recorder.dt_util.utcnow',
+                   return_value=start + timedelta(seconds=1)):
+            self.hass.states.set('media_player.test', 'paused')
+            self.wait_recording_done()
+
+        def stream(*args, **kwargs):
+            """Return the streamed JSON and the number of chunks."""
+            chunks = []
+            with patch.object(history, 'STREAM_CHUNK_STATES', 2):
+                history.stream_significant_states(
+                    self.hass, chunks.append, *args,
+                    filters=history.Filters(), **kwargs)
+            return json.loads(''.join(chunks)), len(chunks)
+
+        hist, count = stream(zero, four)
+        self.assertGreater(count, 1)
+        expected = sorted(
+            history.get_significant_states(
+                self.hass, zero, four, filters=history.Filters()).values(),
+            key=lambda entity_states: entity_states[0].entity_id)
+        self.assertEqual(
+            hist, json.loads(json.dumps(expected, cls=JSONEncoder)))
+
+        # Entities without changes only have their initial state
+        hist, _ = stream(start)
+        self.assertEqual(hist[0][0]['entity_id'], 'media_player.test')
+        self.assertEqual(len(hist[0]), 2)
+        unchanged = {entity_states[0]['entity_id']: entity_states
+                     for entity_states in hist[1:]}['light.unchanged']
+        self.assertEqual(len(unchanged), 1)
+        self.assertEqual(unchanged[0]['last_updated'], start.isoformat())
+
+        hist, _ = stream(start, include_start_time_state=False)
+        self.assertEqual(len(hist), 1)
+        self.assertEqual(hist[0][0]['state'], 'paused')
+
     def test_get_significant_states_with_initial(self):
         """Test that only significant states are returned.
 
@@ -483,3 +603,162 @@ class TestComponentHistory(unittest.TestCase):
             set_state(therm, 22, attributes={'current_temperature': 21,
                                              'hidden': True})
         return zero, four, states
+
+
+@asyncio.coroutine
+def test_fetch_period_api(hass, test_client):
+    """Test the history API streams the states of the period."""
+    yield from hass.async_add_job(init_recorder_component, hass)
+    yield from async_setup_component(hass, 'history', {'history': {}})
+    start = dt_util.utcnow()
+    hass.states.async_set('light.kitchen', 'on')
+    hass.states.async_set('light.kitchen', 'off')
+    yield from hass.async_block_till_done()
+    yield from hass.async_add_job(
+        hass.data[recorder.DATA_INSTANCE].block_till_done)
+
+    client = yield from test_client(hass.http.app)
+    response = yield from client.get(
+        '/api/history/period/{}'.format(start.isoformat()))
+    assert response.status == 200
+    result = yield from response.json()
+    assert [[state['state'] for state in entity_states]
+            for entity_states in result] == [['on', 'off']]
+
+    # Long periods are streamed as well
+    with patch.object(history, 'stream_long_term_states',
+                      wraps=history.stream_long_term_states) as mock_stream:
+        response = yield from client.get(
+            '/api/history/period/{}'.format(
+                (start - timedelta(days=10)).isoformat()),
+            params={'end_time': (start + timedelta(days=1)).isoformat()})
+        assert response.status == 200
+        result = yield from response.json()
+    assert mock_stream.call_count == 1
+    assert [[state['state'] for state in entity_states]
+            for entity_states in result] == [['on', 'off']]
+
+
+@asyncio.coroutine
+def test_fetch_period_api_error(hass, test_client):
+    """Test the connection is closed when reading the states fails."""
+    yield from hass.async_add_job(init_recorder_component, hass)
+    yield from async_setup_component(hass, 'history', {'history': {}})
+
+    def failing_stream(hass, write, *args):
+        """Write the start of the states and fail."""
+        write('[[')
+        raise SQLAlchemyError('Database is gone')
+
+    client = yield from test_client(hass.http.app)
+    with patch.object(history, 'stream_significant_states',
+                      side_effect=failing_stream):
+        response = yield from client.get('/api/history/period')
+        assert response.status == 200
+        with pytest.raises(ClientPayloadError):
+            yield from response.read()
+
+
+@asyncio.coroutine
+def test_fetch_period_api_stalled_client(hass, test_client):
+    """Test the worker is released when the client stops reading."""
+    yield from hass.async_add_job(init_recorder_component, hass)
+    yield from async_setup_component(hass, 'history', {'history': {}})
+    closed = []
+
+    def stream(hass, write, *args):
+        """Write chunks until the stream is closed."""
+        try:
+            for _ in range(10):
+                write('[]')
+        except history._StreamClosed:
+            closed.append(True)
+            raise
+
+    @asyncio.coroutine
+    def stalled_drain(response):
+        """Wait for a client that does not read."""
+        yield from asyncio.Future(loop=hass.loop)
+
+    client = yield from test_client(hass.http.app)
+    with patch.object(history, 'stream_significant_states',
+                      side_effect=stream), \
+            patch.object(history, 'STREAM_QUEUE_SIZE', 1), \
+            patch.object(history, 'STREAM_WRITE_TIMEOUT', 0.1), \
+            patch.object(history.web.StreamResponse, 'drain',
+                         stalled_drain):
+        response = yield from client.get('/api/history/period')
+        assert response.status == 200
+        with pytest.raises(ClientError):
+            yield from response.read()
+
+    yield from hass.async_block_till_done()
+    assert closed == [True]
+
+
+def test_downsample_states():
+    """Test numeric states are downsampled keeping their shape."""
+    start = dt_util.utcnow()
+    attributes = {'unit_of_measurement': 'W'}
+
+    def make_states(values, **kwargs):
+        """Return a state per value, a second apart."""
+        return [ha.State('sensor.power', value, kwargs.get('attributes'),
+                         last_updated=start + timedelta(seconds=idx))
+                for idx, value in enumerate(values)]
+
+    values = ['1'] * 50 + ['100'] + ['1'] * 48 + ['5']
+    states = make_states(values, attributes=attributes)
+    sampled = history.downsample_states(states, 10)
+    assert len(sampled) == 10
+    assert sampled[0] is states[0]
+    assert sampled[-1] is states[-1]
+    # The spike shapes the graph
+    assert states[50] in sampled
+
+    # States that are not finite numbers are all kept
+    states[20].state = 'unavailable'
+    states[30].state = 'nan'
+    sampled = history.downsample_states(states, 10)
+    assert len(sampled) == 10
+    assert states[20] in sampled
+    assert states[30] in sampled
+    assert sampled == sorted(sampled, key=lambda state: state.last_updated)
+
+    # Numeric entities without a unit of measurement are downsampled too
+    states = make_states(values)
+    sampled = history.downsample_states(states, 10)
+    assert len(sampled) == 10
+    assert states[50] in sampled
+
+    # Entities that are not numeric keep every transition
+    states = make_states(['on', 'off'] * 10)
+    assert history.downsample_states(states, 10) == states
+    assert history.downsample_states(states[:5], 10) == states[:5]
+
+
+@asyncio.coroutine
+def test_fetch_period_api_max_points(hass, test_client):
+    """Test the history API downsamples numeric entities."""
+    yield from hass.async_add_job(init_recorder_component, hass)
+    yield from async_setup_component(hass, 'history', {'history': {}})
+    start = dt_util.utcnow()
+    for value in range(20):
+        hass.states.async_set('sensor.power', value,
+                              {'unit_of_measurement': 'W'})
+        hass.states.async_set('light.kitchen', 'on' if value % 2 else 'off')
+    yield from hass.async_block_till_done()
+    yield from hass.async_add_job(
+        hass.data[recorder.DATA_INSTANCE].block_till_done)
+
+    client = yield from test_client(hass.http.app)
+    url = '/api/history/period/{}'.format(start.isoformat())
+    response = yield from client.get(url, params={'max_points': 5})
+    assert response.status == 200
+    result = yield from response.json()
+    assert {entity_states[0]['entity_id']: len(entity_states)
+            for entity_states in result} == {
+                'light.kitchen': 20, 'sensor.power': 5}
+
+    response = yield from client.get(url, params={'max_points': 'all'})
+    assert response.status == 400
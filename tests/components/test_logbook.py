@@ -1,8 +1,12 @@
 """The tests for the logbook component."""
 # pylint: disable=protected-access,invalid-name
+import asyncio
 import logging
 from datetime import timedelta
 import unittest
+from unittest.mock import patch
+
+from sqlalchemy.exc import SQLAlchemyError
 
 from homeassistant.components import sun
 import homeassistant.core as ha
@@ -10,11 +14,12 @@ from homeassistant.const import (
     EVENT_STATE_CHANGED, EVENT_HOMEASSISTANT_START, EVENT_HOMEASSISTANT_STOP,
     ATTR_HIDDEN, STATE_NOT_HOME, STATE_ON, STATE_OFF)
 import homeassistant.util.dt as dt_util
-from homeassistant.components import logbook
-from homeassistant.setup import setup_component
+from homeassistant.components import logbook, recorder
+from homeassistant.setup import async_setup_component, setup_component
 
 from tests.common import (
-    mock_http_component, init_recorder_component, get_test_home_assistant)
+    async_fire_time_changed, mock_coro, mock_http_component,
+    init_recorder_component, get_test_home_assistant)
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -90,6 +95,152 @@ class TestComponentLogbook(unittest.TestCase):
 
         self.assertEqual(0, len(calls))
 
+    def test_get_events_state_changed(self):
+        """Test the states of recorded state_changed events are restored.
+
+        New and removed entities and attribute changes are not queried.
+        """
+        self.hass.states.set('switch.bla', STATE_ON)
+        self.hass.states.set('switch.bla', STATE_OFF, {'test': 1})
+        self.hass.states.set('switch.bla', STATE_OFF, {'test': 2})
+        self.hass.states.set('switch.bla', STATE_ON)
+        self.hass.states.remove('switch.bla')
+        self.hass.block_till_done()
+        self.hass.data[recorder.DATA_INSTANCE].block_till_done()
+
+        events = [event for event in logbook._get_events(
+            self.hass, dt_util.utcnow() - timedelta(hours=1),
+            dt_util.utcnow() + timedelta(hours=1))
+                  if event.event_type == EVENT_STATE_CHANGED]
+
+        assert len(events) == 2
+        assert events[0].data['old_state']['state'] == STATE_ON
+        assert events[0].data['new_state']['state'] == STATE_OFF
+        assert events[0].data['new_state']['attributes'] == {'test': 1}
+        assert events[1].data['old_state']['state'] == STATE_OFF
+        assert events[1].data['old_state']['attributes'] == {'test': 2}
+        assert events[1].data['new_state']['state'] == STATE_ON
+
+    def record_state_changes(self, states, times=None):
+        """Record the (entity_id, state) changes, at times if given."""
+        for idx, (entity_id, state) in enumerate(states):
+            if times is None:
+                self.hass.states.set(entity_id, state)
+                continue
+            with patch('homeassistant.core.dt_util.utcnow',
+                       return_value=times[idx]):
+                self.hass.states.set(entity_id, state)
+        self.hass.block_till_done()
+        self.hass.data[recorder.DATA_INSTANCE].block_till_done()
+
+    def test_get_events_config_filter(self):
+        """Test the query excludes the same state changes as the config."""
+        entity_ids = ['switch.a', 'switch.b', 'light.a', 'light.b',
+                      'sensor.a']
+        self.record_state_changes(
+            [(entity_id, state) for state in (STATE_ON, STATE_OFF)
+             for entity_id in entity_ids])
+        start = dt_util.utcnow() - timedelta(hours=1)
+        end = dt_util.utcnow() + timedelta(hours=1)
+
+        for config in (
+                {},
+                {logbook.CONF_EXCLUDE: {
+                    logbook.CONF_DOMAINS: ['switch'],
+                    logbook.CONF_ENTITIES: ['light.a']}},
+                {logbook.CONF_INCLUDE: {
+                    logbook.CONF_DOMAINS: ['switch'],
+                    logbook.CONF_ENTITIES: ['light.a']}},
+                {logbook.CONF_INCLUDE: {
+                    logbook.CONF_ENTITIES: ['light.a', 'switch.b']}},
+                {logbook.CONF_EXCLUDE: {
+                    logbook.CONF_DOMAINS: ['switch'],
+                    logbook.CONF_ENTITIES: ['light.b']},
+                 logbook.CONF_INCLUDE: {
+                     logbook.CONF_DOMAINS: ['switch', 'sensor'],
+                     logbook.CONF_ENTITIES: ['switch.a', 'light.a']}}):
+            config = logbook.CONFIG_SCHEMA(
+                {logbook.DOMAIN: config})[logbook.DOMAIN]
+            events = logbook._get_events(self.hass, start, end, config)
+            self.assertEqual(
+                [event.data['entity_id'] for event in events
+                 if event.event_type == EVENT_STATE_CHANGED],
+                [event.data['entity_id'] for event in logbook._exclude_events(
+                    logbook._get_events(self.hass, start, end), config)
+                 if event.event_type == EVENT_STATE_CHANGED])
+
+    def test_get_events_continuous(self):
+        """Test changes of continuous domains with a unit are not queried."""
+        for value in range(3):
+            self.hass.states.set('sensor.power', value,
+                                 {'unit_of_measurement': 'W'})
+            self.hass.states.set('sensor.mode', 'auto', {'value': value})
+        self.hass.block_till_done()
+        self.hass.data[recorder.DATA_INSTANCE].block_till_done()
+
+        events = logbook._get_events(
+            self.hass, dt_util.utcnow() - timedelta(hours=1),
+            dt_util.utcnow() + timedelta(hours=1))
+
+        # Humanify needs the attribute changes to group the sensor
+        self.assertEqual(
+            [event.data['entity_id'] for event in events
+             if event.event_type == EVENT_STATE_CHANGED],
+            ['sensor.mode', 'sensor.mode'])
+
+    def test_get_events_entity(self):
+        """Test the events of a single entity."""
+        self.record_state_changes([
+            ('switch.b_a', STATE_ON), ('switch.bxa', STATE_ON),
+            ('switch.b_a', STATE_OFF), ('switch.bxa', STATE_OFF)])
+        for entity_id in ('switch.b_a', 'switch.bxa'):
+            logbook.log_entry(self.hass, 'Test', 'logged', entity_id=entity_id)
+        self.hass.block_till_done()
+        self.hass.data[recorder.DATA_INSTANCE].block_till_done()
+
+        events = logbook._get_events(
+            self.hass, dt_util.utcnow() - timedelta(hours=1),
+            dt_util.utcnow() + timedelta(hours=1), entity_id='switch.b_a')
+
+        self.assertEqual(
+            [(event.event_type, event.data['entity_id']) for event in events],
+            [(EVENT_STATE_CHANGED, 'switch.b_a'),
+             (logbook.EVENT_LOGBOOK_ENTRY, 'switch.b_a')])
+
+    def test_get_events_page(self):
+        """Test the pages of events end with a whole batch of events."""
+        start = dt_util.utcnow().replace(
+            hour=10, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        # Two changes of five entities in each of four batches
+        times = [start + timedelta(minutes=minutes)
+                 for minutes in range(1, 60, 15) for _ in range(10)]
+        entity_ids = ['switch.test_{}'.format(idx) for idx in range(5)]
+        self.record_state_changes(
+            [(entity_id, state) for state in (STATE_ON, STATE_OFF) * 5
+             for entity_id in entity_ids][:len(times)], times)
+        end = start + timedelta(hours=1)
+        all_events = logbook._get_events(self.hass, start, end)
+        # The first changes are new entities
+        self.assertEqual(len(all_events), 35)
+
+        events, cursor = logbook._get_events_page(
+            self.hass, start, end, 12)
+        self.assertEqual(len(events), 5)
+        self.assertEqual(events, all_events[:5])
+
+        pages = [events]
+        while cursor is not None:
+            events, cursor = logbook._get_events_page(
+                self.hass, start, end, 12, logbook._parse_cursor(cursor))
+            pages.append(events)
+        self.assertEqual([len(page) for page in pages], [5, 10, 10, 10])
+        self.assertEqual(sum(pages, []), all_events)
+
+        # Batches that are longer than the limit are split
+        events, cursor = logbook._get_events_page(self.hass, start, end, 3)
+        self.assertEqual(events, all_events[:3])
+        self.assertIsNotNone(cursor)
+
     def test_humanify_filter_sensor(self):
         """Test humanify filter too frequent sensor values."""
         entity_id = 'sensor.bla'
@@ -556,3 +707,140 @@ class TestComponentLogbook(unittest.TestCase):
             'old_state': state,
             'new_state': state,
         }, time_fired=event_time_fired)
+
+
+@asyncio.coroutine
+def test_logbook_api_pages(hass, test_client):
+    """Test the logbook API returns pages of the entries of an entity."""
+    yield from hass.async_add_job(init_recorder_component, hass)
+    yield from async_setup_component(hass, 'http', {})
+    hass.config.components.add('frontend')
+    with patch('homeassistant.components.frontend.'
+               'async_register_built_in_panel', return_value=mock_coro()):
+        assert (yield from async_setup_component(
+            hass, logbook.DOMAIN, {logbook.DOMAIN: {}}))
+
+    for state in (STATE_ON, STATE_OFF, STATE_ON):
+        hass.states.async_set('switch.test', state)
+        hass.states.async_set('switch.other', state)
+    yield from hass.async_block_till_done()
+    yield from hass.async_add_job(
+        hass.data[recorder.DATA_INSTANCE].block_till_done)
+
+    client = yield from test_client(hass.http.app)
+    url = '/api/logbook/{}'.format(
+        (dt_util.utcnow() - timedelta(hours=1)).isoformat())
+    params = {'entity': 'switch.test', 'limit': 1}
+    entries = []
+    while True:
+        response = yield from client.get(url, params=params)
+        assert response.status == 200
+        result = yield from response.json()
+        entries.extend(result['entries'])
+        if result['cursor'] is None:
+            break
+        params['cursor'] = result['cursor']
+
+    assert [(entry['entity_id'], entry['message']) for entry in entries] == [
+        ('switch.test', 'turned off'), ('switch.test', 'turned on')]
+
+    for params in ({'limit': 0}, {'limit': 'all'}, {'limit': 1, 'cursor': 1},
+                   {'entity': 'switch'}):
+        response = yield from client.get(url, params=params)
+        assert response.status == 400
+
+
+@asyncio.coroutine
+def test_subscription(hass):
+    """Test a subscription sends the backfill and then the new entries."""
+    yield from hass.async_add_job(init_recorder_component, hass)
+    config = logbook.CONFIG_SCHEMA({logbook.DOMAIN: {
+        logbook.CONF_EXCLUDE: {logbook.CONF_ENTITIES: ['switch.excluded']}}})
+
+    for entity_id in ('switch.test', 'switch.excluded'):
+        for state in (STATE_ON, STATE_OFF, STATE_ON):
+            hass.states.async_set(entity_id, state)
+    yield from hass.async_block_till_done()
+
+    messages = []
+
+    @asyncio.coroutine
+    def send(entries, backfill):
+        """Keep the sent entries."""
+        messages.append((backfill, [
+            (entry.entity_id, entry.message) for entry in entries]))
+
+    subscription = logbook.LogbookSubscription(
+        hass, config[logbook.DOMAIN], send)
+    subscription.async_start(dt_util.utcnow() - timedelta(hours=1), 1)
+    # Fired while the backfill is read
+    hass.states.async_set('switch.test', STATE_OFF)
+    yield from hass.async_block_till_done()
+    yield from subscription._task
+
+    assert messages == [
+        (True, [('switch.test', 'turned off')]),
+        (True, [('switch.test', 'turned on')]),
+        (False, [('switch.test', 'turned off')]),
+    ]
+
+    # Only the last continuous change of a batch is sent, when it is over
+    del messages[:]
+    for state in ('off', 'on', 'idle', 'playing'):
+        hass.states.async_set('media_player.test', state)
+        hass.states.async_set('sensor.mode', state)
+    hass.states.async_set('switch.excluded', STATE_OFF)
+    yield from hass.async_block_till_done()
+
+    assert messages == [
+        (False, [('media_player.test', message)])
+        for message in ('turned on', 'changed to idle', 'changed to playing')]
+
+    del messages[:]
+    async_fire_time_changed(hass, subscription._batch_end)
+    yield from hass.async_block_till_done()
+    assert messages == [(False, [('sensor.mode', 'changed to playing')])]
+
+    del messages[:]
+    subscription.async_stop()
+    hass.states.async_set('switch.test', STATE_ON)
+    yield from hass.async_block_till_done()
+    assert messages == []
+
+
+@asyncio.coroutine
+def test_subscription_backfill_error(hass):
+    """Test a subscription stops when the backfill can not be read."""
+    yield from hass.async_add_job(init_recorder_component, hass)
+    config = logbook.CONFIG_SCHEMA({logbook.DOMAIN: {}})
+    messages = []
+    errors = []
+
+    @asyncio.coroutine
+    def send(entries, backfill):
+        """Keep the sent entries."""
+        messages.append((backfill, entries))
+
+    @asyncio.coroutine
+    def send_error(message):
+        """Keep the sent error."""
+        errors.append(message)
+
+    subscription = logbook.LogbookSubscription(
+        hass, config[logbook.DOMAIN], send, send_error=send_error)
+
+    with patch.object(logbook, '_get_events_page',
+                      side_effect=SQLAlchemyError('Database is gone')):
+        subscription.async_start(dt_util.utcnow() - timedelta(hours=1))
+        hass.states.async_set('switch.test', STATE_ON)
+        yield from hass.async_block_till_done()
+
+    assert messages == []
+    assert errors == ['Error reading the logbook']
+    assert subscription._pending is None
+
+    # Later events are neither held nor sent
+    hass.states.async_set('switch.test', STATE_OFF)
+    yield from hass.async_block_till_done()
+    assert messages == []
+    assert subscription._pending is None
@@ -0,0 +1,177 @@
+"""Test the profiler component."""
+import asyncio
+
+from homeassistant.core import callback
+from homeassistant.setup import async_setup_component
+from homeassistant.components import profiler
+
+
+@asyncio.coroutine
+def get_jobs(hass, test_client):
+    """Fetch the profiled jobs via the API."""
+    client = yield from test_client(hass.http.app)
+    resp = yield from client.get('/api/profiler')
+    assert resp.status == 200
+    return (yield from resp.json())
+
+
+def find_job(jobs, name):
+    """Return the stats of the job with name."""
+    for job in jobs:
+        if job['name'] == name:
+            return job
+    return None
+
+
+@asyncio.coroutine
+def test_disabled_by_default(hass, test_client):
+    """Test the profiler does not record jobs unless enabled."""
+    assert (yield from async_setup_component(hass, profiler.DOMAIN, {}))
+    assert hass.job_profiler is None
+
+    data = yield from get_jobs(hass, test_client)
+    assert not data['enabled']
+    assert data['jobs'] == []
+
+
+@asyncio.coroutine
+def test_executor_stats(hass, test_client):
+    """Test the API returns the stats of the executor pools."""
+    assert (yield from async_setup_component(hass, profiler.DOMAIN, {}))
+
+    yield from hass.async_add_executor_job('test_pool', lambda: None)
+
+    data = yield from get_jobs(hass, test_client)
+    stats = data['executors']['test_pool']
+    assert stats['submitted'] == 1
+    assert stats['running'] == 0
+    assert stats['queued'] == 0
+
+
+@asyncio.coroutine
+def test_record_listeners(hass, test_client):
+    """Test recording event listeners."""
+    assert (yield from async_setup_component(hass, profiler.DOMAIN, {
+        'profiler': {'enabled': True}}))
+
+    @callback
+    def callback_listener(event):
+        """Handle event in the event loop."""
+        pass
+
+    @asyncio.coroutine
+    def coroutine_listener(event):
+        """Handle event in a coroutine."""
+        yield from asyncio.sleep(0, loop=hass.loop)
+
+    def executor_listener(event):
+        """Handle event in the executor."""
+        pass
+
+    hass.bus.async_listen('test_event', callback_listener)
+    hass.bus.async_listen('test_event', coroutine_listener)
+    hass.bus.async_listen('test_event', executor_listener)
+    hass.bus.async_fire('test_event')
+    hass.bus.async_fire('test_event')
+    yield from hass.async_block_till_done()
+
+    data = yield from get_jobs(hass, test_client)
+    assert data['enabled']
+
+    jobs = data['jobs']
+    job = find_job(
+        jobs, 'test_record_listeners.<locals>.callback_listener')
+    assert job['kind'] == 'callback'
+    assert job['owner'] == 'tests.components.test_profiler'
+    assert job['count'] == 2
+    assert job['total'] >= job['max'] >= 0
+
+    job = find_job(
+        jobs, 'test_record_listeners.<locals>.coroutine_listener')
+    assert job['kind'] == 'coroutine'
+    assert job['count'] == 2
+
+    job = find_job(
+        jobs, 'test_record_listeners.<locals>.executor_listener')
+    assert job['kind'] == 'executor'
+    assert job['count'] == 2
+
+
+@asyncio.coroutine
+def test_record_service(hass):
+    """Test recording service handlers."""
+    assert (yield from async_setup_component(hass, profiler.DOMAIN, {
+        'profiler': {'enabled': True}}))
+    calls = []
+
+    @callback
+    def handle_service(call):
+        """Handle a service call."""
+        calls.append(call)
+
+    hass.services.async_register('test', 'service', handle_service)
+    yield from hass.services.async_call('test', 'service', blocking=True)
+
+    assert len(calls) == 1
+    job = find_job(hass.job_profiler.top(100),
+                   'test_record_service.<locals>.handle_service')
+    assert job['kind'] == 'service'
+    assert job['count'] == 1
+
+
+@asyncio.coroutine
+def test_coroutine_exception(hass):
+    """Test errors in profiled coroutines are raised."""
+    job_profiler = profiler.JobProfiler()
+
+    @asyncio.coroutine
+    def failing():
+        """Fail after yielding."""
+        yield from asyncio.sleep(0, loop=hass.loop)
+        raise ValueError
+
+    try:
+        yield from job_profiler.wrap_job(failing)()
+        assert False
+    except ValueError:
+        pass
+
+    assert job_profiler.top(1)[0]['count'] == 1
+
+
+@asyncio.coroutine
+def test_services(hass, caplog):
+    """Test the start, stop and dump services."""
+    assert (yield from async_setup_component(hass, profiler.DOMAIN, {}))
+
+    yield from hass.services.async_call(
+        profiler.DOMAIN, profiler.SERVICE_START, blocking=True)
+    assert hass.job_profiler is not None
+
+    yield from hass.services.async_call(
+        profiler.DOMAIN, profiler.SERVICE_DUMP, {'count': 1}, blocking=True)
+    assert 'calls' in caplog.text
+
+    yield from hass.services.async_call(
+        profiler.DOMAIN, profiler.SERVICE_STOP, blocking=True)
+    assert hass.job_profiler is None
+
+
+@asyncio.coroutine
+def test_coroutine_object_owner(hass):
+    """Test the owner of a coroutine object job is its module."""
+    assert (yield from async_setup_component(hass, profiler.DOMAIN, {
+        'profiler': {'enabled': True}}))
+
+    @asyncio.coroutine
+    def coroutine_job():
+        """Run as a coroutine object."""
+        yield from asyncio.sleep(0, loop=hass.loop)
+
+    hass.async_add_job(coroutine_job())
+    yield from hass.async_block_till_done()
+
+    job = find_job(hass.job_profiler.top(100),
+                   'test_coroutine_object_owner.<locals>.coroutine_job')
+    assert job['kind'] == 'coroutine'
+    assert job['owner'] == 'tests.components.test_profiler'
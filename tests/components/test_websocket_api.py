@@ -5,11 +5,14 @@ from unittest.mock import patch
 from aiohttp import WSMsgType
 from async_timeout import timeout
 import pytest
+from sqlalchemy.exc import SQLAlchemyError
 
 from homeassistant.core import callback
-from homeassistant.components import websocket_api as wapi, frontend
+from homeassistant.components import websocket_api as wapi, frontend, logbook
+from homeassistant.setup import async_setup_component
 
-from tests.common import mock_http_component_app, mock_coro
+from tests.common import (
+    init_recorder_component, mock_http_component_app, mock_coro)
 
 API_PASSWORD = 'test1234'
 
@@ -222,6 +225,116 @@ def test_subscribe_unsubscribe_events(hass, websocket_client):
     assert sum(hass.bus.async_listeners().values()) == init_count
 
 
+@asyncio.coroutine
+def test_subscribe_logbook(hass, websocket_client):
+    """Test subscribe logbook command."""
+    websocket_client.send_json({
+        'id': 5,
+        'type': wapi.TYPE_SUBSCRIBE_LOGBOOK,
+    })
+
+    msg = yield from websocket_client.receive_json()
+    assert msg['id'] == 5
+    assert msg['type'] == wapi.TYPE_RESULT
+    assert not msg['success']
+    assert msg['error']['code'] == wapi.ERR_NOT_FOUND
+
+    yield from hass.async_add_job(init_recorder_component, hass)
+    yield from async_setup_component(hass, 'http', {})
+    hass.config.components.add('frontend')
+    with patch('homeassistant.components.frontend.'
+               'async_register_built_in_panel', return_value=mock_coro()):
+        assert (yield from async_setup_component(
+            hass, logbook.DOMAIN, {logbook.DOMAIN: {}}))
+
+    hass.states.async_set('light.kitchen', 'off')
+    hass.states.async_set('light.kitchen', 'on')
+
+    websocket_client.send_json({
+        'id': 6,
+        'type': wapi.TYPE_SUBSCRIBE_LOGBOOK,
+        'entity_id': 'light.kitchen',
+    })
+
+    msg = yield from websocket_client.receive_json()
+    assert msg['id'] == 6
+    assert msg['type'] == wapi.TYPE_RESULT
+    assert msg['success']
+
+    for backfill, message in ((True, 'turned on'), (False, None)):
+        msg = yield from websocket_client.receive_json()
+        assert msg['id'] == 6
+        assert msg['type'] == wapi.TYPE_LOGBOOK
+        assert msg['backfill'] is backfill
+        assert [entry['message'] for entry in msg['entries']] == \
+            ([message] if message else [])
+
+    hass.states.async_set('light.kitchen', 'off')
+
+    with timeout(3, loop=hass.loop):
+        msg = yield from websocket_client.receive_json()
+
+    assert msg['id'] == 6
+    assert msg['type'] == wapi.TYPE_LOGBOOK
+    assert not msg['backfill']
+    assert msg['entries'][0]['entity_id'] == 'light.kitchen'
+    assert msg['entries'][0]['message'] == 'turned off'
+
+    websocket_client.send_json({
+        'id': 7,
+        'type': wapi.TYPE_UNSUBSCRIBE_EVENTS,
+        'subscription': 6
+    })
+
+    msg = yield from websocket_client.receive_json()
+    assert msg['id'] == 7
+    assert msg['type'] == wapi.TYPE_RESULT
+    assert msg['success']
+
+    websocket_client.send_json({
+        'id': 8,
+        'type': wapi.TYPE_SUBSCRIBE_LOGBOOK,
+        'page_size': logbook.MAX_LIMIT + 1,
+    })
+
+    msg = yield from websocket_client.receive_json()
+    assert msg['id'] == 8
+    assert msg['type'] == wapi.TYPE_RESULT
+    assert not msg['success']
+    assert msg['error']['code'] == wapi.ERR_INVALID_FORMAT
+
+
+@asyncio.coroutine
+def test_subscribe_logbook_error(hass, websocket_client):
+    """Test an error is sent when the logbook backfill fails."""
+    yield from hass.async_add_job(init_recorder_component, hass)
+    yield from async_setup_component(hass, 'http', {})
+    hass.config.components.add('frontend')
+    with patch('homeassistant.components.frontend.'
+               'async_register_built_in_panel', return_value=mock_coro()):
+        assert (yield from async_setup_component(
+            hass, logbook.DOMAIN, {logbook.DOMAIN: {}}))
+
+    with patch.object(logbook, '_get_events_page',
+                      side_effect=SQLAlchemyError('Database is gone')):
+        websocket_client.send_json({
+            'id': 5,
+            'type': wapi.TYPE_SUBSCRIBE_LOGBOOK,
+        })
+
+        msg = yield from websocket_client.receive_json()
+        assert msg['id'] == 5
+        assert msg['success']
+
+        with timeout(3, loop=hass.loop):
+            msg = yield from websocket_client.receive_json()
+
+    assert msg['id'] == 5
+    assert msg['type'] == wapi.TYPE_RESULT
+    assert not msg['success']
+    assert msg['error']['code'] == wapi.ERR_UNKNOWN_ERROR
+
+
 @asyncio.coroutine
 def test_get_states(hass, websocket_client):
     """Test get_states command."""
@@ -380,3 +380,77 @@ def test_async_pararell_updates_with_two(hass):
     test_lock.release()
     yield from asyncio.sleep(0, loop=hass.loop)
     test_lock.release()
+
+
+@asyncio.coroutine
+def test_skip_update_with_same_fingerprint(hass):
+    """Test updates with an unchanged state fingerprint are skipped."""
+    built = []
+
+    class FingerprintEntity(entity.Entity):
+        entity_id = 'sensor.test'
+        fingerprint = 1
+
+        @property
+        def state_fingerprint(self):
+            return self.fingerprint
+
+        @property
+        def state_attributes(self):
+            built.append(1)
+            return {'fingerprint': self.fingerprint}
+
+    ent = FingerprintEntity()
+    ent.hass = hass
+
+    yield from ent.async_update_ha_state()
+    yield from ent.async_update_ha_state()
+    assert len(built) == 1
+    assert hass.states.async_suppressed_writes() == {'sensor': 1}
+
+    ent.fingerprint = 2
+    yield from ent.async_update_ha_state()
+    assert len(built) == 2
+    assert hass.states.get('sensor.test').attributes['fingerprint'] == 2
+
+    # State written by someone else is overwritten again
+    hass.states.async_set('sensor.test', 'changed')
+    yield from ent.async_update_ha_state()
+    assert len(built) == 3
+    assert hass.states.get('sensor.test').state != 'changed'
+
+
+@asyncio.coroutine
+def test_skip_update_with_default_fingerprint(hass):
+    """Test entities skip unchanged updates without a fingerprint."""
+    class AttributesEntity(entity.Entity):
+        entity_id = 'sensor.test'
+        attributes = {'value': 1}
+        icon = 'mdi:one'
+
+        @property
+        def state(self):
+            return 'on'
+
+        @property
+        def device_state_attributes(self):
+            return self.attributes
+
+    ent = AttributesEntity()
+    ent.hass = hass
+
+    yield from ent.async_update_ha_state()
+    with patch.object(hass.states, 'async_set') as mock_set:
+        yield from ent.async_update_ha_state()
+    assert not mock_set.called
+    assert hass.states.async_suppressed_writes() == {'sensor': 1}
+
+    # Attributes changed in place are written
+    ent.attributes['value'] = 2
+    yield from ent.async_update_ha_state()
+    assert hass.states.get('sensor.test').attributes['value'] == 2
+
+    ent.icon = 'mdi:two'
+    yield from ent.async_update_ha_state()
+    assert hass.states.get('sensor.test').attributes['icon'] == 'mdi:two'
+    assert hass.states.async_suppressed_writes() == {'sensor': 1}
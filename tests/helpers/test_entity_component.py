@@ -652,6 +652,39 @@ def test_pararell_updates_sync_platform(hass):
     assert handle.parallel_updates is not None
 
 
+@asyncio.coroutine
+def test_platform_executor_pool(hass):
+    """Test sync updates run in the executor pool of the platform."""
+    platform = MockPlatform()
+    platform.PARALLEL_UPDATES = 100
+
+    loader.set_component('test_domain.platform', platform)
+
+    component = EntityComponent(_LOGGER, DOMAIN, hass)
+    component._platforms = {}
+
+    yield from component.async_setup({
+        DOMAIN: {
+            'platform': 'platform',
+        }
+    })
+
+    handle = list(component._platforms.values())[-1]
+
+    assert handle.executor_pool == 'test_domain.platform'
+    assert hass.executors.async_get_limit('test_domain.platform') == 100
+
+    updates = []
+    entity = EntityTest(name='test_1')
+    entity.update = lambda: updates.append(entity)
+    yield from handle.async_add_entities([entity], True)
+
+    assert updates == [entity]
+    assert entity.executor_pool == 'test_domain.platform'
+    assert hass.executors.async_stats()[
+        'test_domain.platform']['submitted'] == 2
+
+
 @asyncio.coroutine
 def test_raise_error_on_update(hass):
     """Test the add entity if they raise an error on update."""
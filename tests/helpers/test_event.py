@@ -82,6 +82,36 @@ class TestEventHelpers(unittest.TestCase):
         self.hass.block_till_done()
         self.assertEqual(2, len(runs))
 
+    def test_track_point_in_time_order(self):
+        """Test point in time trackers fire once in order and unsubscribe."""
+        start = datetime(2017, 10, 10, 12, 0, 0, tzinfo=dt_util.UTC)
+        runs = []
+        unsubs = []
+
+        for offset in (3, 1, 2, 2):
+            unsubs.append(track_point_in_utc_time(
+                self.hass, lambda x, offset=offset: runs.append(offset),
+                start + timedelta(seconds=offset)))
+
+        # Cancel one of the timers for offset 2
+        unsubs[3]()
+        assert self.hass.bus.listeners.get(ha.EVENT_TIME_CHANGED) == 1
+
+        self._send_time_changed(start + timedelta(seconds=2))
+        self.hass.block_till_done()
+        self.assertEqual([1, 2], runs)
+
+        self._send_time_changed(start + timedelta(seconds=5))
+        self._send_time_changed(start + timedelta(seconds=6))
+        self.hass.block_till_done()
+        self.assertEqual([1, 2, 3], runs)
+
+        # Cancelling timers that already ran does nothing
+        unsubs[0]()
+
+        # No pending timers, no time changed listener
+        assert self.hass.bus.listeners.get(ha.EVENT_TIME_CHANGED) is None
+
     def test_track_time_change(self):
         """Test tracking time change."""
         wildcard_runs = []
@@ -264,6 +294,48 @@ class TestEventHelpers(unittest.TestCase):
         self.assertEqual(2, len(wildcard_runs))
         self.assertEqual(2, len(wildercard_runs))
 
+    def test_track_template_follows_render(self):
+        """Test tracking the states the template read in its last render."""
+        runs = []
+        template = Template(
+            "{% if is_state('input_boolean.use_a', 'on') %}"
+            "{{ is_state('switch.a', 'on') }}{% else %}"
+            "{{ states.switch | selectattr('state', 'eq', 'on') | list | "
+            "count > 1 }}{% endif %}", self.hass)
+
+        self.hass.states.set('input_boolean.use_a', 'on')
+        track_template(
+            self.hass, template, lambda entity_id, *_: runs.append(entity_id))
+
+        self.hass.states.set('switch.b', 'on')
+        self.hass.states.set('switch.c', 'on')
+        self.hass.states.set('switch.a', 'on')
+        self.hass.block_till_done()
+        self.assertEqual(['switch.a'], runs)
+
+        # Now the template iterates the switch domain
+        self.hass.states.set('switch.a', 'off')
+        self.hass.states.set('input_boolean.use_a', 'off')
+        self.hass.block_till_done()
+        self.assertEqual(['switch.a', 'input_boolean.use_a'], runs)
+
+        self.hass.states.set('light.kitchen', 'on')
+        self.hass.states.set('switch.c', 'off')
+        self.hass.states.set('switch.d', 'on')
+        self.hass.block_till_done()
+        self.assertEqual(['switch.a', 'input_boolean.use_a', 'switch.d'], runs)
+
+    def test_track_template_without_states(self):
+        """Test a template that reads no state tracks all changes."""
+        runs = []
+        template = Template("{{ now().year > 2000 }}", self.hass)
+        track_template(
+            self.hass, template, lambda entity_id, *_: runs.append(entity_id))
+
+        self.hass.states.set('light.kitchen', 'on')
+        self.hass.block_till_done()
+        self.assertEqual(['light.kitchen'], runs)
+
     def test_track_same_state_simple_trigger(self):
         """Test track_same_change with trigger simple."""
         thread_runs = []
@@ -631,6 +703,33 @@ class TestEventHelpers(unittest.TestCase):
         self.hass.block_till_done()
         self.assertEqual(2, len(specific_runs))
 
+    def test_periodic_task_dst(self):
+        """Test local periodic tasks when daylight saving time ends."""
+        specific_runs = []
+        tz = dt_util.get_time_zone('America/New_York')
+        default_tz = dt_util.DEFAULT_TIME_ZONE
+        dt_util.set_default_time_zone(tz)
+
+        try:
+            unsub = track_time_change(
+                self.hass, lambda x: specific_runs.append(x),
+                hour=1, minute=30, second=0)
+
+            # 1:30 happens twice on this day, first EDT then EST
+            for hour in range(4, 8):
+                self._send_time_changed(
+                    datetime(2017, 11, 5, hour, 30, 0, tzinfo=dt_util.UTC))
+            self.hass.block_till_done()
+            self.assertEqual(2, len(specific_runs))
+            self.assertEqual(
+                [tz.localize(datetime(2017, 11, 5, 1, 30), is_dst=True),
+                 tz.localize(datetime(2017, 11, 5, 1, 30), is_dst=False)],
+                specific_runs)
+
+            unsub()
+        finally:
+            dt_util.set_default_time_zone(default_tz)
+
     def test_periodic_task_wrong_input(self):
         """Test periodic tasks with wrong input."""
         specific_runs = []
@@ -5,6 +5,8 @@ import unittest
 import random
 from unittest.mock import patch
 
+import pytest
+
 from homeassistant.components import group
 from homeassistant.exceptions import TemplateError
 from homeassistant.helpers import template
@@ -783,6 +785,43 @@ is_state_attr('device_tracker.phone_2', 'battery', 40)
                 {'trigger': {'entity_id': 'input_boolean.switch'}}))
 
 
+@asyncio.coroutine
+def test_render_info(hass):
+    """Test the states that are read while rendering are recorded."""
+    hass.states.async_set('light.kitchen', 'on')
+    hass.states.async_set('sensor.temp', '20')
+
+    def render_info(template_str, variables=None):
+        """Return the render info of rendering template_str."""
+        with template.RenderInfo(hass) as info:
+            template.Template(template_str, hass).async_render(variables)
+        return info.all_states, info.domains, info.entities
+
+    assert render_info(
+        "{{ states.light.kitchen.state }} {{ states('Sensor.temp') }}"
+    ) == (False, set(), {'light.kitchen', 'sensor.temp'})
+    assert render_info(
+        "{% if is_state(entity, 'on') %}"
+        "{{ is_state_attr('sensor.temp', 'unit', 'C') }}{% endif %}",
+        {'entity': 'light.kitchen'}
+    ) == (False, set(), {'light.kitchen', 'sensor.temp'})
+    assert render_info(
+        "{% if is_state('light.kitchen', 'off') %}"
+        "{{ states.sensor.temp.state }}{% endif %}"
+    ) == (False, set(), {'light.kitchen'})
+    assert render_info(
+        "{{ states.sensor | count }} {{ states.light.kitchen.state }}"
+    ) == (False, {'sensor'}, {'light.kitchen'})
+    assert render_info("{{ states | count }}") == (True, set(), set())
+    assert render_info("{{ 1 + 1 }}") == (False, set(), set())
+
+    # Renders outside of the block are not recorded
+    with template.RenderInfo(hass) as info:
+        pass
+    template.Template("{{ states('light.kitchen') }}", hass).async_render()
+    assert not info.entities
+
+
 @asyncio.coroutine
 def test_state_with_unit(hass):
     """Test the state_with_unit property helper."""
@@ -825,3 +864,27 @@ def test_length_of_states(hass):
 
     tpl = template.Template('{{ states.sensor | length }}', hass)
     assert tpl.async_render() == '2'
+
+
+@asyncio.coroutine
+def test_compiled_code_is_shared(hass):
+    """Test templates with the same source share their compiled code."""
+    source = '{{ states("sensor.shared") }} {{ range(3) | list }}'
+    info = template.compile_cache_info()
+
+    first = template.Template(source, hass)
+    first.ensure_valid()
+    second = template.Template(source, hass)
+    second.ensure_valid()
+
+    assert first._compiled_code is second._compiled_code
+    assert template.compile_cache_info().misses == info.misses + 1
+    assert template.compile_cache_info().hits == info.hits + 1
+
+    hass.states.async_set('sensor.shared', 'on')
+    assert second.async_render() == 'on [0, 1, 2]'
+
+    # Errors are not cached
+    for _ in range(2):
+        with pytest.raises(TemplateError):
+            template.Template('{{ shared', hass).ensure_valid()
@@ -0,0 +1,37 @@
+"""Test the benchmark script."""
+import asyncio
+
+from homeassistant.scripts import benchmark
+
+
+def _results(**mins):
+    """Return benchmark results with the given fastest runs."""
+    return {'results': {key: {'runs': [value], 'min': value,
+                              'median': value}
+                        for key, value in mins.items()}}
+
+
+def test_compare_results():
+    """Test slower benchmarks are reported as regressions."""
+    baseline = _results(fast=1.0, same=4.0, slow=1.0, removed=1.0)
+    results = _results(fast=0.5, same=4.25, slow=1.5, added=1.0)
+
+    assert benchmark.compare_results(baseline, results, 0.1) == [
+        ('fast', 1.0, 0.5, -0.5, False),
+        ('same', 4.0, 4.25, 0.0625, False),
+        ('slow', 1.0, 1.5, 0.5, True),
+    ]
+
+
+def test_run_benchmark_with_measurements():
+    """Test a benchmark can return several measurements."""
+    @asyncio.coroutine
+    def async_bench(hass):
+        """Return two measurements."""
+        assert hass.config.config_dir is not None
+        return {'first': 1, 'second': 2}
+
+    assert benchmark._run_benchmark(async_bench) == {
+        'async_bench.first': 1,
+        'async_bench.second': 2,
+    }
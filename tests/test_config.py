@@ -410,6 +410,7 @@ class TestConfig(unittest.TestCase):
                 CONF_UNIT_SYSTEM: CONF_UNIT_SYSTEM_IMPERIAL,
                 'time_zone': 'America/New_York',
                 'whitelist_external_dirs': '/tmp',
+                'loop_lag_threshold': 2,
             }), self.hass.loop).result()
 
         assert self.hass.config.latitude == 60
@@ -420,10 +421,11 @@ class TestConfig(unittest.TestCase):
         assert self.hass.config.time_zone.zone == 'America/New_York'
         assert len(self.hass.config.whitelist_external_dirs) == 2
         assert '/tmp' in self.hass.config.whitelist_external_dirs
+        assert self.hass.config.loop_lag_threshold == 2.0
 
     def test_loading_configuration_temperature_unit(self):
         """Test backward compatibility when loading core config."""
-        self.hass.config = mock.Mock()
+        self.hass.config = mock.Mock(loop_lag_threshold=0)
 
         run_coroutine_threadsafe(
             config_util.async_process_ha_core_config(self.hass, {
@@ -444,7 +446,7 @@ class TestConfig(unittest.TestCase):
 
     def test_loading_configuration_from_packages(self):
         """Test loading packages config onto hass object config."""
-        self.hass.config = mock.Mock()
+        self.hass.config = mock.Mock(loop_lag_threshold=0)
 
         run_coroutine_threadsafe(
             config_util.async_process_ha_core_config(self.hass, {
@@ -4,7 +4,7 @@ import asyncio
 import logging
 import os
 import unittest
-from unittest.mock import patch, MagicMock, sentinel
+from unittest.mock import patch, MagicMock, sentinel, call
 from datetime import datetime, timedelta
 from tempfile import TemporaryDirectory
 
@@ -14,13 +14,15 @@ import pytest
 import homeassistant.core as ha
 from homeassistant.exceptions import (InvalidEntityFormatError,
                                       InvalidStateError)
-from homeassistant.util.async import run_coroutine_threadsafe
+from homeassistant.util.async import (
+    run_coroutine_threadsafe, run_callback_threadsafe)
 import homeassistant.util.dt as dt_util
 from homeassistant.util.unit_system import (METRIC_SYSTEM)
 from homeassistant.const import (
     __version__, EVENT_STATE_CHANGED, ATTR_FRIENDLY_NAME, CONF_UNIT_SYSTEM,
     ATTR_NOW, EVENT_TIME_CHANGED, EVENT_HOMEASSISTANT_STOP,
-    EVENT_HOMEASSISTANT_CLOSE, EVENT_SERVICE_REGISTERED, EVENT_SERVICE_REMOVED)
+    EVENT_HOMEASSISTANT_CLOSE, EVENT_SERVICE_REGISTERED, EVENT_SERVICE_REMOVED,
+    MATCH_ALL)
 
 from tests.common import get_test_home_assistant
 
@@ -34,7 +36,7 @@ def test_split_entity_id():
 
 def test_async_add_job_schedule_callback():
     """Test that we schedule coroutines and add jobs to the job pool."""
-    hass = MagicMock()
+    hass = MagicMock(job_profiler=None)
     job = MagicMock()
 
     ha.HomeAssistant.async_add_job(hass, ha.callback(job))
@@ -46,7 +48,7 @@ def test_async_add_job_schedule_callback():
 @patch('asyncio.iscoroutinefunction', return_value=True)
 def test_async_add_job_schedule_coroutinefunction(mock_iscoro):
     """Test that we schedule coroutines and add jobs to the job pool."""
-    hass = MagicMock()
+    hass = MagicMock(job_profiler=None)
     job = MagicMock()
 
     ha.HomeAssistant.async_add_job(hass, job)
@@ -58,18 +60,28 @@ def test_async_add_job_schedule_coroutinefunction(mock_iscoro):
 @patch('asyncio.iscoroutinefunction', return_value=False)
 def test_async_add_job_add_threaded_job_to_pool(mock_iscoro):
     """Test that we schedule coroutines and add jobs to the job pool."""
-    hass = MagicMock()
+    hass = MagicMock(job_profiler=None)
     job = MagicMock()
 
     ha.HomeAssistant.async_add_job(hass, job)
     assert len(hass.loop.call_soon.mock_calls) == 0
     assert len(hass.loop.create_task.mock_calls) == 0
-    assert len(hass.loop.run_in_executor.mock_calls) == 1
+    assert len(hass.async_add_executor_job.mock_calls) == 1
+
+
+def test_async_add_executor_job_submits_to_pool():
+    """Test that executor jobs are submitted to their executor pool."""
+    hass = MagicMock(job_profiler=None)
+    job = MagicMock()
+
+    ha.HomeAssistant.async_add_executor_job(hass, 'test', job, 1)
+    assert hass.executors.async_submit.mock_calls == [
+        call('test', job, 1)]
 
 
 def test_async_run_job_calls_callback():
     """Test that the callback annotation is respected."""
-    hass = MagicMock()
+    hass = MagicMock(job_profiler=None)
     calls = []
 
     def job():
@@ -82,7 +94,7 @@ def test_async_run_job_calls_callback():
 
 def test_async_run_job_delegates_non_async():
     """Test that the callback annotation is respected."""
-    hass = MagicMock()
+    hass = MagicMock(job_profiler=None)
     calls = []
 
     def job():
@@ -324,6 +336,48 @@ class TestEventBus(unittest.TestCase):
 
         assert len(calls) == 1
 
+    def test_listen_match_all_filtered(self):
+        """Test listening for all events with event type filters."""
+        included = []
+        excluded = []
+        both = []
+
+        def listener(calls):
+            """Return a listener that adds events to calls."""
+            return ha.callback(lambda event: calls.append(event))
+
+        self.bus.listen(MATCH_ALL, listener(included),
+                        include=['test', 'other'])
+        self.bus.listen(MATCH_ALL, listener(excluded), exclude=['test'])
+        unsub = self.bus.listen(MATCH_ALL, listener(both),
+                                include=['test', 'other'], exclude=['other'])
+
+        self.assertEqual(3, self.bus.listeners[MATCH_ALL])
+
+        self.bus.fire('test')
+        self.bus.fire('other')
+        self.bus.fire('unknown')
+        self.hass.block_till_done()
+
+        self.assertEqual(['test', 'other'],
+                         [event.event_type for event in included])
+        self.assertEqual(['other', 'unknown'],
+                         [event.event_type for event in excluded])
+        self.assertEqual(['test'], [event.event_type for event in both])
+
+        unsub()
+        self.bus.fire('test')
+        self.hass.block_till_done()
+
+        self.assertEqual(2, self.bus.listeners[MATCH_ALL])
+        self.assertEqual(3, len(included))
+        self.assertEqual(1, len(both))
+
+    def test_listen_filter_requires_match_all(self):
+        """Test event type filters are only allowed for all events."""
+        with self.assertRaises(ValueError):
+            self.bus.listen('test', lambda event: None, exclude=['other'])
+
     def test_listen_once_event_with_callback(self):
         """Test listen_once_event method."""
         runs = []
@@ -412,6 +466,69 @@ class TestEventBus(unittest.TestCase):
         self.hass.block_till_done()
         assert len(coroutine_calls) == 1
 
+    def test_entity_listener(self):
+        """Test listening for state changes of specific entities."""
+        calls = []
+
+        @ha.callback
+        def listener(event):
+            """Mock listener."""
+            calls.append(event)
+
+        old_count = self.bus.listeners.get(EVENT_STATE_CHANGED, 0)
+        unsub = run_callback_threadsafe(
+            self.hass.loop, self.bus.async_listen_entity,
+            ['light.Kitchen', 'light.bed'], listener).result()
+        assert self.bus.listeners[EVENT_STATE_CHANGED] == old_count + 1
+
+        self.hass.states.set('light.kitchen', 'on')
+        self.hass.states.set('light.bed', 'on')
+        self.hass.states.set('light.hallway', 'on')
+        self.hass.block_till_done()
+
+        assert len(calls) == 2
+        assert calls[0].data['entity_id'] == 'light.kitchen'
+        assert calls[1].data['entity_id'] == 'light.bed'
+
+        run_callback_threadsafe(self.hass.loop, unsub).result()
+        assert self.bus.listeners.get(EVENT_STATE_CHANGED, 0) == old_count
+
+        self.hass.states.set('light.kitchen', 'off')
+        self.hass.block_till_done()
+
+        assert len(calls) == 2
+
+    def test_domain_listener(self):
+        """Test listening for state changes of the entities of a domain."""
+        calls = []
+
+        @ha.callback
+        def listener(event):
+            """Mock listener."""
+            calls.append(event)
+
+        old_count = self.bus.listeners.get(EVENT_STATE_CHANGED, 0)
+        unsub = run_callback_threadsafe(
+            self.hass.loop, self.bus.async_listen_domain,
+            'Light', listener).result()
+        assert self.bus.listeners[EVENT_STATE_CHANGED] == old_count + 1
+
+        self.hass.states.set('light.kitchen', 'on')
+        self.hass.states.set('switch.kitchen', 'on')
+        self.hass.states.set('light.bed', 'on')
+        self.hass.block_till_done()
+
+        assert [event.data['entity_id'] for event in calls] == [
+            'light.kitchen', 'light.bed']
+
+        run_callback_threadsafe(self.hass.loop, unsub).result()
+        assert self.bus.listeners.get(EVENT_STATE_CHANGED, 0) == old_count
+
+        self.hass.states.set('light.kitchen', 'off')
+        self.hass.block_till_done()
+
+        assert len(calls) == 2
+
 
 class TestState(unittest.TestCase):
     """Test State methods."""
@@ -453,6 +570,22 @@ class TestState(unittest.TestCase):
         state = ha.State('domain.hello', 'world', {'some': 'attr'})
         self.assertEqual(state, ha.State.from_dict(state.as_dict()))
 
+    def test_from_trusted(self):
+        """Test creating a state from trusted data."""
+        expected = ha.State('domain.hello', 'world', {'some': 'attr'})
+        state = ha.State.from_trusted(
+            'domain.hello', 'world', {'some': 'attr'})
+        self.assertEqual(expected, state)
+        self.assertEqual('domain', state.domain)
+        self.assertEqual('hello', state.object_id)
+        self.assertEqual(state.last_updated, state.last_changed)
+
+    def test_attributes_proxy_reused(self):
+        """Test a read-only attributes view is not wrapped again."""
+        state = ha.State('domain.hello', 'world', {'some': 'attr'})
+        state2 = ha.State('domain.hello', 'world2', state.attributes)
+        self.assertIs(state.attributes, state2.attributes)
+
     def test_dict_conversion_with_wrong_data(self):
         """Test conversion with wrong data."""
         self.assertIsNone(ha.State.from_dict(None))
@@ -511,6 +644,35 @@ class TestStateMachine(unittest.TestCase):
         states = sorted(state.entity_id for state in self.states.all())
         self.assertEqual(['light.bowl', 'switch.ac'], states)
 
+    def test_domain_index(self):
+        """Test the states per domain are kept sorted."""
+        self.states.set('light.kitchen', 'off')
+        self.assertEqual(['light.bowl', 'light.kitchen'],
+                         self.states.entity_ids('light'))
+
+        # Additions to a domain that was read keep it sorted
+        self.states.set('light.attic', 'on')
+        self.states.set('light.bowl', 'off')
+        self.assertEqual(['light.attic', 'light.bowl', 'light.kitchen'],
+                         [state.entity_id for state
+                          in self.states.all('LIGHT')])
+        self.assertEqual(['light', 'switch'], self.states.async_domains())
+        self.assertEqual(4, self.states.async_entity_ids_count())
+        self.assertEqual(3, self.states.async_entity_ids_count('light'))
+        self.assertEqual(0, self.states.async_entity_ids_count('sensor'))
+
+        self.states.remove('light.bowl')
+        self.states.remove('switch.ac')
+        self.assertEqual(['light.attic', 'light.kitchen'],
+                         self.states.entity_ids('light'))
+        self.assertEqual([], self.states.entity_ids('switch'))
+        self.assertEqual([], self.states.all('switch'))
+        self.assertEqual(['light'], self.states.async_domains())
+
+        self.states.set('switch.ac', 'on')
+        self.assertEqual(['light', 'switch'], self.states.async_domains())
+        self.assertEqual(['switch.ac'], self.states.entity_ids('switch'))
+
     def test_remove(self):
         """Test remove method."""
         events = []
@@ -567,6 +729,27 @@ class TestStateMachine(unittest.TestCase):
         assert state2 is not None
         assert state.last_changed == state2.last_changed
 
+    def test_attributes_shared_on_same_attributes(self):
+        """Test that unchanged attributes are shared with the new state."""
+        self.states.set('light.bowl', 'on', {'brightness': 100})
+        state = self.states.get('light.bowl')
+
+        self.states.set('light.bowl', 'off', {'brightness': 100})
+        state2 = self.states.get('light.bowl')
+
+        self.assertEqual('off', state2.state)
+        self.assertIs(state.attributes, state2.attributes)
+
+    def test_suppressed_writes(self):
+        """Test writes without changes are counted per domain."""
+        self.states.set('light.bowl', 'on')
+        self.states.set('light.bowl', 'on')
+        self.states.set('switch.ac', 'off')
+        self.states.set('switch.ac', 'on')
+
+        self.assertEqual({'light': 2, 'switch': 1},
+                         self.states.async_suppressed_writes())
+
     def test_force_update(self):
         """Test force update option."""
         events = []
@@ -0,0 +1,135 @@
+"""Tests for the executor pools."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import pytest
+
+from homeassistant.util.executor import ExecutorPools, job_owner
+
+
+@pytest.fixture
+def executor():
+    """Return a thread pool executor with two workers."""
+    executor = ThreadPoolExecutor(max_workers=2)
+    yield executor
+    executor.shutdown()
+
+
+def test_job_owner():
+    """Test the owner of a job is derived from its module."""
+    def job():
+        """Do nothing."""
+        pass
+
+    job.__module__ = 'homeassistant.components.sensor.demo'
+    assert job_owner(job) == 'sensor.demo'
+
+    job.__module__ = 'custom_components.light.custom'
+    assert job_owner(job) == 'light.custom'
+
+    job.__module__ = 'homeassistant.core'
+    assert job_owner(job) == 'core'
+
+
+@asyncio.coroutine
+def test_result_and_exception(loop, executor):
+    """Test the result and errors of jobs are returned."""
+    pools = ExecutorPools(loop, executor, 2)
+
+    def fail():
+        """Raise an error."""
+        raise ValueError
+
+    assert (yield from pools.async_submit('test', sum, [1, 2])) == 3
+
+    with pytest.raises(ValueError):
+        yield from pools.async_submit('test', fail)
+
+    stats = pools.async_stats()['test']
+    assert stats['submitted'] == 2
+    assert stats['running'] == 0
+    assert stats['queued'] == 0
+
+
+@asyncio.coroutine
+def test_pool_limit(loop, executor):
+    """Test a pool does not use more workers than its limit."""
+    pools = ExecutorPools(loop, executor, 2)
+    pools.async_set_limit('slow', 1)
+    release = threading.Event()
+
+    futures = [pools.async_submit('slow', release.wait) for _ in range(3)]
+    other = pools.async_submit('fast', lambda: 'done')
+
+    # The second worker is still available to the other pool
+    assert (yield from other) == 'done'
+
+    stats = pools.async_stats()['slow']
+    assert stats['running'] == 1
+    assert stats['queued'] == 2
+    assert stats['max_queued'] == 2
+
+    release.set()
+    yield from asyncio.wait(futures, loop=loop)
+    assert pools.async_stats()['slow']['wait_max'] > 0
+
+
+@asyncio.coroutine
+def test_core_pools_are_unlimited(loop, executor):
+    """Test jobs of core and helpers can use every worker by default."""
+    pools = ExecutorPools(loop, executor, 2)
+    assert pools.async_get_limit('sensor.demo') == 1
+
+    for name in ('core', 'helpers.entity'):
+        assert pools.async_get_limit(name) == 2
+
+        # Jobs that wait for each other would deadlock with a limit of 1
+        barrier = threading.Barrier(2, timeout=5)
+        yield from asyncio.wait_for(asyncio.gather(
+            pools.async_submit(name, barrier.wait),
+            pools.async_submit(name, barrier.wait), loop=loop), 10, loop=loop)
+
+        pools.async_set_limit(name, 1)
+        assert pools.async_get_limit(name) == 1
+
+
+@asyncio.coroutine
+def test_fair_scheduling(loop, executor):
+    """Test free workers go to the queued pools in turn."""
+    pools = ExecutorPools(loop, executor, 1, 1)
+    release = threading.Event()
+    order = []
+
+    blocker = pools.async_submit('blocker', release.wait)
+    futures = [
+        pools.async_submit('first', order.append, 'first1'),
+        pools.async_submit('first', order.append, 'first2'),
+        pools.async_submit('second', order.append, 'second1'),
+        pools.async_submit('second', order.append, 'second2'),
+    ]
+
+    release.set()
+    yield from blocker
+    yield from asyncio.wait(futures, loop=loop)
+
+    assert order == ['first1', 'second1', 'first2', 'second2']
+
+
+@asyncio.coroutine
+def test_cancelled_job_is_skipped(loop, executor):
+    """Test a job that is cancelled while queued does not run."""
+    pools = ExecutorPools(loop, executor, 1, 1)
+    release = threading.Event()
+    calls = []
+
+    blocker = pools.async_submit('test', release.wait)
+    cancelled = pools.async_submit('test', calls.append, 1)
+    cancelled.cancel()
+    queued = pools.async_submit('test', calls.append, 2)
+
+    release.set()
+    yield from blocker
+    yield from queued
+
+    assert calls == [2]
@@ -0,0 +1,44 @@
+"""Tests for the event loop watchdog."""
+import asyncio
+import time
+
+from homeassistant.util.loop_watchdog import LoopWatchdog
+
+
+@asyncio.coroutine
+def test_report_blocked_loop(loop, caplog):
+    """Test the watchdog reports what blocks the loop."""
+    watchdog = LoopWatchdog(loop, 0.1, 0.02)
+    watchdog.async_start()
+
+    def blocking_job():
+        """Block the event loop."""
+        time.sleep(0.3)
+
+    try:
+        yield from asyncio.sleep(0.05, loop=loop)
+        assert watchdog.async_pop_max_lag() < 0.1
+
+        loop.call_soon(blocking_job)
+        yield from asyncio.sleep(0.05, loop=loop)
+    finally:
+        watchdog.async_stop()
+
+    assert watchdog.async_pop_max_lag() >= 0.2
+    assert 'Event loop blocked' in caplog.text
+    assert 'blocking_job' in caplog.text
+    assert caplog.text.count('Event loop blocked') == 1
+
+
+@asyncio.coroutine
+def test_stop(loop):
+    """Test the watchdog stops measuring when stopped."""
+    watchdog = LoopWatchdog(loop, 0.1, 0.02)
+    watchdog.async_start()
+    watchdog.async_stop()
+
+    yield from asyncio.sleep(0.05, loop=loop)
+
+    assert watchdog.lag < 0.02
+    watchdog._thread.join(1)
+    assert not watchdog._thread.is_alive()